@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+""" Benchmark for API docs generation
+
+Builds a synthetic API (N viewsets x M actions x K serializer fields) using tg_apicore's Router and
+DetailSerializerViewSet, and measures time and peak memory of the separate stages of docs generation:
+
+- sections: ApiDocsGenerator.get_sections() (view / serializer introspection)
+- markdown: rendering all the docstrings as markdown
+- templates: rendering the full docs page
+
+Usage (from the repository root):
+
+    python benchmarks/docs_generation.py --viewsets 100 --actions 8 --fields 20
+
+No database or other external services are needed. By default tg_apicore's internal caches are cleared before each
+repetition, to measure the uncached cost. Use --keep-caches to measure the warm (cached) cost instead.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+
+
+BASE_TEMPLATE = """<!doctype html>
+<html><head>{% block head_extra %}{% endblock head_extra %}</head>
+<body>{% block body_content %}{% endblock %}</body></html>
+"""
+
+DOCSTRING = """ %(name)s API - synthetic viewset used for benchmarking.
+
+Provides *CRUD* functionality for `%(name)s` objects, plus some custom actions.
+
+## Details
+
+- Objects can be listed by everyone
+- Changes can be made only by admins
+
+```json
+{"type": "%(name)s", "id": "1"}
+```
+"""
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmark',
+        DATABASES={},
+        INSTALLED_APPS=[
+            'django.contrib.contenttypes',
+            'django.contrib.auth',
+            'rest_framework',
+            'tg_apicore',
+        ],
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {
+                'loaders': [
+                    ('django.template.loaders.locmem.Loader', {'base.html': BASE_TEMPLATE}),
+                    'django.template.loaders.app_directories.Loader',
+                ],
+            },
+        }],
+        ROOT_URLCONF=__name__,
+        REST_FRAMEWORK={
+            'ALLOWED_VERSIONS': ('2018-01-01',),
+        },
+    )
+    django.setup()
+
+
+def build_api(viewsets_count, actions_count, fields_count):
+    """ Returns urlpatterns of a synthetic API """
+
+    from django.conf.urls import include, url
+
+    from rest_framework import mixins, serializers, viewsets
+    from rest_framework.decorators import action
+
+    from tg_apicore.docs import add_api_docs, api_method_docs, api_section_docs
+    from tg_apicore.routers import Router
+    from tg_apicore.viewsets import DetailSerializerViewSet
+
+    standard_actions = [
+        ('list', mixins.ListModelMixin),
+        ('create', mixins.CreateModelMixin),
+        ('retrieve', mixins.RetrieveModelMixin),
+        ('partial_update', mixins.UpdateModelMixin),
+        ('destroy', mixins.DestroyModelMixin),
+    ][:actions_count]
+    extra_actions_count = max(actions_count - len(standard_actions), 0)
+
+    router = Router()
+    for i in range(viewsets_count):
+        name = 'resource%d' % i
+
+        serializer_fields = {
+            'field%d' % j: serializers.CharField(help_text="Field number %d of %s" % (j, name), required=j % 2 == 0)
+            for j in range(fields_count)
+        }
+        serializer_class = type('%sSerializer' % name.capitalize(), (serializers.Serializer,), serializer_fields)
+
+        attrs = {
+            '__doc__': DOCSTRING % {'name': name},
+            'serializer_class': serializer_class,
+        }
+        for j in range(extra_actions_count):
+            def extra_action(self, request, *args, **kwargs):
+                """ Custom action with `markdown` docs """
+
+            extra_action.__name__ = 'action%d' % j
+            attrs[extra_action.__name__] = action(detail=j % 2 == 0, methods=['post'])(extra_action)
+
+        bases = tuple(mixin for _, mixin in standard_actions) + (viewsets.GenericViewSet, DetailSerializerViewSet)
+        viewset = type('%sViewSet' % name.capitalize(), bases, attrs)
+
+        example_data = {
+            'type': name, 'id': '1',
+            'attributes': {field_name: 'value' for field_name in serializer_fields},
+            'links': {'self': '%%(API_ROOT)s/%s/1/' % name},
+        }
+        viewset = add_api_docs(
+            api_section_docs(data=example_data, changelog={'2018-01-01': "Added `%s`" % name}),
+            api_method_docs('list', response_data={'data': [example_data]}),
+            api_method_docs('create', request_data={'data': example_data}, responses={201: {'data': example_data}}),
+            api_method_docs('retrieve', response_data={'data': example_data}),
+        )(viewset)
+
+        router.register(name, viewset, name)
+
+    return [url(r'^api/', include(router.urls))]
+
+
+class Benchmark:
+    def __init__(self, patterns, repeat, keep_caches) -> None:
+        super().__init__()
+        self.patterns = patterns
+        self.repeat = repeat
+        self.keep_caches = keep_caches
+
+    def get_generator(self):
+        from tg_apicore.schemas import ApiDocsGenerator
+
+        return ApiDocsGenerator(
+            title="Benchmark API", description=DOCSTRING % {'name': 'benchmark'},
+            site_url='https://example.com', base_path='/api/', patterns=self.patterns,
+        )
+
+    def clear_caches(self):
+        from tg_apicore.highlighting import HIGHLIGHT_CACHE
+        from tg_apicore.schemas import DOCS_CACHE, SERIALIZER_FIELDS_CACHE
+        from tg_apicore.templatetags.tg_apicore import MARKDOWN_CACHE
+
+        if not self.keep_caches:
+            for cache in (DOCS_CACHE, SERIALIZER_FIELDS_CACHE, HIGHLIGHT_CACHE, MARKDOWN_CACHE):
+                cache.clear()
+
+    def stage_sections(self):
+        generator = self.get_generator()
+        generator.endpoints = generator.endpoint_inspector_cls(generator.patterns, generator.urlconf) \
+            .get_api_endpoints()
+        return generator.get_sections()
+
+    def stage_markdown(self, docs):
+        from tg_apicore.templatetags.tg_apicore import render_markdown_with_toc
+
+        render_markdown_with_toc(docs.description)
+        for section in docs.sections:
+            render_markdown_with_toc(section.docstring)
+            for method_doc in section.methods:
+                render_markdown_with_toc(method_doc.docstring)
+
+    def stage_templates(self, docs):
+        from django.template.loader import render_to_string
+
+        from tg_apicore.highlighting import highlight_css
+
+        return render_to_string('tg_apicore/docs/index.html', {
+            'api': docs,
+            'code_style': highlight_css('emacs'),
+        })
+
+    def measure(self, func, *args):
+        """ Returns (list of timings, peak memory) of the given function """
+
+        if self.keep_caches:
+            # Warm up the caches
+            func(*args)
+
+        timings = []
+        for _ in range(self.repeat):
+            self.clear_caches()
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+
+        # Memory is measured separately since tracing slows things down
+        self.clear_caches()
+        tracemalloc.start()
+        try:
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return timings, peak
+
+    def run(self):
+        docs = self.get_generator().get_docs()
+
+        return [
+            ('sections', self.measure(self.stage_sections)),
+            ('markdown', self.measure(self.stage_markdown, docs)),
+            ('templates', self.measure(self.stage_templates, docs)),
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API docs generation")
+    parser.add_argument('--viewsets', type=int, default=50, help="Number of viewsets (N)")
+    parser.add_argument('--actions', type=int, default=8, help="Number of actions per viewset (M)")
+    parser.add_argument('--fields', type=int, default=20, help="Number of serializer fields per viewset (K)")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of repetitions of each stage")
+    parser.add_argument('--keep-caches', action='store_true', help="Don't clear tg_apicore caches between runs")
+    args = parser.parse_args()
+
+    setup_django()
+    patterns = build_api(args.viewsets, args.actions, args.fields)
+    # Stages are resolved via the root urlconf
+    globals()['urlpatterns'] = patterns
+
+    print("Docs generation: %d viewsets x %d actions x %d fields, %d repetitions%s" % (
+        args.viewsets, args.actions, args.fields, args.repeat, " (warm caches)" if args.keep_caches else "",
+    ))
+    print("%-10s %12s %12s %14s" % ("stage", "min (ms)", "mean (ms)", "peak mem (KiB)"))
+
+    for name, (timings, peak) in Benchmark(patterns, args.repeat, args.keep_caches).run():
+        print("%-10s %12.1f %12.1f %14.1f" % (
+            name, min(timings) * 1000, statistics.mean(timings) * 1000, peak / 1024,
+        ))
+
+
+if __name__ == '__main__':
+    main()
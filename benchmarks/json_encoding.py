@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+""" Throughput benchmark for JSON encoding backends of tg_apicore's renderers
+
+Renders a synthetic JSON API list response (with datetimes, Decimals, UUIDs and lazy strings) using each available
+backend (see tg_apicore.encoders) and reports time per response and throughput.
+
+Usage (from the repository root):
+
+    python benchmarks/json_encoding.py --objects 1000 --repeat 20
+"""
+
+import argparse
+import datetime
+import decimal
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import django
+from django.conf import settings
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    settings.configure(
+        SECRET_KEY='benchmark',
+        INSTALLED_APPS=['rest_framework', 'tg_apicore'],
+        REST_FRAMEWORK={
+            'ALLOWED_VERSIONS': ('2018-01-01',),
+        },
+    )
+    django.setup()
+
+
+def build_response(objects_count):
+    from django.utils import timezone
+    from django.utils.translation import gettext_lazy
+
+    now = timezone.now()
+    return {
+        'data': [
+            {
+                'type': 'company',
+                'id': str(i),
+                'attributes': {
+                    'created': now - datetime.timedelta(days=i),
+                    'updated': now,
+                    'reg_code': '%03d-%04d' % (i % 1000, i),
+                    'name': "Company number %d" % i,
+                    'email': 'company%d@example.com' % i,
+                    'revenue': decimal.Decimal('%d.50' % (i * 1000)),
+                    'uuid': uuid.uuid4(),
+                    'status': gettext_lazy("Active"),
+                },
+                'relationships': {
+                    'employees': {
+                        'meta': {'count': 2},
+                        'data': [
+                            {'type': 'employment', 'id': str(i * 2)},
+                            {'type': 'employment', 'id': str(i * 2 + 1)},
+                        ],
+                    },
+                },
+                'links': {'self': 'https://example.com/api/2018-01-01/companies/%d/' % i},
+            }
+            for i in range(objects_count)
+        ],
+        'links': {'next': None, 'prev': None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding backends")
+    parser.add_argument('--objects', type=int, default=1000, help="Number of objects in the response")
+    parser.add_argument('--repeat', type=int, default=20, help="Number of repetitions")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from tg_apicore.encoders import JSON_BACKEND_ORJSON, JSON_BACKEND_STDLIB, orjson
+    from tg_apicore.renderers import PureJSONRenderer
+
+    backends = [JSON_BACKEND_STDLIB]
+    if orjson is not None:
+        backends.append(JSON_BACKEND_ORJSON)
+
+    data = build_response(args.objects)
+    renderer = PureJSONRenderer()
+
+    print("JSON encoding: %d objects, %d repetitions" % (args.objects, args.repeat))
+    print("%-10s %12s %12s %12s" % ("backend", "min (ms)", "mean (ms)", "MiB/s"))
+
+    for backend in backends:
+        settings.TG_APICORE_JSON_BACKEND = backend
+
+        timings = []
+        size = 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            size = len(renderer.render(data))
+            timings.append(time.perf_counter() - start)
+
+        print("%-10s %12.2f %12.2f %12.1f" % (
+            backend, min(timings) * 1000, statistics.mean(timings) * 1000, size / min(timings) / 1024 / 1024,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+from tg_apicore.request_cache import get_request_cache
+
+from companies.models import Employment
+
+
+def get_company_roles_namespace(user):
+    return 'company_roles', user.pk
+
+
+def get_company_roles(request) -> dict:
+    """ Returns {company_id: role} dict of the current user's employments
+
+    All the employments are fetched in a single query, once per request.
+    """
+
+    user = request.user
+    if not user.is_authenticated:
+        return {}
+
+    cache = get_request_cache(request)
+    namespace = get_company_roles_namespace(user)
+    if not cache.is_complete(namespace):
+        cache.prefetch(namespace, Employment.objects.filter(user=user).values_list('company_id', 'role'))
+
+    return cache.get_values(namespace)
+
+
+def get_company_role(request, company_id):
+    """ Returns current user's role in the given company, or None if the user isn't its employee
+    """
+
+    return get_company_roles(request).get(company_id)
+
+
+def is_company_admin(request, company_id) -> bool:
+    return get_company_role(request, company_id) == Employment.ROLE_ADMIN
+
+
+def invalidate_company_roles(request):
+    """ Must be called after current user's employments change
+    """
+
+    get_request_cache(request).invalidate(get_company_roles_namespace(request.user))
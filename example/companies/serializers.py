@@ -3,6 +3,7 @@ from rest_framework_json_api import serializers
 from tg_apicore.serializers import BaseModelSerializer
 
 from companies.models import Company, Employment, User
+from companies.permissions import is_company_admin
 
 
 class EmploymentSummarySerializer(BaseModelSerializer):
@@ -34,8 +35,7 @@ class EmploymentSerializer(EmploymentSummarySerializer):
     }
 
     def validate_company(self, value):
-        user = self.context['request'].user
-        if not Employment.objects.filter(company=value, user=user, role=Employment.ROLE_ADMIN).exists():
+        if not is_company_admin(self.context['request'], value.pk):
             raise serializers.ValidationError("You are not admin in the specified company", code='user_not_admin')
 
         return value
@@ -2,10 +2,11 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly, SAFE_METHODS,
 from rest_framework.viewsets import ModelViewSet
 
 from tg_apicore.docs import add_api_docs, api_section_docs, api_method_docs
-from tg_apicore.viewsets import DetailSerializerViewSet
+from tg_apicore.viewsets import DetailSerializerViewSet, StreamingListMixin
 
 from companies import api_docs
 from companies.models import Company, Employment
+from companies.permissions import get_company_role, get_company_roles, invalidate_company_roles, is_company_admin
 from companies.serializers import CompanySerializer, EmploymentSerializer, CompanySummarySerializer, \
     EmploymentSummarySerializer
 
@@ -40,7 +41,7 @@ from companies.serializers import CompanySerializer, EmploymentSerializer, Compa
         responses=api_docs.COMPANIES_DELETE_RESPONSES,
     ),
 )
-class CompanyViewSet(ModelViewSet, DetailSerializerViewSet):
+class CompanyViewSet(StreamingListMixin, ModelViewSet, DetailSerializerViewSet):
     """ Companies API - provides CRUD functionality for companies.
 
     If a user creates a company, they'll automatically become employee of that company, in admin role.
@@ -55,28 +56,34 @@ class CompanyViewSet(ModelViewSet, DetailSerializerViewSet):
     serializer_class = CompanySummarySerializer
     serializer_detail_class = CompanySerializer  # only for employees, see get_detail_serializer_class()
     serializer_modify_class = CompanySerializer
+    prune_columns = True
+    last_modified_field = 'updated'
 
     def get_detail_serializer_class(self):
         # Detail serializer is only for employees
         company = self.get_object()
-        user = self.request.user
-        if company is not None and user.is_authenticated and \
-                Employment.objects.filter(company=company, user=user).exists():
+        if company is not None and get_company_role(self.request, company.pk) is not None:
             return self.serializer_detail_class
 
         return self.get_list_serializer_class()
 
+    def get_response_cache_scope(self):
+        # Company data doesn't depend on the user (other than via serializer class, which is part of the cache key)
+        return 'public'
+
     def check_object_permissions(self, request, obj):
         super().check_object_permissions(request, obj)
 
         # Unsafe methods (= editing) can be used only by managers
         if request.method not in SAFE_METHODS:
-            if not Employment.objects.filter(company=obj, user=request.user, role=Employment.ROLE_ADMIN).exists():
+            if not is_company_admin(request, obj.pk):
                 self.permission_denied(request)
 
     # pylint: disable=useless-super-delegation
     def list(self, request, *args, **kwargs):
         """ List all companies.
+
+        Use `?stream=1` to fetch all the companies at once, without pagination.
         """
 
         return super().list(request, *args, **kwargs)
@@ -101,6 +108,9 @@ class CompanyViewSet(ModelViewSet, DetailSerializerViewSet):
 
         company = serializer.instance
         Employment.objects.create(company=company, user=self.request.user, role=Employment.ROLE_ADMIN)
+        # Serializer class depends on the employments
+        invalidate_company_roles(self.request)
+        self.invalidate_memoized('serializer_class')
 
 
 @add_api_docs(
@@ -116,7 +126,7 @@ class CompanyViewSet(ModelViewSet, DetailSerializerViewSet):
         responses=api_docs.EMPLOYMENTS_CREATE_RESPONSES,
     ),
 )
-class EmploymentViewSet(ModelViewSet, DetailSerializerViewSet):
+class EmploymentViewSet(StreamingListMixin, ModelViewSet, DetailSerializerViewSet):
     """ Employee management API.
 
     Employees can only be changed by admins of a company, and can be viewed by all employees of a company.
@@ -126,14 +136,15 @@ class EmploymentViewSet(ModelViewSet, DetailSerializerViewSet):
     queryset = Employment.objects.all()
     serializer_class = EmploymentSummarySerializer
     serializer_detail_class = EmploymentSerializer
+    prune_columns = True
+    last_modified_field = 'updated'
 
     def check_object_permissions(self, request, obj):
         super().check_object_permissions(request, obj)
 
         # Unsafe methods (= editing) can be used only by managers
         if request.method not in SAFE_METHODS:
-            if not Employment.objects.filter(company_id=obj.company_id, user=request.user, role=Employment.ROLE_ADMIN) \
-                    .exists():
+            if not is_company_admin(request, obj.company_id):
                 self.permission_denied(request)
 
     def get_list_queryset(self):
@@ -143,5 +154,4 @@ class EmploymentViewSet(ModelViewSet, DetailSerializerViewSet):
         if not self.request.user.is_authenticated:
             return Employment.objects.none()
 
-        user_companies = Employment.objects.filter(user=self.request.user).values_list('company_id', flat=True)
-        return super().get_list_queryset().filter(company__in=user_companies)
+        return super().get_list_queryset().filter(company__in=list(get_company_roles(self.request)))
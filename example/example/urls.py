@@ -10,7 +10,7 @@ from example.views import ExampleAPIDocumentationView
 urlpatterns = [
     url(r'^$', TemplateView.as_view(template_name='home.html'), name='home'),
 
-    url(r'^api-docs/', ExampleAPIDocumentationView.as_view(), name='api-docs'),
+    url(r'^api-docs/', include(ExampleAPIDocumentationView.docs_urlpatterns())),
     url(r'^api/(?P<version>(\d{4}-\d{2}-\d{2}))/', include('example.urls_api')),
 
     # API-specific 404 for everything under api/ prefix
@@ -17,8 +17,7 @@ class ExampleAPIDocumentationView(APIDocumentationView):
         return settings.SITE_URL
 
     def get_base_path(self) -> str:
-        docs_version = settings.API_VERSION_LATEST
-        return '/api/%s/' % docs_version
+        return '/api/%s/' % self.get_api_version()
 
     def urlpatterns(self) -> list:
         from example import urls_api
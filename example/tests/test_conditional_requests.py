@@ -0,0 +1,212 @@
+from datetime import timedelta
+
+import pytest
+
+from django.utils import timezone
+from django.utils.http import http_date
+
+from tg_apicore.renderers import JSONRenderer
+from tg_apicore.test import APIClient, validate_jsonapi_detail_response, validate_jsonapi_error_response
+
+from companies.models import Company, Employment, User
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    rendered = []
+    render = JSONRenderer.render
+
+    def counting_render(self, data, *args, **kwargs):
+        rendered.append(data)
+        return render(self, data, *args, **kwargs)
+
+    monkeypatch.setattr(JSONRenderer, 'render', counting_render)
+    return rendered
+
+
+@pytest.mark.django_db
+def test_conditional_get(employment: Employment, rendered):
+    """ Clients which already have the current version of the object should get 304 without it being rendered.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('employment-detail', pk=employment.pk)
+
+    resp = client.get(url)
+    validate_jsonapi_detail_response(resp)
+    etag = resp['ETag']
+    assert resp['Last-Modified'] == http_date(int(employment.updated.timestamp()))
+    assert len(rendered) == 1
+
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    assert resp.content == b''
+    assert resp['ETag'] == etag
+    assert len(rendered) == 1
+
+    resp = client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+    assert resp.status_code == 304
+
+    # ETags of other objects don't match
+    resp = client.get(client.reverse('company-detail', pk=employment.company_id), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp['ETag'] != etag
+
+    employment.save()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    validate_jsonapi_detail_response(resp)
+    assert resp['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_conditional_get_per_serializer(employment: Employment, other_user: User):
+    """ ETag depends on the serializer - company's employees see more details than others.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('company-detail', pk=employment.company_id)
+    etag = client.get(url)['ETag']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    client.force_authenticate(other_user)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    data = validate_jsonapi_detail_response(resp)
+    assert 'employees' not in data['data'].get('relationships', {})
+    assert resp['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_conditional_get_related_objects(employment: Employment, other_user: User, rendered):
+    """ ETag depends on the related objects too - e.g. on company's employees, which are also included.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('company-detail', pk=employment.company_id)
+
+    resp = client.get(url)
+    etag = resp['ETag']
+    # Removing employees wouldn't change any modification time
+    assert not resp.has_header('Last-Modified')
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # Changes of included resources
+    Employment.objects.filter(pk=employment.pk).update(role=Employment.ROLE_NORMAL, updated=timezone.now())
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp['ETag'] != etag
+    etag = resp['ETag']
+
+    # Changes of relationships
+    other = Employment.objects.create(user=other_user, company=employment.company)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    data = validate_jsonapi_detail_response(resp)
+    assert [obj['id'] for obj in data['data']['relationships']['employees']['data']] == [
+        str(employment.pk), str(other.pk),
+    ]
+    etag = resp['ETag']
+
+    other.delete()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_conditional_get_related_single_objects(employment: Employment):
+    """ Objects with only single-valued relations get Last-Modified of the latest modified related object.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('employment-detail', pk=employment.pk)
+    etag = client.get(url)['ETag']
+
+    Company.objects.filter(pk=employment.company_id).update(name='Renamed', updated=timezone.now() + timedelta(1))
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    data = validate_jsonapi_detail_response(resp)
+    assert data['included'][0]['attributes']['name'] == 'Renamed'
+    assert resp['ETag'] != etag
+    assert resp['Last-Modified'] == http_date(int(Company.objects.get().updated.timestamp()))
+
+
+@pytest.mark.django_db
+def test_conditional_get_representation_params(employment: Employment):
+    """ Different includes and sparse fieldsets have different ETags, equivalent ones have the same ETag.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('employment-detail', pk=employment.pk)
+    etag = client.get(url)['ETag']
+
+    for params in [{'fields[employment]': 'role,email'}, {'fields[company]': 'name,reg_code'}]:
+        resp = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+        assert resp['ETag'] != etag
+        assert client.get(url, params, HTTP_IF_NONE_MATCH=resp['ETag']).status_code == 304
+
+    # company is included by default, the order of sparse fieldsets doesn't matter
+    assert client.get(url, {'include': 'company'}, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    fields_etag = client.get(url, {'fields[employment]': 'role,email'})['ETag']
+    assert client.get(url, {'fields[employment]': 'email,role'}, HTTP_IF_NONE_MATCH=fields_etag).status_code == 304
+
+    # If-Match only depends on the state of the object, not on its representation
+    patch_data = {
+        'data': {'type': 'employment', 'id': str(employment.pk), 'attributes': {'role': Employment.ROLE_ADMIN}},
+    }
+    resp = client.patch(url, patch_data, HTTP_IF_MATCH=fields_etag)
+    validate_jsonapi_detail_response(resp)
+    resp = client.patch(url, patch_data, HTTP_IF_MATCH=fields_etag)
+    validate_jsonapi_error_response(resp, expected_status_code=412)
+
+
+@pytest.mark.django_db
+def test_if_match_default_include(employment: Employment):
+    """ Explicitly including the default included resources doesn't change the ETag, so it can be used for If-Match.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('company-detail', pk=employment.company.pk)
+    etag = client.get(url)['ETag']
+    resp = client.get(url, {'include': 'employees'})
+    assert resp['ETag'] == etag
+
+    patch_data = {'data': {'type': 'company', 'id': str(employment.company.pk), 'attributes': {'name': 'Renamed'}}}
+    resp = client.patch(url, patch_data, HTTP_IF_MATCH=resp['ETag'])
+    validate_jsonapi_detail_response(resp)
+    assert Company.objects.get().name == 'Renamed'
+
+
+@pytest.mark.django_db
+def test_if_match(employment: Employment, other_user: User):
+    """ Unsafe requests should fail with 412 if the object has been changed in the meantime.
+    """
+
+    other_employment = Employment.objects.create(company=employment.company, user=other_user)
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('employment-detail', pk=other_employment.pk)
+    etag = client.get(url)['ETag']
+
+    patch_data = {
+        'data': {'type': 'employment', 'id': str(other_employment.pk), 'attributes': {'role': Employment.ROLE_ADMIN}},
+    }
+    resp = client.patch(url, patch_data, HTTP_IF_MATCH=etag)
+    validate_jsonapi_detail_response(resp)
+    new_etag = resp['ETag']
+    assert new_etag != etag
+    assert client.get(url, HTTP_IF_NONE_MATCH=new_etag).status_code == 304
+
+    # Stale ETag
+    resp = client.patch(url, patch_data, HTTP_IF_MATCH=etag)
+    validate_jsonapi_error_response(resp, expected_status_code=412)
+    resp = client.delete(url, HTTP_IF_MATCH=etag)
+    validate_jsonapi_error_response(resp, expected_status_code=412)
+    assert Employment.objects.filter(pk=other_employment.pk).exists()
+
+    resp = client.delete(url, HTTP_IF_MATCH=new_etag)
+    assert resp.status_code == 204
+    assert not Employment.objects.filter(pk=other_employment.pk).exists()
@@ -0,0 +1,195 @@
+import gzip
+import json
+
+import pytest
+
+from django.conf import settings
+from django.conf.urls import url
+from django.test import Client
+from django.urls import reverse
+from django.utils import translation
+
+from rest_framework import serializers
+
+from tg_apicore.schemas import (DOCS_CACHE, SERIALIZER_FIELDS_CACHE, ApiDocsGenerator, get_serializer_fields_docs,
+                                get_urlpatterns_fingerprint)
+from tg_apicore.views import SECTION_FRAGMENTS_CACHE
+
+from companies.serializers import CompanySerializer
+from companies.views import CompanyViewSet
+from example.views import ExampleAPIDocumentationView
+
+
+@pytest.fixture(autouse=True)
+def clear_docs_cache():
+    DOCS_CACHE.clear()
+    SECTION_FRAGMENTS_CACHE.clear()
+    yield
+    DOCS_CACHE.clear()
+    SECTION_FRAGMENTS_CACHE.clear()
+
+
+@pytest.mark.django_db
+def test_docs_view():
+    client = Client()
+
+    resp = client.get(reverse('api-docs'))
+    assert resp.status_code == 200
+    assert b'section-companies' in resp.content
+
+
+@pytest.mark.django_db
+def test_docs_view_cached(monkeypatch):
+    """ Docs should be generated only once, as long as the urls don't change.
+    """
+
+    calls = []
+    original_get_docs = ApiDocsGenerator.get_docs
+
+    def get_docs(self):
+        calls.append(self)
+        return original_get_docs(self)
+
+    monkeypatch.setattr(ApiDocsGenerator, 'get_docs', get_docs)
+
+    client = Client()
+    first = client.get(reverse('api-docs'))
+    second = client.get(reverse('api-docs'))
+    assert first.content == second.content
+    assert len(calls) == 1
+
+    # Docs are translated, thus cached per language
+    with translation.override('et'):
+        client.get(reverse('api-docs'))
+    assert len(calls) == 2
+    client.get(reverse('api-docs'))
+    assert len(calls) == 2
+
+
+def test_urlpatterns_fingerprint(monkeypatch):
+    patterns = ExampleAPIDocumentationView().urlpatterns()
+    fingerprint = get_urlpatterns_fingerprint(patterns)
+
+    # Fingerprint is stable
+    assert get_urlpatterns_fingerprint(ExampleAPIDocumentationView().urlpatterns()) == fingerprint
+
+    # Changing the urls changes the fingerprint
+    extra_pattern = url(r'^extra/$', CompanyViewSet.as_view({'get': 'list'}))
+    assert get_urlpatterns_fingerprint(patterns + [extra_pattern]) != fingerprint
+
+    # So does changing the docs of a view
+    docs = CompanyViewSet.api_core_docs
+    monkeypatch.setattr(CompanyViewSet, 'api_core_docs', type(docs)(data={'changed': True}))
+    assert get_urlpatterns_fingerprint(patterns) != fingerprint
+
+
+@pytest.mark.django_db
+def test_docs_section_view():
+    client = Client()
+
+    resp = client.get(reverse('api-docs-section', kwargs={'section': 'companies'}))
+    assert resp.status_code == 200
+    assert b'section-companies-list' in resp.content
+    assert b'section-employments' not in resp.content
+    etag = resp['ETag']
+    assert etag.startswith('"') and etag.endswith('"')
+
+    # Conditional request with matching ETag gets empty 304 response
+    resp = client.get(reverse('api-docs-section', kwargs={'section': 'companies'}), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    assert resp.content == b''
+
+    # Other sections have different ETags
+    resp = client.get(reverse('api-docs-section', kwargs={'section': 'employments'}), HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp['ETag'] != etag
+
+    resp = client.get(reverse('api-docs-section', kwargs={'section': 'nonexistent'}))
+    assert resp.status_code == 404
+
+
+@pytest.mark.django_db
+def test_docs_view_lazy_sections(monkeypatch):
+    monkeypatch.setattr(ExampleAPIDocumentationView, 'lazy_sections', True)
+
+    resp = Client().get(reverse('api-docs'))
+    assert resp.status_code == 200
+    # Sidebar is there, but sections' contents aren't
+    assert b'href="#section-companies-list"' in resp.content
+    assert b'id="section-companies-list"' not in resp.content
+    assert b'data-src="/api-docs/sections/companies/"' in resp.content
+
+
+@pytest.mark.django_db
+def test_docs_openapi_view():
+    client = Client()
+
+    resp = client.get(reverse('api-docs-openapi'))
+    assert resp.status_code == 200
+    assert resp['Content-Type'] == 'application/json'
+    schema = json.loads(resp.content.decode())
+
+    assert schema['openapi'].startswith('3.')
+    assert schema['info']['version'] == settings.API_VERSION_LATEST
+    assert schema['servers'] == [{'url': 'http://127.0.0.1:8000/api/%s' % settings.API_VERSION_LATEST}]
+
+    create_op = schema['paths']['/companies/']['post']
+    assert create_op['operationId'] == 'companies_create'
+    assert create_op['requestBody']['content']['application/json']['example']['data']['type'] == 'company'
+    assert set(create_op['responses'].keys()) == {'201', '400'}
+    assert schema['paths']['/companies/{id}/']['get']['parameters'][0]['name'] == 'id'
+
+    company_schema = schema['components']['schemas']['companies']
+    assert company_schema['properties']['reg_code'] == {
+        'description': 'Reg code', 'x-createOnly': True,
+    }
+    assert company_schema['properties']['created']['readOnly'] is True
+    assert company_schema['required'] == ['reg_code', 'name']
+
+    # Conditional requests
+    resp = client.get(reverse('api-docs-openapi'), HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert resp.status_code == 304
+
+
+@pytest.mark.django_db
+def test_docs_openapi_view_gzip():
+    client = Client()
+
+    plain = client.get(reverse('api-docs-openapi'))
+    resp = client.get(reverse('api-docs-openapi'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert resp.status_code == 200
+    assert resp['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp['Vary']
+    assert gzip.decompress(resp.content) == plain.content
+
+    # Each variant has its own ETag
+    assert resp['ETag'] != plain['ETag']
+    resp = client.get(reverse('api-docs-openapi'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=resp['ETag'])
+    assert resp.status_code == 304
+    resp = client.get(reverse('api-docs-openapi'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag'])
+    assert resp.status_code == 200
+
+
+def test_serializer_fields_docs_cached():
+    SERIALIZER_FIELDS_CACHE.clear()
+
+    view = ExampleAPIDocumentationView()
+    first_docs = view.generate_docs()
+    misses = SERIALIZER_FIELDS_CACHE.misses
+    assert misses == len(first_docs.sections)
+
+    # Generating the docs again reuses the fields
+    second_docs = view.generate_docs()
+    assert SERIALIZER_FIELDS_CACHE.misses == misses
+    assert SERIALIZER_FIELDS_CACHE.hits == len(first_docs.sections)
+    assert second_docs.sections[0].fields == first_docs.sections[0].fields
+
+    fields = get_serializer_fields_docs(CompanySerializer)
+    assert fields == first_docs.sections[0].fields
+    assert [field.name for field in fields if field.is_create_only] == ['reg_code']
+
+    # Plain serializers don't need to have Meta class
+    class NameSerializer(serializers.Serializer):
+        name = serializers.CharField()
+
+    assert [field.name for field in get_serializer_fields_docs(NameSerializer)] == ['name']
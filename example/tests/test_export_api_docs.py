@@ -0,0 +1,76 @@
+import json
+import os
+from io import StringIO
+
+from django.conf import settings as django_settings
+from django.core.management import call_command
+
+
+VIEW_PATH = 'example.views.ExampleAPIDocumentationView'
+
+
+def test_export_api_docs(tmpdir):
+    out = StringIO()
+    call_command('export_api_docs', VIEW_PATH, str(tmpdir), processes=1, stdout=out)
+    assert 'rendered 2 sections, reused 0 sections' in out.getvalue()
+
+    version_dir = os.path.join(str(tmpdir), django_settings.API_VERSION_LATEST)
+    with open(os.path.join(version_dir, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    assert 'section-companies' in html
+    assert 'section-employments-create' in html
+
+    assert sorted(os.listdir(os.path.join(version_dir, 'sections'))) == ['companies.html', 'employments.html']
+
+    with open(os.path.join(version_dir, 'api.json'), encoding='utf-8') as f:
+        api = json.load(f)
+    assert [section['name'] for section in api['sections']] == ['companies', 'employments']
+
+
+def test_export_api_docs_incremental(tmpdir):
+    call_command('export_api_docs', VIEW_PATH, str(tmpdir), processes=1, stdout=StringIO())
+
+    out = StringIO()
+    call_command('export_api_docs', VIEW_PATH, str(tmpdir), processes=1, incremental=True, stdout=out)
+    assert 'rendered 0 sections, reused 2 sections' in out.getvalue()
+
+    # Changed sections are rendered again
+    manifest_path = os.path.join(str(tmpdir), django_settings.API_VERSION_LATEST, 'manifest.json')
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['sections']['companies'] = 'outdated'
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    out = StringIO()
+    call_command('export_api_docs', VIEW_PATH, str(tmpdir), processes=1, incremental=True, stdout=out)
+    assert 'rendered 1 sections, reused 1 sections' in out.getvalue()
+
+
+def test_export_api_docs_incremental_template_override(tmpdir, settings):
+    """ Overriding section templates in the project should cause all sections to be rendered again.
+    """
+
+    output_dir = tmpdir.mkdir('output')
+    call_command('export_api_docs', VIEW_PATH, str(output_dir), processes=1, stdout=StringIO())
+
+    templates_dir = tmpdir.mkdir('templates')
+    templates_dir.mkdir('tg_apicore').mkdir('docs').join('method-python.html').write('custom example')
+    settings.TEMPLATES = [dict(settings.TEMPLATES[0], DIRS=[str(templates_dir)] + settings.TEMPLATES[0]['DIRS'])]
+
+    out = StringIO()
+    call_command('export_api_docs', VIEW_PATH, str(output_dir), processes=1, incremental=True, stdout=out)
+    assert 'rendered 2 sections, reused 0 sections' in out.getvalue()
+
+
+def test_export_api_docs_multiprocess(tmpdir, settings):
+    versions = ('2018-01-01', settings.API_VERSION_LATEST)
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, ALLOWED_VERSIONS=versions)
+
+    out = StringIO()
+    call_command('export_api_docs', VIEW_PATH, str(tmpdir), processes=2, stdout=out)
+
+    for version in versions:
+        assert '%s: rendered 2 sections' % version in out.getvalue()
+        with open(os.path.join(str(tmpdir), version, 'index.html'), encoding='utf-8') as f:
+            assert '/api/%s/companies/' % version in f.read()
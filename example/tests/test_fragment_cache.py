@@ -0,0 +1,167 @@
+import json
+
+import pytest
+
+from django.core.cache import cache
+
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.versioning import URLPathVersioning
+
+from tg_apicore.renderers import JSONRenderer
+from tg_apicore.settings import get_latest_version
+from tg_apicore.test import APIClient, validate_jsonapi_detail_response, validate_jsonapi_list_response
+from tg_apicore.transformers import VersionTransformer
+
+from companies.factories import CompanyFactory
+from companies.models import Company, Employment, User
+from companies.serializers import CompanySummarySerializer
+from companies.views import CompanyViewSet, EmploymentViewSet
+
+
+class CompanyTitleTransformer(VersionTransformer):
+    def convert_output_object(self, obj_type, obj_id, fields):
+        fields['title'] = fields.pop('name')
+        return fields
+
+
+@pytest.fixture(autouse=True)
+def fragment_cache(settings, monkeypatch):
+    settings.TG_APICORE_FRAGMENT_CACHE = 'default'
+    cache.clear()
+
+    built = []
+    build_json_resource_obj = JSONRenderer.build_json_resource_obj.__func__
+
+    def counting_build_json_resource_obj(cls, fields, resource, resource_instance, *args, **kwargs):
+        built.append(resource_instance)
+        return build_json_resource_obj(cls, fields, resource, resource_instance, *args, **kwargs)
+
+    monkeypatch.setattr(JSONRenderer, 'build_json_resource_obj', classmethod(counting_build_json_resource_obj))
+
+    yield built
+    cache.clear()
+
+
+def render_companies(version, version_transformers):
+    request = Request(APIRequestFactory().get('/'))
+    request.version = version
+    request.versioning_scheme = URLPathVersioning()
+    request.version_transformers = version_transformers
+    view = CompanyViewSet(request=request, format_kwarg=None, args=(), kwargs={}, action='list')
+
+    serializer = CompanySummarySerializer(Company.objects.order_by('id'), many=True, context={'request': request})
+    response = Response(serializer.data)
+    renderer_context = {'request': request, 'view': view, 'response': response}
+    return json.loads(JSONRenderer().render(response.data, renderer_context=renderer_context).decode())
+
+
+@pytest.mark.django_db
+def test_company_list_fragments(settings, fragment_cache):
+    """ Cached fragments should be reused until the object changes, the output should be identical to the uncached one.
+    """
+
+    companies = CompanyFactory.create_batch(4)
+    client = APIClient()
+    url = client.reverse('company-list')
+
+    data = validate_jsonapi_list_response(client.get(url, {'page_size': 3}), expected_count=3)
+    assert len(fragment_cache) == 3
+
+    assert validate_jsonapi_list_response(client.get(url, {'page_size': 3})) == data
+    assert len(fragment_cache) == 3
+
+    # The first page contains the newest companies
+    companies[-1].name = 'Changed'
+    companies[-1].save()
+
+    data = validate_jsonapi_list_response(client.get(url))
+    assert len(fragment_cache) == 5
+    assert {obj['attributes']['name'] for obj in data['data']} == {'Changed'} | {c.name for c in companies[:-1]}
+
+    settings.TG_APICORE_FRAGMENT_CACHE = None
+    assert validate_jsonapi_list_response(client.get(url)) == data
+
+
+@pytest.mark.django_db
+def test_fragments_per_sparse_fieldset(settings, fragment_cache):
+    """ Fragments rendered with sparse fieldsets must not be used for other fieldsets.
+    """
+
+    CompanyFactory.create_batch(2)
+    client = APIClient()
+    url = client.reverse('company-list')
+
+    sparse_params = {'fields[company]': 'name,updated'}
+    sparse_data = validate_jsonapi_list_response(client.get(url, sparse_params), expected_count=2)
+    assert [set(obj['attributes']) for obj in sparse_data['data']] == [{'name', 'updated'}] * 2
+
+    data = validate_jsonapi_list_response(client.get(url), expected_count=2)
+    assert len(fragment_cache) == 4
+    assert all('email' in obj['attributes'] for obj in data['data'])
+
+    assert validate_jsonapi_list_response(client.get(url, sparse_params)) == sparse_data
+    assert validate_jsonapi_list_response(client.get(url)) == data
+    assert len(fragment_cache) == 4
+
+
+@pytest.mark.django_db
+def test_fragments_related_attributes(employment: Employment, fragment_cache, monkeypatch):
+    """ Attributes which come from related objects don't change `updated` of the object, but must not be stale.
+    """
+
+    monkeypatch.setattr(EmploymentViewSet, 'get_response_cache_scope', lambda self: self.request.user.pk, raising=False)
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('employment-list')
+
+    data = validate_jsonapi_list_response(client.get(url), expected_count=1)
+    assert data['data'][0]['attributes']['email'] == employment.user.email
+    assert fragment_cache == [employment]
+
+    User.objects.filter(pk=employment.user_id).update(email='changed@asd.asd')
+    data = validate_jsonapi_list_response(client.get(url), expected_count=1)
+    assert data['data'][0]['attributes']['email'] == 'changed@asd.asd'
+    assert len(fragment_cache) == 2
+
+
+@pytest.mark.django_db
+def test_company_detail_fragments(settings, employment: Employment, other_user: User, fragment_cache):
+    """ Included resources should be the same as without caching.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('company-detail', pk=employment.company_id)
+
+    data = validate_jsonapi_detail_response(client.get(url))
+    assert [obj['id'] for obj in data['included']] == [str(employment.pk)]
+    assert validate_jsonapi_detail_response(client.get(url)) == data
+    assert len([obj for obj in fragment_cache if isinstance(obj, Company)]) == 1
+
+    # Adding an employee changes relationships of the company
+    other = Employment.objects.create(user=other_user, company=employment.company)
+    data = validate_jsonapi_detail_response(client.get(url))
+    assert [obj['id'] for obj in data['data']['relationships']['employees']['data']] == [
+        str(employment.pk), str(other.pk),
+    ]
+
+    settings.TG_APICORE_FRAGMENT_CACHE = None
+    assert validate_jsonapi_detail_response(client.get(url)) == data
+
+
+@pytest.mark.django_db
+def test_fragments_per_version(fragment_cache):
+    CompanyFactory.create_batch(2)
+
+    data = render_companies(get_latest_version(), [])
+    transformed = render_companies('2018-01-01', [CompanyTitleTransformer(Company, 'list')])
+    assert len(fragment_cache) == 4
+
+    assert [obj['attributes']['title'] for obj in transformed['data']] == \
+        [obj['attributes']['name'] for obj in data['data']]
+
+    assert render_companies('2018-01-01', [CompanyTitleTransformer(Company, 'list')]) == transformed
+    assert len(fragment_cache) == 4
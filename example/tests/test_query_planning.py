@@ -0,0 +1,246 @@
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_json_api import serializers
+
+from tg_apicore.query_planning import QUERY_PLANS_CACHE, SERIALIZER_COLUMNS_CACHE, QueryPlan, get_query_plan, \
+    get_serializer_columns
+from tg_apicore.test import APIClient, validate_jsonapi_detail_response, validate_jsonapi_list_response
+
+from companies.models import Company, Employment, User
+from companies.serializers import CompanySerializer, CompanySummarySerializer, EmploymentSerializer, \
+    EmploymentSummarySerializer
+from companies.views import EmploymentViewSet
+
+
+def test_query_plans():
+    assert get_query_plan(CompanySummarySerializer, Company) == QueryPlan()
+    assert not get_query_plan(CompanySummarySerializer, Company)
+
+    # Attribute sources traversing relations
+    assert get_query_plan(EmploymentSummarySerializer, Employment) == QueryPlan(select_related=('user',))
+
+    # Relation fields, default included resources are used when nothing is requested
+    assert get_query_plan(EmploymentSerializer, Employment) == QueryPlan(select_related=('user', 'company'))
+    assert get_query_plan(CompanySerializer, Company) == QueryPlan(prefetch_related=('employees', 'employees__user'))
+
+    # Fields of the included serializers are planned only when they're included
+    assert get_query_plan(CompanySerializer, Company, []) == QueryPlan(prefetch_related=('employees',))
+    assert get_query_plan(CompanySerializer, Company, ['employees']) == \
+        get_query_plan(CompanySerializer, Company, None)
+
+
+def test_query_plans_cached():
+    QUERY_PLANS_CACHE.clear()
+
+    plan = get_query_plan(CompanySerializer, Company, ['employees'])
+    assert get_query_plan(CompanySerializer, Company, ['employees', 'employees']) is plan
+    assert QUERY_PLANS_CACHE.info()['hits'] == 1
+
+    get_query_plan(CompanySerializer, Company, [])
+    assert QUERY_PLANS_CACHE.info()['misses'] == 2
+
+
+def test_query_plans_ignore_sparse_fieldsets():
+    """ Plans are shared by all requests, thus sparse fieldsets of the request must not affect them.
+    """
+
+    QUERY_PLANS_CACHE.clear()
+
+    request = Request(APIRequestFactory().get('/', {'fields[employment]': 'role'}))
+    context = {'request': request}
+    assert get_query_plan(EmploymentSerializer, Employment, context=context) == \
+        QueryPlan(select_related=('user', 'company'))
+    assert get_query_plan(EmploymentSerializer, Employment) == QueryPlan(select_related=('user', 'company'))
+
+
+@pytest.mark.django_db
+def test_employments_list_queries(user: User, company: Company, other_user: User):
+    """ Number of queries of the list endpoint shouldn't depend on the number of objects.
+    """
+
+    client = APIClient()
+    client.force_authenticate(user)
+    url = client.reverse('employment-list')
+
+    Employment.objects.create(user=user, company=company, role=Employment.ROLE_ADMIN)
+    with CaptureQueriesContext(connection) as queries:
+        validate_jsonapi_list_response(client.get(url), expected_count=1)
+    num_queries = len(queries)
+
+    for i in range(5):
+        colleague = User.objects.create_user(username='colleague%d' % i, email='colleague%d@asd.asd' % i)
+        Employment.objects.create(user=colleague, company=company)
+
+    with CaptureQueriesContext(connection) as queries:
+        data = validate_jsonapi_list_response(client.get(url), expected_count=6)
+    assert len(queries) == num_queries
+    assert sorted(obj['attributes']['email'] for obj in data['data'])[0] == 'asd@asd.asd'
+
+
+@pytest.mark.django_db
+def test_company_detail_queries(employment: Employment, other_user: User):
+    """ Employees of the company (and their users) should be prefetched for the detail response.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+    url = client.reverse('company-detail', pk=employment.company_id)
+
+    with CaptureQueriesContext(connection) as queries:
+        validate_jsonapi_detail_response(client.get(url))
+    num_queries = len(queries)
+
+    Employment.objects.create(user=other_user, company=employment.company)
+    with CaptureQueriesContext(connection) as queries:
+        data = validate_jsonapi_detail_response(client.get(url))
+    assert len(queries) == num_queries
+    assert {obj['attributes']['name'] for obj in data['included']} == {'Test User', 'Other Person'}
+
+
+def test_serializer_columns():
+    assert get_serializer_columns(EmploymentSummarySerializer, Employment) == (
+        'id', 'created', 'updated', 'user', 'role',
+    )
+    assert get_serializer_columns(EmploymentSerializer, Employment) == (
+        'id', 'created', 'updated', 'user', 'role', 'company',
+    )
+    # Reverse relations don't need any columns
+    assert get_serializer_columns(CompanySerializer, Company) == \
+        get_serializer_columns(CompanySummarySerializer, Company)
+
+    class NameSerializer(CompanySummarySerializer):
+        class Meta(CompanySummarySerializer.Meta):
+            fields = ['id', 'name', 'pk_str']
+
+        pk_str = serializers.CharField(source='__str__')
+
+    # Columns used by model methods are unknown
+    assert get_serializer_columns(NameSerializer, Company) is None
+
+
+def test_serializer_columns_ignore_sparse_fieldsets():
+    SERIALIZER_COLUMNS_CACHE.clear()
+
+    request = Request(APIRequestFactory().get('/', {'fields[employment]': 'role'}))
+    assert get_serializer_columns(EmploymentSerializer, Employment, context={'request': request}) == (
+        'id', 'created', 'updated', 'user', 'role', 'company',
+    )
+
+
+def get_view_queryset(user: User, method='get', **kwargs):
+    request = Request(getattr(APIRequestFactory(), method)('/'))
+    request.user = user
+    view = EmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs=kwargs)
+    return view.get_queryset()
+
+
+class DeferredEmploymentViewSet(EmploymentViewSet):
+    queryset = Employment.objects.only('id', 'role', 'created', 'updated')
+    prune_columns = False
+
+
+class ValuesEmploymentViewSet(EmploymentViewSet):
+    queryset = Employment.objects.values('id', 'role')
+
+
+@pytest.mark.django_db
+def test_deferred_queryset_planned(employment: Employment):
+    """ Relations over deferred fields cannot be select_related(), they're fetched on demand instead.
+    """
+
+    request = Request(APIRequestFactory().get('/'))
+    request.user = employment.user
+    view = DeferredEmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs={})
+
+    queryset = view.get_queryset()
+    assert not queryset.query.select_related
+    assert [obj.user.email for obj in queryset] == [employment.user.email]
+
+
+@pytest.mark.django_db
+def test_values_queryset_not_planned(employment: Employment):
+    request = Request(APIRequestFactory().get('/'))
+    request.user = employment.user
+    view = ValuesEmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs={})
+
+    assert list(view.get_queryset()) == [{'id': employment.pk, 'role': employment.role}]
+
+
+@pytest.mark.django_db
+def test_employments_columns_pruned(employment: Employment):
+    """ List and detail querysets should load only the needed columns, modify querysets full instances.
+    """
+
+    queryset = get_view_queryset(employment.user)
+    assert queryset.query.deferred_loading == ({'created', 'id', 'role', 'updated', 'user'}, False)
+    obj = queryset.get()
+    assert obj.get_deferred_fields() == {'company_id'}
+
+    assert get_view_queryset(employment.user, pk=employment.pk).get().get_deferred_fields() == set()
+    assert get_view_queryset(employment.user, method='patch', pk=employment.pk).query.deferred_loading == \
+        (frozenset(), True)
+
+
+@pytest.mark.django_db
+def test_employments_list_pruned_columns(employment: Employment):
+    client = APIClient()
+    client.force_authenticate(employment.user)
+
+    with CaptureQueriesContext(connection) as queries:
+        data = validate_jsonapi_list_response(client.get(client.reverse('employment-list')), expected_count=1)
+    list_queries = [q['sql'] for q in queries if 'INNER JOIN "companies_user"' in q['sql']]
+    assert len(list_queries) == 1
+    assert '"company_id"' not in list_queries[0].split(' FROM ')[0]
+    assert data['data'][0]['attributes']['email'] == employment.user.email
+
+
+@pytest.mark.django_db
+def test_company_detail_fetched_once(employment: Employment):
+    """ The company should be fetched only once, although choosing the serializer class needs it as well.
+    """
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+
+    with CaptureQueriesContext(connection) as queries:
+        data = validate_jsonapi_detail_response(client.get(client.reverse('company-detail', pk=employment.company_id)))
+    company_queries = [q for q in queries if q['sql'].split(' WHERE ')[0].endswith('FROM "companies_company"')]
+    assert len(company_queries) == 1
+    assert [obj['id'] for obj in data['data']['relationships']['employees']['data']] == [str(employment.pk)]
+
+
+@pytest.mark.django_db
+def test_view_memoization(employment: Employment, monkeypatch):
+    request = Request(APIRequestFactory().get('/'))
+    request.user = employment.user
+    view = EmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs={'pk': employment.pk})
+
+    calls = []
+    get_endpoint_type = view.get_endpoint_type
+    monkeypatch.setattr(view, 'get_endpoint_type', lambda: calls.append(1) or get_endpoint_type())
+
+    assert view.get_serializer_class() is EmploymentSerializer
+    queryset = view.get_queryset()
+    assert view.get_queryset() is not queryset
+    assert view.get_object() is view.get_object()
+    assert len(calls) == 1
+
+    obj = view.get_object()
+    view.invalidate_memoized('object')
+    assert view.get_object() is not obj
+    assert len(calls) == 1
+
+    view.invalidate_memoized()
+    view.get_serializer_class()
+    assert len(calls) == 2
+
+    # Values are tied to the request
+    view.request = Request(APIRequestFactory().patch('/'))
+    view.request.user = employment.user
+    assert view.get_endpoint_type() == view.ENDPOINT_TYPE_MODIFY
+    assert view.get_object() is not obj
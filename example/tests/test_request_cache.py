@@ -0,0 +1,42 @@
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tg_apicore.request_cache import get_request_cache
+from tg_apicore.test import APIClient, validate_jsonapi_detail_response
+
+from companies.models import Employment, User
+from companies.permissions import get_company_roles_namespace
+
+
+def get_role_queries(queries):
+    prefix = 'SELECT "companies_employment"."company_id", "companies_employment"."role" FROM'
+    return [query for query in queries if query['sql'].startswith(prefix)]
+
+
+@pytest.mark.django_db
+def test_employment_update_role_lookups(employment: Employment, other_user: User):
+    """ User's roles should be fetched once, although both permission check and validation need them.
+    """
+
+    other_employment = Employment.objects.create(company=employment.company, user=other_user)
+
+    client = APIClient()
+    client.force_authenticate(employment.user)
+
+    patch_data = {
+        'data': {
+            'type': 'employment',
+            'id': str(other_employment.id),
+            'attributes': {'role': Employment.ROLE_ADMIN},
+            'relationships': {'company': {'data': {'type': 'company', 'id': str(employment.company_id)}}},
+        },
+    }
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.patch(client.reverse('employment-detail', pk=other_employment.pk), patch_data)
+    validate_jsonapi_detail_response(resp)
+    assert len(get_role_queries(queries)) == 1
+
+    # The cache is cleared at the end of the request
+    assert get_request_cache(resp.wsgi_request).get_values(get_company_roles_namespace(employment.user)) == {}
@@ -0,0 +1,217 @@
+import gzip
+import json
+
+import pytest
+
+from django.core.cache import cache
+
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.versioning import URLPathVersioning
+
+from tg_apicore.renderers import JSONRenderer
+from tg_apicore.response_cache import get_document_cache_key
+from tg_apicore.settings import get_latest_version
+from tg_apicore.transformers import VersionTransformer
+
+from companies.factories import CompanyFactory
+from companies.models import Company, Employment, User
+from companies.serializers import CompanySummarySerializer, EmploymentSummarySerializer
+from companies.views import CompanyViewSet, EmploymentViewSet
+
+
+class RoleTransformer(VersionTransformer):
+    def convert_output_object(self, obj_type, obj_id, fields):
+        fields['role'] = str(fields['role']).upper()
+        return fields
+
+
+class CountingTransformer(VersionTransformer):
+    converted = 0
+
+    def convert_output_object(self, obj_type, obj_id, fields):
+        CountingTransformer.converted += 1
+        fields['title'] = fields.pop('name')
+        return fields
+
+
+@pytest.fixture(autouse=True)
+def response_cache(settings):
+    settings.TG_APICORE_RESPONSE_CACHE = 'default'
+    cache.clear()
+    CountingTransformer.converted = 0
+    yield
+    cache.clear()
+
+
+def render_companies(view_class=CompanyViewSet, version_transformers=None, response=None, params=None, **headers):
+    request = Request(APIRequestFactory().get('/', params, **headers))
+    request.version = get_latest_version()
+    request.versioning_scheme = URLPathVersioning()
+    request.version_transformers = [CountingTransformer(Company, 'list')] if version_transformers is None \
+        else version_transformers
+    view = view_class(request=request, format_kwarg=None, args=(), kwargs={}, action='list')
+
+    serializer = CompanySummarySerializer(Company.objects.order_by('id'), many=True, context={'request': request})
+    response = response or Response()
+    response.data = serializer.data
+    renderer_context = {'request': request, 'view': view, 'response': response}
+    renderer = JSONRenderer()
+    if not hasattr(response, 'accepted_renderer'):
+        response.accepted_renderer = renderer
+    return renderer.render(response.data, renderer_context=renderer_context)
+
+
+@pytest.mark.django_db
+def test_transformed_response_cached():
+    """ Transformed response should be cached until any of the objects changes.
+    """
+
+    companies = CompanyFactory.create_batch(3)
+
+    content = render_companies()
+    assert CountingTransformer.converted == 3
+    assert [obj['attributes']['title'] for obj in json.loads(content.decode())['data']] == \
+        [company.name for company in companies]
+
+    assert render_companies() == content
+    assert CountingTransformer.converted == 3
+
+    companies[1].name = 'Changed'
+    companies[1].save()
+
+    content = render_companies()
+    assert CountingTransformer.converted == 6
+    assert json.loads(content.decode())['data'][1]['attributes']['title'] == 'Changed'
+
+
+@pytest.mark.django_db
+def test_response_cached_per_sparse_fieldset():
+    """ Responses with sparse fieldsets must not be served from (or to) requests for other fields.
+    """
+
+    CompanyFactory.create_batch(2)
+
+    content = render_companies()
+    sparse_content = render_companies(params={'fields[company]': 'name,updated'})
+    assert CountingTransformer.converted == 4
+    assert [set(obj['attributes']) for obj in json.loads(sparse_content.decode())['data']] == [{'title', 'updated'}] * 2
+
+    assert render_companies() == content
+    assert render_companies(params={'fields[company]': 'name,updated'}) == sparse_content
+    assert CountingTransformer.converted == 4
+
+
+class CachedEmploymentViewSet(EmploymentViewSet):
+    def get_response_cache_scope(self):
+        return 'public'
+
+
+@pytest.mark.django_db
+def test_response_cache_related_attributes(employment: Employment):
+    """ Attributes which come from related objects don't change `updated` of the object, but must not be stale.
+    """
+
+    def render_employments():
+        request = Request(APIRequestFactory().get('/'))
+        request.version = get_latest_version()
+        request.versioning_scheme = URLPathVersioning()
+        request.version_transformers = [RoleTransformer(Employment, 'list')]
+        view = CachedEmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs={}, action='list')
+
+        serializer = EmploymentSummarySerializer(Employment.objects.all(), many=True, context={'request': request})
+        response = Response(serializer.data)
+        renderer = response.accepted_renderer = JSONRenderer()
+        renderer_context = {'request': request, 'view': view, 'response': response}
+        return json.loads(renderer.render(response.data, renderer_context=renderer_context).decode())
+
+    assert render_employments()['data'][0]['attributes']['email'] == employment.user.email
+
+    User.objects.filter(pk=employment.user_id).update(email='changed@asd.asd')
+    assert render_employments()['data'][0]['attributes']['email'] == 'changed@asd.asd'
+
+
+@pytest.mark.django_db
+def test_cached_response_compressed():
+    """ Compressed variant of the cached response should be served to clients which accept it.
+    """
+
+    CompanyFactory.create_batch(10)
+
+    content = render_companies()
+    assert CountingTransformer.converted == 10
+
+    response = Response()
+    gzipped_content = render_companies(response=response, HTTP_ACCEPT_ENCODING='gzip')
+    assert CountingTransformer.converted == 10
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(gzipped_content) == content
+
+
+@pytest.mark.django_db
+def test_cached_response_not_compressed_when_embedded():
+    """ Compressed variant mustn't be used when the output isn't the response body, e.g. in the browsable API.
+    """
+
+    CompanyFactory.create_batch(10)
+    content = render_companies()
+
+    response = Response()
+    response.accepted_renderer = BrowsableAPIRenderer()
+    assert render_companies(response=response, HTTP_ACCEPT_ENCODING='gzip') == content
+    assert not response.has_header('Content-Encoding')
+    assert CountingTransformer.converted == 10
+
+
+@pytest.mark.django_db
+def test_response_not_cached():
+    """ Responses shouldn't be cached when caching is disabled, or if the view doesn't define the scope.
+    """
+
+    CompanyFactory.create_batch(2)
+
+    render_companies(view_class=EmploymentViewSet)
+    render_companies(view_class=EmploymentViewSet)
+    assert CountingTransformer.converted == 4
+
+    # Latest version responses aren't cached, there's nothing to gain
+    render_companies(version_transformers=[])
+    assert CountingTransformer.converted == 4
+
+
+@pytest.mark.django_db
+def test_response_not_cached_when_disabled(settings):
+    settings.TG_APICORE_RESPONSE_CACHE = None
+    CompanyFactory.create_batch(2)
+
+    render_companies()
+    render_companies()
+    assert CountingTransformer.converted == 4
+
+
+def test_document_cache_key():
+    obj = {
+        'type': 'company', 'id': '1', 'attributes': {'name': 'Foo', 'updated': '2018-01-01T00:00:00Z'},
+        'relationships': {'employees': {'data': [{'type': 'employment', 'id': '1'}]}},
+    }
+    key = get_document_cache_key({'data': [obj]}, 'test', 'v1')
+    assert key is not None
+    assert get_document_cache_key({'data': [dict(obj)]}, 'test', 'v1') == key
+
+    # Values of all attributes are part of the key, since some of them might come from related objects
+    changed_obj = dict(obj, attributes={'name': 'Bar', 'updated': '2018-01-01T00:00:00Z'})
+    assert get_document_cache_key({'data': [changed_obj]}, 'test', 'v1') != key
+
+    assert get_document_cache_key({'data': [obj]}, 'test', 'v2') != key
+    # Sparse fieldsets change the set of attributes
+    changed_obj = dict(obj, attributes={'updated': '2018-01-01T00:00:00Z'})
+    assert get_document_cache_key({'data': [changed_obj]}, 'test', 'v1') != key
+    changed_obj = dict(obj, relationships={'employees': {'data': []}})
+    assert get_document_cache_key({'data': [changed_obj]}, 'test', 'v1') != key
+    assert get_document_cache_key({'data': [obj], 'included': [changed_obj]}, 'test', 'v1') != key
+
+    # Errors cannot be cached
+    assert get_document_cache_key({'errors': []}, 'test') is None
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from django.http import StreamingHttpResponse
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.versioning import URLPathVersioning
+
+from tg_apicore.renderers import JSONRenderer
+from tg_apicore.settings import get_latest_version
+from tg_apicore.test import APIClient, validate_jsonapi_list_response
+from tg_apicore.transformers import VersionTransformer
+
+from companies.factories import CompanyFactory
+from companies.models import Employment, User
+from companies.serializers import EmploymentSerializer
+from companies.views import EmploymentViewSet
+
+
+class CompanyNameTransformer(VersionTransformer):
+    def convert_output_object(self, obj_type, obj_id, fields):
+        if obj_type == 'company':
+            fields['title'] = fields.pop('name')
+        return fields
+
+
+def get_streamed_json(resp) -> dict:
+    assert resp.status_code == 200
+    assert isinstance(resp, StreamingHttpResponse)
+    return json.loads(b''.join(resp.streaming_content).decode())
+
+
+def create_employments(companies_count=3, employees_count=2):
+    for company in CompanyFactory.create_batch(companies_count):
+        for i in range(employees_count):
+            user = User.objects.create_user(username='user-%d-%d' % (company.id, i), email='%d-%d@asd.asd' % (
+                company.id, i,
+            ))
+            Employment.objects.create(user=user, company=company, role=Employment.ROLE_NORMAL)
+
+
+def render_employments(renderer, version_transformers=None, stream=False):
+    """ Renders all employments with EmploymentSerializer (which includes companies), returns parsed json """
+
+    request = Request(APIRequestFactory().get('/'))
+    request.version = get_latest_version()
+    request.versioning_scheme = URLPathVersioning()
+    request.version_transformers = version_transformers or []
+    view = EmploymentViewSet(request=request, format_kwarg=None, args=(), kwargs={}, action='list',
+                             serializer_class=EmploymentSerializer)
+    renderer_context = {'request': request, 'view': view}
+    queryset = Employment.objects.order_by('id')
+
+    if stream:
+        serializer = EmploymentSerializer(many=True, context={'request': request})
+        chunks = list(renderer.render_stream(queryset.iterator(), serializer, renderer_context))
+        return json.loads(b''.join(chunks).decode()), chunks
+
+    serializer = EmploymentSerializer(queryset, many=True, context={'request': request})
+    return json.loads(renderer.render(serializer.data, renderer_context=renderer_context).decode()), None
+
+
+@pytest.mark.django_db
+def test_company_listing_streamed():
+    """ Streamed list should contain all the objects, without pagination, identical to the paginated response.
+    """
+
+    CompanyFactory.create_batch(5)
+
+    client = APIClient()
+    data = get_streamed_json(client.get(client.reverse('company-list'), {'stream': '1', 'page_size': 2}))
+    assert set(data.keys()) == {'data'}
+    assert len(data['data']) == 5
+
+    paginated = validate_jsonapi_list_response(client.get(client.reverse('company-list'), {'page_size': 10}))
+    assert sorted(data['data'], key=lambda obj: obj['id']) == sorted(paginated['data'], key=lambda obj: obj['id'])
+
+
+@pytest.mark.django_db
+def test_company_listing_not_streamed_by_default():
+    CompanyFactory.create_batch(3)
+
+    client = APIClient()
+    resp = client.get(client.reverse('company-list'), {'page_size': 2})
+    assert not isinstance(resp, StreamingHttpResponse)
+    validate_jsonapi_list_response(resp, expected_count=2)
+
+
+@pytest.mark.django_db
+def test_render_stream_included():
+    """ Streamed document should have the same data and included resources as the regular one.
+    """
+
+    create_employments()
+
+    expected, _ = render_employments(JSONRenderer())
+    data, _ = render_employments(JSONRenderer(), stream=True)
+
+    assert len(data['data']) == 6
+    assert data['data'] == expected['data']
+    assert len(data['included']) == 3
+    assert sorted(data['included'], key=lambda obj: obj['id']) == expected['included']
+
+
+@pytest.mark.django_db
+def test_render_stream_spooled():
+    """ Output shouldn't depend on chunk and spool sizes.
+    """
+
+    create_employments()
+
+    renderer = JSONRenderer()
+    renderer.stream_chunk_size = 1
+    renderer.stream_spool_size = 0
+
+    expected, _ = render_employments(JSONRenderer(), stream=True)
+    data, chunks = render_employments(renderer, stream=True)
+
+    assert data == expected
+    assert len(chunks) > 6
+
+
+@pytest.mark.django_db
+def test_render_stream_transformers():
+    """ Version transformers should be applied to all resource objects, including the included ones.
+    """
+
+    create_employments(companies_count=2, employees_count=1)
+
+    transformers = [CompanyNameTransformer(Employment, 'list')]
+    data, _ = render_employments(JSONRenderer(), version_transformers=transformers, stream=True)
+
+    assert len(data['included']) == 2
+    for obj in data['included']:
+        assert 'title' in obj['attributes']
+        assert 'name' not in obj['attributes']
+    for obj in data['data']:
+        assert 'name' in obj['attributes']
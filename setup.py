@@ -21,6 +21,13 @@ requirements = [
     'Pygments>=2.2',
 ]
 
+extra_requirements = {
+    # Faster JSON encoding, see tg_apicore.encoders
+    'orjson': ['orjson'],
+    # Brotli-compressed variants of cached responses, see tg_apicore.compression
+    'brotli': ['brotli'],
+}
+
 setup_requirements = ['pytest-runner', ]
 
 test_requirements = [
@@ -42,6 +49,7 @@ setup(
     ],
     description="Opinionated API framework on top of Django REST framework",
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="ISC license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
@@ -22,6 +22,13 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 ]
 
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+    },
+]
+
 
 SITE_URL = 'http://127.0.0.1:8000'
 
@@ -0,0 +1,73 @@
+import gzip
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from tg_apicore.compression import IDENTITY, choose_encoding, compress_variants, get_precompressed_response, \
+    get_variant_etag, parse_accept_encoding, use_precompressed_variant
+
+
+CONTENT = b'{"data": [' + b','.join(b'{"type": "company", "id": "%d"}' % i for i in range(50)) + b']}'
+
+
+def test_compress_variants():
+    variants = compress_variants(CONTENT)
+    assert variants[IDENTITY] is CONTENT
+    assert gzip.decompress(variants['gzip']) == CONTENT
+
+    # Tiny content isn't compressed
+    assert compress_variants(b'{}') == {IDENTITY: b'{}'}
+
+
+def test_choose_encoding():
+    assert parse_accept_encoding('gzip;q=0.5, br, *;q=0') == {'gzip': 0.5, 'br': 1.0, '*': 0.0}
+
+    variants = {IDENTITY: b'', 'gzip': b''}
+    assert choose_encoding('gzip, deflate', variants) == 'gzip'
+    assert choose_encoding('br, gzip', variants) == 'gzip'
+    assert choose_encoding('*', variants) == 'gzip'
+    assert choose_encoding('gzip;q=0', variants) == IDENTITY
+    assert choose_encoding('deflate', variants) == IDENTITY
+    assert choose_encoding('', variants) == IDENTITY
+    assert choose_encoding('gzip', {IDENTITY: b''}) == IDENTITY
+
+
+def test_variant_etag():
+    assert get_variant_etag('"abc"', IDENTITY) == '"abc"'
+    assert get_variant_etag('"abc"', 'gzip') == '"abc-gzip"'
+    assert get_variant_etag(None, 'gzip') is None
+
+
+def test_precompressed_response():
+    variants = compress_variants(CONTENT)
+    factory = RequestFactory()
+
+    resp = get_precompressed_response(factory.get('/'), variants, etag='"abc"', content_type='application/json')
+    assert resp.content == CONTENT
+    assert not resp.has_header('Content-Encoding')
+    assert resp['ETag'] == '"abc"'
+    assert resp['Vary'] == 'Accept-Encoding'
+
+    resp = get_precompressed_response(factory.get('/', HTTP_ACCEPT_ENCODING='gzip'), variants, etag='"abc"')
+    assert resp.content == variants['gzip']
+    assert resp['Content-Encoding'] == 'gzip'
+    assert resp['ETag'] == '"abc-gzip"'
+
+    request = factory.get('/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='"abc-gzip"')
+    assert get_precompressed_response(request, variants, etag='"abc"').status_code == 304
+
+
+def test_use_precompressed_variant():
+    variants = compress_variants(CONTENT)
+
+    response = HttpResponse()
+    response['ETag'] = '"abc"'
+    content = use_precompressed_variant(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'), response, variants)
+    assert content == variants['gzip']
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['ETag'] == '"abc-gzip"'
+
+    response = HttpResponse()
+    response['ETag'] = '"abc"'
+    assert use_precompressed_variant(RequestFactory().get('/'), response, variants) is CONTENT
+    assert response['ETag'] == '"abc"'
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from django.test import RequestFactory
+from django.utils.http import http_date
+
+from tg_apicore.conditional import PreconditionFailed, etag_matches, evaluate_preconditions, get_etag_state, \
+    get_object_etag
+
+
+UPDATED = datetime(2018, 6, 1, 12, 0, 0, 500, tzinfo=timezone.utc)
+ETAG = get_object_etag(1, UPDATED, None, '2018-06-01')
+
+
+def test_object_etag():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert get_object_etag('1', UPDATED, None, '2018-06-01') == ETAG
+    assert get_object_etag(1, UPDATED + timedelta(microseconds=1), None, '2018-06-01') != ETAG
+    assert get_object_etag(1, UPDATED, None, '2018-01-01') != ETAG
+    assert get_object_etag(1, UPDATED, RequestFactory, '2018-06-01') != ETAG
+
+    related = [('employees', [(2, UPDATED)])]
+    etag = get_object_etag(1, UPDATED, None, '2018-06-01', related=related)
+    assert etag != ETAG
+    assert get_object_etag(1, UPDATED, None, '2018-06-01', related=[('employees', [(2, None)])]) != etag
+
+    # Representation options only change the representation part of the ETag
+    representation_etag = get_object_etag(1, UPDATED, None, '2018-06-01', representation=(('employees',), ()))
+    assert representation_etag != ETAG
+    assert get_etag_state(representation_etag) == get_etag_state(ETAG)
+    assert get_etag_state('%s-gzip"' % representation_etag[:-1]) == get_etag_state(ETAG)
+
+
+def test_etag_matches():
+    assert etag_matches(ETAG, '"foo", %s' % ETAG)
+    assert etag_matches(ETAG, '*')
+    assert not etag_matches(ETAG, '"foo"')
+
+    # Precompressed variants of the same representation
+    assert etag_matches(ETAG, '%s-gzip"' % ETAG[:-1])
+
+    assert etag_matches(ETAG, 'W/%s' % ETAG)
+    assert not etag_matches(ETAG, 'W/%s' % ETAG, weak=False)
+
+    # Any representation of the same state
+    representation_etag = get_object_etag(1, UPDATED, None, '2018-06-01', representation=(('employees',), ()))
+    assert not etag_matches(ETAG, representation_etag)
+    assert etag_matches(ETAG, representation_etag, weak=False, state_only=True)
+    assert not etag_matches(ETAG, 'W/%s' % representation_etag, weak=False, state_only=True)
+    assert not etag_matches(ETAG, '"foo"', weak=False, state_only=True)
+
+
+@pytest.mark.parametrize('method,headers,expected', [
+    ('get', {}, False),
+    ('get', {'HTTP_IF_NONE_MATCH': ETAG}, True),
+    ('head', {'HTTP_IF_NONE_MATCH': ETAG}, True),
+    ('get', {'HTTP_IF_NONE_MATCH': '"foo"'}, False),
+    ('get', {'HTTP_IF_MODIFIED_SINCE': http_date(UPDATED.timestamp())}, True),
+    ('get', {'HTTP_IF_MODIFIED_SINCE': http_date(UPDATED.timestamp() - 1)}, False),
+    # If-None-Match takes precedence over If-Modified-Since
+    ('get', {'HTTP_IF_NONE_MATCH': '"foo"', 'HTTP_IF_MODIFIED_SINCE': http_date(UPDATED.timestamp())}, False),
+    ('patch', {'HTTP_IF_MATCH': ETAG}, False),
+    ('delete', {'HTTP_IF_MATCH': '*'}, False),
+    ('patch', {'HTTP_IF_MATCH': '"foo"'}, PreconditionFailed),
+    ('patch', {'HTTP_IF_MATCH': 'W/%s' % ETAG}, PreconditionFailed),
+    ('patch', {'HTTP_IF_UNMODIFIED_SINCE': http_date(UPDATED.timestamp())}, False),
+    ('delete', {'HTTP_IF_UNMODIFIED_SINCE': http_date(UPDATED.timestamp() - 1)}, PreconditionFailed),
+    ('patch', {'HTTP_IF_NONE_MATCH': '*'}, PreconditionFailed),
+])
+def test_evaluate_preconditions(method, headers, expected):
+    request = getattr(RequestFactory(), method)('/', **headers)
+
+    if expected is PreconditionFailed:
+        with pytest.raises(PreconditionFailed):
+            evaluate_preconditions(request, ETAG, UPDATED)
+    else:
+        assert evaluate_preconditions(request, ETAG, UPDATED) is expected
@@ -0,0 +1,34 @@
+import attr
+
+from tg_apicore.docs import api_method_docs, api_section_docs, docs_asdict
+
+
+def test_method_docs_json_cached():
+    method_doc = api_method_docs('create', request_data={'data': {'type': 'company'}}, response_data={'id': 1})
+    assert not hasattr(method_doc, '__dict__')
+
+    request_json = method_doc.request_data_json
+    assert '"type": "company"' in request_json
+    assert method_doc.request_data_json is request_json
+    assert method_doc.responses_items is method_doc.responses_items
+
+    # Replacing the data invalidates the cached value
+    method_doc.request_data = {'data': {'type': 'employment'}}
+    assert '"type": "employment"' in method_doc.request_data_json
+
+    # Cached values aren't shared with evolved copies
+    evolved = attr.evolve(method_doc, request_data={'data': None})
+    assert '"data": null' in evolved.request_data_json
+
+
+def test_section_docs_cached():
+    section_doc = api_section_docs(data={'id': 1}, changelog={'2018-01-01': 'First', '2018-02-01': 'Second'})
+
+    assert section_doc.changelog_items == [('2018-02-01', 'Second'), ('2018-01-01', 'First')]
+    assert section_doc.changelog_items is section_doc.changelog_items
+    assert section_doc.data_json is section_doc.data_json
+    assert section_doc.data_template is section_doc.data_template
+
+    # Caches don't leak into dicts / comparisons
+    assert '_cache' not in docs_asdict(section_doc)
+    assert section_doc == api_section_docs(data={'id': 1}, changelog={'2018-01-01': 'First', '2018-02-01': 'Second'})
@@ -0,0 +1,87 @@
+import datetime
+import decimal
+import json
+import uuid
+from collections import OrderedDict
+
+import pytest
+
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from tg_apicore.encoders import OrjsonBackend, get_json_backend
+from tg_apicore.renderers import PureJSONRenderer
+
+
+orjson = pytest.importorskip('orjson')
+
+
+PAYLOADS = [
+    {'naive': datetime.datetime(2018, 3, 16, 9, 38, 1, 531816)},
+    {'aware': datetime.datetime(2018, 3, 16, 9, 38, 1, 531816, tzinfo=timezone.utc)},
+    {'aware_no_microseconds': datetime.datetime(2018, 3, 16, 9, 38, 1, tzinfo=timezone.utc)},
+    {'other_tz': datetime.datetime(2018, 3, 16, 9, 38, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))},
+    {'date': datetime.date(2018, 3, 16), 'time': datetime.time(9, 38, 1, 500)},
+    {'timedelta': datetime.timedelta(days=1, seconds=3.5)},
+    {'decimals': [decimal.Decimal('12.50'), decimal.Decimal('0.1'), decimal.Decimal('-3')]},
+    {'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    {'lazy': gettext_lazy("Company"), 'lazy_list': [gettext_lazy("Name")]},
+    OrderedDict([('b', 1), ('a', [1, 2.5, None, True, False]), ('nested', OrderedDict([('x', 'y')]))]),
+    ReturnDict({'id': 1, 'items': ReturnList([{'id': 2}], serializer=None)}, serializer=None),
+    {'unicode': 'Ülemiste ☃ 中文', 'separators': 'a b c', 'control': 'tab\tnewline\n\x01"\\'},
+    {3: 'int key', 2.5: 'float key', True: 'bool key', None: 'none key'},
+    {'tuple': (1, 2), 'set': {3}, 'bytes': b'abc'},
+    [],
+    'string',
+    12,
+]
+
+
+@pytest.fixture
+def renderer():
+    return PureJSONRenderer()
+
+
+@pytest.mark.parametrize('data', PAYLOADS)
+def test_orjson_backend_parity(settings, renderer, data):
+    """ orjson backend must produce exactly the same output as DRF's stdlib-based renderer.
+    """
+
+    settings.TG_APICORE_JSON_BACKEND = 'json'
+    expected = renderer.render(data)
+
+    settings.TG_APICORE_JSON_BACKEND = 'orjson'
+    assert isinstance(get_json_backend(), OrjsonBackend)
+    assert renderer.render(data) == expected
+
+
+def test_orjson_backend_fallback(settings, renderer):
+    settings.TG_APICORE_JSON_BACKEND = 'orjson'
+
+    # Integers too big for orjson are handled by stdlib json
+    assert renderer.render({'big': 2 ** 70}) == ('{"big":%d}' % 2 ** 70).encode()
+
+    # Indented output is handled by stdlib json as well
+    data = {'key': [1, 2]}
+    assert renderer.render(data, renderer_context={'indent': 4}) == json.dumps(data, indent=4).encode()
+
+    # Unsupported types raise TypeError, same as with stdlib
+    with pytest.raises(TypeError):
+        renderer.render({'object': object()})
+
+
+def test_json_backend_setting(settings):
+    # stdlib json is used by default
+    del settings.TG_APICORE_JSON_BACKEND
+    assert get_json_backend() is None
+
+    settings.TG_APICORE_JSON_BACKEND = 'json'
+    assert get_json_backend() is None
+
+    settings.TG_APICORE_JSON_BACKEND = 'auto'
+    assert isinstance(get_json_backend(), OrjsonBackend)
+
+    settings.TG_APICORE_JSON_BACKEND = 'tg_apicore.encoders.OrjsonBackend'
+    assert isinstance(get_json_backend(), OrjsonBackend)
@@ -7,10 +7,19 @@ def test_imports():
     """
 
     from tg_apicore import apps
+    from tg_apicore import cache
+    from tg_apicore import compression
+    from tg_apicore import conditional
     from tg_apicore import docs
+    from tg_apicore import encoders
+    from tg_apicore import highlighting
+    from tg_apicore import openapi
     from tg_apicore import pagination
     from tg_apicore import parsers
+    from tg_apicore import query_planning
     from tg_apicore import renderers
+    from tg_apicore import request_cache
+    from tg_apicore import response_cache
     from tg_apicore import routers
     from tg_apicore import schemas
     from tg_apicore import test
@@ -0,0 +1,80 @@
+import io
+import json
+from types import SimpleNamespace
+
+from tg_apicore import transformers
+from tg_apicore.parsers import TransformerAwareJSONParser
+from tg_apicore.transformers import DeclarativeTransformer, Rename, TransformerRegistry, VersionTransformer, \
+    get_request_transformers
+
+
+class CompanyTitleTransformer(DeclarativeTransformer):
+    input_transforms = {
+        'company': [Rename('title', 'name')],
+    }
+
+
+class CompanyLabelTransformer(DeclarativeTransformer):
+    input_transforms = {
+        'company': [Rename('label', 'title')],
+    }
+
+
+class WrapTransformer(VersionTransformer):
+    def input_forwards(self, data):
+        data['meta'] = {'wrapped': True}
+        return data
+
+
+def create_registry():
+    registry = TransformerRegistry()
+    registry.register('2018-02-01', CompanyTitleTransformer)
+    registry.register('2018-01-01', CompanyLabelTransformer)
+    registry.register('2018-01-01', WrapTransformer)
+    registry.freeze()
+    return registry
+
+
+def parse(data, request, view=None):
+    stream = io.BytesIO(json.dumps(data).encode())
+    return TransformerAwareJSONParser().parse(stream, parser_context={'request': request, 'view': view})
+
+
+def test_parser_applies_input_transformers(monkeypatch):
+    monkeypatch.setattr(transformers, 'registry', create_registry())
+
+    request = SimpleNamespace(version='2017-12-01')
+    view = SimpleNamespace(queryset=None, action='create')
+    data = parse({'data': {'type': 'company', 'attributes': {'label': 'Foo'}}}, request, view)
+
+    # Transformers are applied from the oldest version to the newest one
+    assert data == {'data': {'type': 'company', 'attributes': {'name': 'Foo'}}, 'meta': {'wrapped': True}}
+    assert [type(t) for t in request.version_transformers] == [
+        CompanyTitleTransformer, CompanyLabelTransformer, WrapTransformer,
+    ]
+
+
+def test_parser_no_transformers(monkeypatch):
+    monkeypatch.setattr(transformers, 'registry', create_registry())
+
+    request = SimpleNamespace(version='2018-02-01')
+    data = parse({'data': {'type': 'company', 'attributes': {'title': 'Foo'}}}, request)
+    assert data == {'data': {'type': 'company', 'attributes': {'title': 'Foo'}}}
+    assert request.version_transformers == []
+
+    request = SimpleNamespace(version=None)
+    parse({'data': {'type': 'company', 'attributes': {'label': 'Foo'}}}, request)
+    assert request.version_transformers == []
+
+
+def test_request_transformers_resolved_once(monkeypatch):
+    monkeypatch.setattr(transformers, 'registry', create_registry())
+
+    request = SimpleNamespace(version='2018-01-15')
+    version_transformers = get_request_transformers(request)
+    assert [type(t) for t in version_transformers] == [CompanyTitleTransformer]
+    assert get_request_transformers(request) is version_transformers
+
+    # Explicitly set transformers are used as-is
+    request = SimpleNamespace(version='2017-01-01', version_transformers=[])
+    assert get_request_transformers(request) == []
@@ -0,0 +1,52 @@
+from django.http import HttpRequest, HttpResponse
+
+from rest_framework.request import Request
+
+from tg_apicore.request_cache import RequestCache, get_request_cache
+
+
+def test_get_or_compute():
+    cache = RequestCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'admin'
+
+    assert cache.get_or_compute('roles', 1, compute) == 'admin'
+    assert cache.get_or_compute('roles', 1, compute) == 'admin'
+    assert len(calls) == 1
+
+    cache.invalidate('roles')
+    assert cache.get_or_compute('roles', 1, compute) == 'admin'
+    assert len(calls) == 2
+
+
+def test_prefetch():
+    cache = RequestCache()
+    assert not cache.is_complete('roles')
+
+    cache.prefetch('roles', [(1, 'admin'), (2, 'normal')])
+    assert cache.is_complete('roles')
+    assert cache.get_values('roles') == {1: 'admin', 2: 'normal'}
+
+    # Missing keys of complete namespaces aren't computed
+    assert cache.get_or_compute('roles', 2, lambda: 'admin') == 'normal'
+    assert cache.get_or_compute('roles', 3, lambda: 'admin') is None
+
+    cache.clear()
+    assert not cache.is_complete('roles')
+    assert cache.get_values('roles') == {}
+
+
+def test_request_cache_shared():
+    http_request = HttpRequest()
+    cache = get_request_cache(Request(http_request))
+    assert get_request_cache(http_request) is cache
+    assert get_request_cache(HttpRequest()) is not cache
+
+    cache.set('roles', 1, 'admin')
+    response = HttpResponse()
+    response._closable_objects.append(cache)
+    response.close()
+    assert cache.get_values('roles') == {}
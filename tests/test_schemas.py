@@ -0,0 +1,67 @@
+from tg_apicore.docs import VariablesTemplate
+from tg_apicore.schemas import replace_variables
+
+
+DATA = {
+    'data': {
+        'type': 'company',
+        'attributes': {'name': 'Turner and Sons', 'tags': ('a', 'b')},
+        'links': {'self': '%(API_ROOT)s/companies/12/'},
+    },
+    'meta': [{'count': 2}, '100%%', None],
+}
+
+
+def test_replace_variables():
+    result = replace_variables(DATA, 'https://example.com', '/api/v1/')
+
+    assert result == {
+        'data': {
+            'type': 'company',
+            'attributes': {'name': 'Turner and Sons', 'tags': ['a', 'b']},
+            'links': {'self': 'https://example.com/api/v1/companies/12/'},
+        },
+        'meta': [{'count': 2}, '100%', None],
+    }
+
+    # Result is a fresh copy, modifying it leaves the original untouched
+    result['data']['attributes']['name'] = 'Renamed'
+    result['meta'][0]['count'] = 3
+    assert DATA['data']['links']['self'] == '%(API_ROOT)s/companies/12/'
+    assert DATA['data']['attributes']['name'] == 'Turner and Sons'
+    assert DATA['meta'][0] == {'count': 2}
+
+
+def test_replace_variables_scalars():
+    assert replace_variables('%(SITE_URL)s/x', 'https://example.com/', '/api/') == 'https://example.com/x'
+    assert replace_variables(None, 'https://example.com/', '/api/') is None
+    assert replace_variables(12, 'https://example.com/', '/api/') == 12
+
+
+def test_replace_variables_mutated_data():
+    """ Data given to replace_variables() can change between the calls (nothing is cached for it).
+    """
+
+    data = {'links': {'self': '%(API_ROOT)s/companies/'}, 'meta': {}}
+    assert replace_variables(data, 'https://example.com', '/api/')['links'] == {
+        'self': 'https://example.com/api/companies/',
+    }
+
+    data['meta']['root'] = '%(SITE_URL)s'
+    del data['links']
+    assert replace_variables(data, 'https://example.com', '/api/') == {'meta': {'root': 'https://example.com'}}
+
+
+def test_variables_template():
+    template = VariablesTemplate(DATA)
+
+    # Only paths to strings containing placeholders are recorded
+    assert template.plan == [
+        ('data', [('links', [('self', True)])]),
+        ('meta', [(1, True)]),
+    ]
+    assert template.apply({'API_ROOT': 'https://example.com/api'})['data']['links'] == {
+        'self': 'https://example.com/api/companies/12/',
+    }
+
+    assert VariablesTemplate({'a': [1, {'b': 'c'}]}).plan is None
@@ -0,0 +1,60 @@
+from django.template import Context, Template
+
+from tg_apicore.highlighting import HIGHLIGHT_CACHE, highlight_css
+from tg_apicore.settings import get_setting
+from tg_apicore.templatetags.tg_apicore import MARKDOWN_CACHE, render_markdown, render_markdown_toc
+
+
+def test_render_markdown_cached():
+    MARKDOWN_CACHE.clear()
+
+    text = "# Title\n\nSome *text*\n\n## Subtitle\n"
+    html = render_markdown(text)
+    assert '<em>text</em>' in html
+    assert MARKDOWN_CACHE.info()['misses'] == 1
+
+    # TOC comes from the same conversion, so it's a cache hit
+    toc = render_markdown_toc(text)
+    assert 'href="#subtitle"' in toc
+    assert MARKDOWN_CACHE.hits == 1
+    assert MARKDOWN_CACHE.misses == 1
+
+    assert MARKDOWN_CACHE.maxsize == get_setting('TG_APICORE_MARKDOWN_CACHE_SIZE') == 512
+    assert HIGHLIGHT_CACHE.maxsize == get_setting('TG_APICORE_HIGHLIGHT_CACHE_SIZE') == 1024
+
+
+def test_render_markdown_renderer_reset():
+    """ Reused renderer must not leak state (e.g. TOC entries) between conversions.
+    """
+
+    MARKDOWN_CACHE.clear()
+
+    render_markdown("# First\n")
+    toc = render_markdown_toc("# Second\n")
+    assert 'second' in toc
+    assert 'first' not in toc
+
+
+def test_code_tag_cached():
+    HIGHLIGHT_CACHE.clear()
+
+    tpl = Template('{% load tg_apicore %}{% code json %}{"key": {{ value }}}{% endcode %}')
+    first = tpl.render(Context({'value': 1}))
+    assert 'class="p"' in first
+    assert HIGHLIGHT_CACHE.misses == 1
+
+    assert tpl.render(Context({'value': 1})) == first
+    assert HIGHLIGHT_CACHE.hits == 1
+
+    # Different content is highlighted separately
+    assert tpl.render(Context({'value': 2})) != first
+    assert HIGHLIGHT_CACHE.misses == 2
+
+
+def test_highlight_css_cached():
+    HIGHLIGHT_CACHE.clear()
+
+    css = highlight_css('emacs')
+    assert '.highlight' in css
+    assert highlight_css('emacs') is css
+    assert HIGHLIGHT_CACHE.info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': HIGHLIGHT_CACHE.maxsize}
@@ -0,0 +1,358 @@
+import json
+from copy import copy, deepcopy
+
+import pytest
+
+from django.core.exceptions import ImproperlyConfigured
+
+from tg_apicore import transformers
+from tg_apicore.transformers import CopyOnWriteDict, DeclarativeTransformer, Default, Drop, MapValue, Rename, \
+    TransformerPipeline, TransformerRegistry, VersionTransformer, compile_transforms
+from tg_apicore.transformers import registry as default_registry
+
+
+RESPONSE = {
+    'data': [
+        {'type': 'company', 'id': '1', 'attributes': {'name': 'Foo', 'email': 'foo@foo.bar'}},
+        {'type': 'company', 'id': '2', 'attributes': {'name': 'Bar', 'email': 'bar@foo.bar'}},
+    ],
+    'included': [
+        {'type': 'employment', 'id': '1', 'attributes': {'name': 'Test User', 'role': 'admin'}},
+    ],
+}
+
+
+class RenameCompanyNameTransformer(VersionTransformer):
+    output_types = {'company'}
+
+    def convert_output_object(self, obj_type, obj_id, fields):
+        fields['title'] = fields.pop('name')
+        return fields
+
+
+class DropEmailTransformer(VersionTransformer):
+    def convert_output_object(self, obj_type, obj_id, fields):
+        fields.pop('email', None)
+        return fields
+
+
+class UppercaseRoleTransformer(VersionTransformer):
+    output_types = {'employment'}
+
+    def convert_output_object(self, obj_type, obj_id, fields):
+        fields['role'] = fields['role'].upper()
+
+
+class AddMetaTransformer(VersionTransformer):
+    """ Whole-response transformer, depends on the output of the previous transformers """
+
+    def output_backwards(self, data):
+        objects = data['data'] if isinstance(data['data'], list) else [data['data']]
+        data['meta'] = {'titles': [obj['attributes'].get('title') for obj in objects]}
+        return data
+
+
+class CountingTransformer(VersionTransformer):
+    def __init__(self, model, action) -> None:
+        super().__init__(model, action)
+        self.visited = []
+
+    def convert_output_object_container(self, data):
+        self.visited.append((data['type'], data['id']))
+        return data
+
+
+def create_transformers(*classes):
+    return [cls(None, 'list') for cls in classes]
+
+
+def apply_sequentially(transformers, data):
+    for transformer in transformers:
+        data = transformer.output_backwards(data)
+    return data
+
+
+def test_pipeline_matches_sequential_output():
+    classes = (RenameCompanyNameTransformer, DropEmailTransformer, UppercaseRoleTransformer, AddMetaTransformer)
+
+    expected = apply_sequentially(create_transformers(*classes), deepcopy(RESPONSE))
+    result = TransformerPipeline(create_transformers(*classes)).output_backwards(deepcopy(RESPONSE))
+
+    assert result == expected
+    assert result['data'][0]['attributes'] == {'title': 'Foo'}
+    assert result['included'][0]['attributes'] == {'name': 'Test User', 'role': 'ADMIN'}
+    assert result['meta'] == {'titles': ['Foo', 'Bar']}
+
+
+def test_pipeline_stages():
+    pipeline = TransformerPipeline(create_transformers(
+        RenameCompanyNameTransformer, DropEmailTransformer, AddMetaTransformer, UppercaseRoleTransformer,
+        VersionTransformer,
+    ))
+
+    assert len(pipeline.output_stages) == 3
+    assert [type(t) for t in pipeline.output_stages[0].transformers] == [
+        RenameCompanyNameTransformer, DropEmailTransformer,
+    ]
+    assert isinstance(pipeline.output_stages[1], AddMetaTransformer)
+    assert [type(t) for t in pipeline.output_stages[0].get_type_transformers('employment')] == [DropEmailTransformer]
+    assert pipeline.input_stages == []
+
+    assert not TransformerPipeline(create_transformers(VersionTransformer))
+
+
+def test_pipeline_visits_objects_once():
+    transformers = create_transformers(CountingTransformer, CountingTransformer)
+    TransformerPipeline(transformers).output_backwards(deepcopy(RESPONSE))
+
+    for transformer in transformers:
+        assert transformer.visited == [('company', '1'), ('company', '2'), ('employment', '1')]
+
+
+def test_pipeline_single_object():
+    pipeline = TransformerPipeline(create_transformers(RenameCompanyNameTransformer, AddMetaTransformer))
+
+    obj = pipeline.convert_output_object_container(deepcopy(RESPONSE['data'][0]))
+    assert obj['attributes'] == {'title': 'Foo', 'email': 'foo@foo.bar'}
+
+
+def test_output_backwards_converts_objects():
+    """ Default output_backwards() should convert all objects when the transformer implements convert_output_object()
+    """
+
+    data = DropEmailTransformer(None, 'list').output_backwards(deepcopy(RESPONSE))
+    assert data['data'][1]['attributes'] == {'name': 'Bar'}
+
+    assert VersionTransformer(None, 'list').output_backwards(deepcopy(RESPONSE)) == RESPONSE
+
+
+class EmploymentOnlyTransformer(VersionTransformer):
+    applicable_checks = 0
+
+    @classmethod
+    def is_applicable(cls, model, action) -> bool:
+        cls.applicable_checks += 1
+        return model == 'employment'
+
+
+def create_registry():
+    registry = TransformerRegistry()
+    registry.register('2018-03-01', DropEmailTransformer)
+    registry.register('2018-01-01')(RenameCompanyNameTransformer)
+    registry.register('2018-02-01', EmploymentOnlyTransformer)
+    registry.register('2018-03-01', UppercaseRoleTransformer)
+    return registry
+
+
+def test_registry_chain():
+    registry = create_registry()
+
+    assert registry.get_transformer_classes('2018-03-01', 'employment', 'list') == ()
+    assert registry.get_transformer_classes('2018-02-15', 'employment', 'list') == (
+        DropEmailTransformer, UppercaseRoleTransformer,
+    )
+    assert registry.get_transformer_classes('2017-12-01', 'employment', 'list') == (
+        DropEmailTransformer, UppercaseRoleTransformer, EmploymentOnlyTransformer, RenameCompanyNameTransformer,
+    )
+    assert registry.get_transformer_classes('2018-01-01', 'company', 'list') == (
+        DropEmailTransformer, UppercaseRoleTransformer,
+    )
+
+    transformers = registry.get_transformers('2018-01-01', 'company', 'list')
+    assert [type(t) for t in transformers] == [DropEmailTransformer, UppercaseRoleTransformer]
+    assert transformers[0].model == 'company'
+
+
+def test_registry_memoizes_chains():
+    registry = create_registry()
+    EmploymentOnlyTransformer.applicable_checks = 0
+
+    for _ in range(3):
+        registry.get_transformers('2018-01-01', 'employment', 'list')
+    assert EmploymentOnlyTransformer.applicable_checks == 1
+
+    registry.get_transformers('2018-01-01', 'employment', 'retrieve')
+    assert EmploymentOnlyTransformer.applicable_checks == 2
+
+
+def test_registry_frozen():
+    registry = create_registry()
+    registry.freeze()
+
+    with pytest.raises(RuntimeError):
+        registry.register('2018-04-01', DropEmailTransformer)
+
+    # Global registry is frozen when Django starts
+    assert default_registry.frozen
+
+
+def test_registry_legacy_transforms(monkeypatch):
+    """ Changes to the deprecated TRANSFORMS list can be applied after the registry has been frozen.
+    """
+
+    registry = create_registry()
+    registry.freeze()
+    monkeypatch.setattr(transformers, 'registry', registry)
+    monkeypatch.setattr(transformers, 'TRANSFORMS', [])
+
+    assert [type(t) for t in transformers.get_transformers('2018-02-15', 'company', 'list')] == [
+        DropEmailTransformer, UppercaseRoleTransformer,
+    ]
+
+    # Changes aren't picked up per request, they have to be applied explicitly
+    transformers.TRANSFORMS.append(('2018-04-01', [CompanyTitleTransformer]))
+    assert [type(t) for t in transformers.get_transformers('2018-02-15', 'company', 'list')] == [
+        DropEmailTransformer, UppercaseRoleTransformer,
+    ]
+
+    registry.set_legacy_transforms(transformers.TRANSFORMS)
+    assert [type(t) for t in transformers.get_transformers('2018-02-15', 'company', 'list')] == [
+        CompanyTitleTransformer, DropEmailTransformer, UppercaseRoleTransformer,
+    ]
+    # Legacy transformers are prepared as well
+    assert '_compiled_output' in CompanyTitleTransformer.__dict__
+
+    transformers.TRANSFORMS.clear()
+    registry.set_legacy_transforms(transformers.TRANSFORMS)
+    assert [type(t) for t in transformers.get_transformers('2018-02-15', 'company', 'list')] == [
+        DropEmailTransformer, UppercaseRoleTransformer,
+    ]
+
+
+class CompanyTitleTransformer(DeclarativeTransformer):
+    output_transforms = {
+        'company': [Rename('name', 'title'), Drop('email'), Default('country', 'EE'), MapValue('title', str.upper)],
+        'employment': [MapValue('role', {'admin': 'manager'})],
+    }
+    input_transforms = {
+        'company': [Rename('title', 'name'), Default('email', lambda: 'unknown@foo.bar')],
+    }
+
+
+def test_declarative_transformer_output():
+    transformer = CompanyTitleTransformer(None, 'list')
+    assert transformer.output_types == {'company', 'employment'}
+
+    data = TransformerPipeline([transformer, UppercaseRoleTransformer(None, 'list')]).output_backwards(
+        deepcopy(RESPONSE),
+    )
+    assert data['data'][0]['attributes'] == {'title': 'FOO', 'country': 'EE'}
+    assert data['included'][0]['attributes'] == {'name': 'Test User', 'role': 'MANAGER'}
+
+
+def test_declarative_transformer_input():
+    request_data = {'data': {'type': 'company', 'attributes': {'title': 'Foo'}}}
+
+    data = CompanyTitleTransformer(None, 'create').input_forwards(request_data)
+    assert data['data']['attributes'] == {'name': 'Foo', 'email': 'unknown@foo.bar'}
+
+    request_data = {'data': {'type': 'employment', 'id': '1', 'attributes': {'role': 'manager'}}}
+    data = CompanyTitleTransformer(None, 'partial_update').input_forwards(deepcopy(request_data))
+    assert data == request_data
+
+
+@pytest.mark.parametrize('transforms', [
+    [],
+    {1: [Drop('email')]},
+    {'company': Drop('email')},
+    {'company': [('drop', 'email')]},
+    {'company': [Drop('email'), Rename('email', 'mail')]},
+    {'company': [Rename('name', 'title'), MapValue('name', {})]},
+])
+def test_declarative_transformer_validation(transforms):
+    transformer_class = type('InvalidTransformer', (DeclarativeTransformer,), {'output_transforms': transforms})
+
+    registry = TransformerRegistry()
+    registry.register('2018-01-01', transformer_class)
+    with pytest.raises(ImproperlyConfigured):
+        registry.freeze()
+
+
+def test_declarative_operations_validation():
+    with pytest.raises(TypeError):
+        Rename('name', None)
+    with pytest.raises(TypeError):
+        MapValue('name', 'foo')
+
+    # Attributes can be re-added after they've been removed
+    compile_transforms({'company': [Drop('email'), Default('email', ''), MapValue('email', str.lower)]})
+
+
+def test_copy_on_write_dict():
+    original = {'name': 'Foo', 'address': {'city': 'Tallinn', 'geo': {'lat': 59}}, 'contact': {'email': 'a@b.c'}}
+    snapshot = deepcopy(original)
+
+    view = CopyOnWriteDict(original)
+    assert view == original
+    assert view.to_dict() is original
+
+    view['address']['geo']['lat'] = 60
+    view['title'] = view.pop('name')
+    assert view.modified
+    assert 'name' not in view and 'title' in view
+
+    result = view.to_dict()
+    assert original == snapshot
+    assert result == {'title': 'Foo', 'address': {'city': 'Tallinn', 'geo': {'lat': 60}}, 'contact': {'email': 'a@b.c'}}
+    assert result['contact'] is original['contact']
+    assert result['address'] is not original['address']
+
+
+def test_copy_on_write_dict_compatibility():
+    """ Views should work wherever dicts do (as the attributes did before), without modifying the original.
+    """
+
+    original = {'name': 'Foo', 'address': {'city': 'Tallinn'}}
+    snapshot = deepcopy(original)
+    view = CopyOnWriteDict(original)
+
+    assert isinstance(view, dict)
+    assert json.dumps(view, sort_keys=True) == json.dumps(original, sort_keys=True)
+
+    copied = view.copy()
+    assert type(copied) is dict and copied == original
+    copied['address']['city'] = 'Tartu'
+    copy(view)['name'] = 'Bar'
+    deepcopy(view)['address']['city'] = 'Narva'
+    view.get('address')['zip'] = '10111'
+    for value in view.values():
+        if isinstance(value, dict):
+            value.clear()
+    view.setdefault('tags', []).append('new')
+    assert original == snapshot
+
+    assert view.to_dict() == {'name': 'Foo', 'address': {}, 'tags': ['new']}
+    assert original == snapshot
+
+
+def test_transformers_dont_modify_original():
+    """ Transformers shouldn't modify the original data, unchanged objects should be shared with it.
+    """
+
+    original = deepcopy(RESPONSE)
+    classes = (RenameCompanyNameTransformer, DropEmailTransformer, UppercaseRoleTransformer, CompanyTitleTransformer)
+
+    data = TransformerPipeline(create_transformers(*classes)).output_backwards(original)
+    assert original == RESPONSE
+    assert data['data'][0]['attributes'] == {'title': 'FOO', 'country': 'EE'}
+
+    data = TransformerPipeline(create_transformers(RenameCompanyNameTransformer)).output_backwards(original)
+    assert data['data'][0] is not original['data'][0]
+    assert data['included'][0] is original['included'][0]
+
+    data = RenameCompanyNameTransformer(None, 'list').output_backwards(original)
+    assert original == RESPONSE
+    assert data['included'][0] is original['included'][0]
+
+
+def test_transformer_returning_new_dict():
+    class NewDictTransformer(VersionTransformer):
+        def convert_output_object(self, obj_type, obj_id, fields):
+            return {key.upper(): value for key, value in fields.items()}
+
+    obj = {'type': 'company', 'id': '1', 'attributes': {'name': 'Foo', 'address': {'city': 'Tallinn'}}}
+    result = NewDictTransformer(None, 'list').convert_output_object_container(obj)
+
+    assert result['attributes'] == {'NAME': 'Foo', 'ADDRESS': {'city': 'Tallinn'}}
+    assert type(result['attributes']['ADDRESS']) is dict
+    assert obj['attributes'] == {'name': 'Foo', 'address': {'city': 'Tallinn'}}
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 
-from tg_apicore import settings
+from tg_apicore import settings, transformers
 
 
 class TgApicoreConfig(AppConfig):
@@ -11,3 +11,5 @@ class TgApicoreConfig(AppConfig):
 
         settings.patch_django_settings()
         settings.verify_settings()
+
+        transformers.autodiscover()
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """ Small thread-safe in-process LRU cache
+
+    Used for caching things that are expensive to compute but only depend on their inputs (e.g. generated docs).
+    When the cache is full, the least recently used entry is discarded.
+
+    Number of cache hits and misses are counted in `hits` and `misses` attributes.
+    """
+
+    def __init__(self, maxsize=128) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """ Returns cached value for the key, calling factory() to compute (and store) it if it's missing
+
+        Note that factory() is called without holding the lock, so concurrent misses might compute the value more than
+        once. That's fine for our use-cases since the results are identical.
+        """
+
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = factory()
+            self.set(key, value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+_missing = object()
@@ -0,0 +1,123 @@
+import gzip
+from collections import OrderedDict
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+IDENTITY = 'identity'
+
+# Available codecs, in the order of preference. Content is compressed once and then served many times, so maximum
+# compression levels are used.
+CODECS = OrderedDict()
+if brotli is not None:
+    CODECS['br'] = brotli.compress
+CODECS['gzip'] = gzip.compress
+
+# Smaller content isn't compressed, same as with Django's GZipMiddleware
+MIN_SIZE = 200
+
+
+def compress_variants(content: bytes) -> dict:
+    """ Returns {encoding: bytes} dict of the content itself (identity encoding) and its compressed variants
+
+    gzip variant is always created (unless the content is tiny), brotli variant only if brotli package is installed.
+    Variants which aren't smaller than the original content are left out.
+    """
+
+    variants = {IDENTITY: content}
+    if len(content) < MIN_SIZE:
+        return variants
+
+    for encoding, compress in CODECS.items():
+        compressed = compress(content)
+        if len(compressed) < len(content):
+            variants[encoding] = compressed
+
+    return variants
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """ Parses value of Accept-Encoding header into {encoding: qvalue} dict """
+
+    accepted = {}
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+
+        qvalue = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                qvalue = float(params[2:])
+            except ValueError:
+                qvalue = 0.0
+        accepted[encoding] = qvalue
+
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, variants) -> str:
+    """ Returns the preferred encoding among the variants that's acceptable according to Accept-Encoding header """
+
+    accepted = parse_accept_encoding(accept_encoding or '')
+    for encoding in CODECS:
+        if encoding in variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+
+    return IDENTITY
+
+
+def get_variant_etag(etag, encoding):
+    """ Returns ETag of the given variant - compressed variants get the encoding appended to the etag """
+
+    if etag is None or encoding == IDENTITY:
+        return etag
+
+    return '%s-%s"' % (etag[:-1], encoding)
+
+
+def get_precompressed_response(request, variants, etag=None, content_type=None) -> HttpResponse:
+    """ Returns response with the variant that suits the request best
+
+    If etag (of the uncompressed content) is given, conditional requests are handled as well - 304 (Not Modified) is
+    returned if the client already has the same variant.
+    """
+
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), variants)
+    etag = get_variant_etag(etag, encoding)
+
+    response = get_conditional_response(request, etag=etag) if etag is not None else None
+    if response is None:
+        response = HttpResponse(variants[encoding], content_type=content_type)
+        if encoding != IDENTITY:
+            response['Content-Encoding'] = encoding
+        if etag is not None:
+            response['ETag'] = etag
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def use_precompressed_variant(request, response, variants) -> bytes:
+    """ Returns the variant that suits the request best and sets response's headers accordingly
+
+    This is meant for renderers, which can only return the content. If the response already has an ETag, it's
+    replaced with ETag of the chosen variant.
+    """
+
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), variants)
+    if encoding != IDENTITY:
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response['ETag'] = get_variant_etag(response['ETag'], encoding)
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    return variants[encoding]
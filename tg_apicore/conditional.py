@@ -0,0 +1,130 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.http import parse_etags, parse_http_date_safe
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from tg_apicore.compression import CODECS, get_variant_etag
+
+
+class NotModified(APIException):
+    """ Raised when the client already has the current representation of the resource
+
+    DetailSerializerViewSet turns it into an empty 304 (Not Modified) response.
+    """
+
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+    default_code = 'not_modified'
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Precondition failed.'
+    default_code = 'precondition_failed'
+
+
+def get_object_etag(pk, last_modified, serializer_class, version, related=(), representation=()) -> str:
+    """ Returns (strong) ETag of an object's representation
+
+    The ETag consists of two parts. The state part is based on the object's primary key and modification time, the
+    serializer class and API version used to render it, and identities of the related objects which are rendered as
+    well (e.g. as relationships or included resources) - given via related as
+    (lookup path, [(pk, modification time), ...]) tuples. The representation part is based on the options that change
+    the representation without changing the state (e.g. included resources and sparse fieldsets).
+    If-Match compares only the state parts, see `etag_matches()`.
+    """
+
+    serializer_path = '%s.%s' % (serializer_class.__module__, serializer_class.__qualname__) \
+        if serializer_class is not None else None
+    last_modified = last_modified.isoformat() if last_modified is not None else None
+    related = tuple(
+        (path, tuple(sorted((str(pk), value.isoformat() if value is not None else None) for pk, value in objects)))
+        for path, objects in related
+    )
+
+    state = hashlib.sha1(repr((str(pk), last_modified, serializer_path, version, related)).encode()).hexdigest()
+    if not representation:
+        return '"%s"' % state
+
+    return '"%s.%s"' % (state, hashlib.sha1(repr(representation).encode()).hexdigest()[:16])
+
+
+def get_etag_state(etag) -> str:
+    """ Returns the state part of an ETag returned by get_object_etag() (also of its precompressed variants)
+    """
+
+    return etag.strip('"').split('-', 1)[0].split('.', 1)[0]
+
+
+def get_http_timestamp(last_modified):
+    """ Returns the datetime as Unix timestamp with one second precision (as used by HTTP dates), or None
+    """
+
+    if last_modified is None:
+        return None
+
+    return timegm(last_modified.utctimetuple())
+
+
+def etag_matches(etag, header, weak=True, state_only=False) -> bool:
+    """ Returns True if the ETag (or ETag of any of its precompressed variants) is listed in the header
+
+    With weak=False, strong comparison is used (as required by If-Match), i.e. weak ETags never match.
+    With state_only=True, only state parts of the ETags are compared (see `get_object_etag()`).
+    """
+
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+
+    if weak:
+        etags = [tag[2:] if tag.startswith('W/') else tag for tag in etags]
+
+    if state_only:
+        state = get_etag_state(etag)
+        return any(not tag.startswith('W/') and get_etag_state(tag) == state for tag in etags)
+
+    variant_etags = {etag} | {get_variant_etag(etag, encoding) for encoding in CODECS}
+    return any(tag in variant_etags for tag in etags)
+
+
+def has_preconditions(request) -> bool:
+    return any(header in request.META for header in (
+        'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+    ))
+
+
+def evaluate_preconditions(request, etag, last_modified) -> bool:
+    """ Evaluates conditional request headers against the current ETag and modification time of the resource
+
+    Returns True if the response should be 304 (Not Modified), raises PreconditionFailed if a precondition fails.
+    Note that PreconditionFailed is also raised if If-None-Match matches for unsafe methods.
+    If-Match only compares the state of the resource, so ETags of any representation of it can be used.
+    The headers are evaluated in the order given by RFC 7232, section 6.
+    """
+
+    timestamp = get_http_timestamp(last_modified)
+    safe_method = request.method in ('GET', 'HEAD')
+
+    if_match = request.META.get('HTTP_IF_MATCH')
+    if_unmodified_since = parse_http_date_safe(request.META.get('HTTP_IF_UNMODIFIED_SINCE', ''))
+    if if_match is not None:
+        if not etag_matches(etag, if_match, weak=False, state_only=True):
+            raise PreconditionFailed()
+    elif if_unmodified_since is not None and timestamp is not None and timestamp > if_unmodified_since:
+        raise PreconditionFailed()
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if if_none_match is not None:
+        if etag_matches(etag, if_none_match):
+            if safe_method:
+                return True
+            raise PreconditionFailed()
+    elif if_modified_since is not None and safe_method and timestamp is not None and timestamp <= if_modified_since:
+        return True
+
+    return False
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 from typing import List  # NOQA
@@ -10,12 +11,114 @@ from rest_framework.utils import encoders
 
 logger = logging.getLogger(__name__)
 
+CACHE_METADATA_KEY = 'tg_apicore_cache'
+
 
 def jsonize(data):
     return mark_safe(json.dumps(data, cls=encoders.JSONEncoder, indent=2))
 
 
-@attr.s
+def docs_asdict(doc) -> dict:
+    """ attr.asdict() variant for docs objects that leaves out internal caches """
+
+    return attr.asdict(doc, filter=lambda attribute, value: not attribute.metadata.get(CACHE_METADATA_KEY))
+
+
+def docs_fingerprint(*docs) -> str:
+    """ Returns hash of the contents of given docs objects (APIDocs, SectionDocs, etc)
+
+    The hash only changes when the contents of the docs change, so it can be used to detect changes between docs
+    generated in different processes.
+    """
+
+    data = [docs_asdict(doc) if attr.has(doc.__class__) else doc for doc in docs]
+    return hashlib.sha1(json.dumps(data, cls=encoders.JSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def cache_attrib():
+    """ Attribute that holds cached values of CachedValuesMixin """
+
+    return attr.ib(default=None, init=False, repr=False, cmp=False, metadata={CACHE_METADATA_KEY: True})
+
+
+class VariablesTemplate:
+    """ Compiled form of a data structure (e.g. example payload in docs) containing %(NAME)s placeholders
+
+    The data is scanned only once, recording paths of all strings that need formatting. Applying substitutions then
+    only touches those strings and the containers on their paths - all other subtrees are shared with the original
+    data. Thus the result must be treated as read-only, or copied before modifying. The data itself must not be
+    modified in-place after compiling it.
+    """
+
+    def __init__(self, data) -> None:
+        super().__init__()
+        self.data = data
+        self.plan = self.compile(data)
+
+    @classmethod
+    def compile(cls, data):
+        """ Returns plan for the given data: True for strings that need formatting, list of (key, plan) tuples for
+        containers that have such strings somewhere inside them, None if there's nothing to do.
+        """
+
+        if isinstance(data, str):
+            return True if '%' in data else None
+
+        if isinstance(data, dict):
+            items = data.items()
+        elif isinstance(data, (list, tuple)):
+            items = enumerate(data)
+        else:
+            return None
+
+        plan = []
+        for k, v in items:
+            sub_plan = cls.compile(v)
+            if sub_plan is not None:
+                plan.append((k, sub_plan))
+
+        return plan or None
+
+    def apply(self, substitutions):
+        return self._apply(self.data, self.plan, substitutions)
+
+    @classmethod
+    def _apply(cls, data, plan, substitutions):
+        if plan is None:
+            return data
+        if plan is True:
+            return data % substitutions
+
+        # Lists and tuples are converted to lists, for backwards compatibility
+        result = dict(data) if isinstance(data, dict) else list(data)
+        for k, sub_plan in plan:
+            result[k] = cls._apply(data[k], sub_plan, substitutions)
+
+        return result
+
+
+class CachedValuesMixin:
+    """ Caches values computed from attributes of docs objects (e.g. pretty-printed json)
+
+    Cached value is recomputed when the source attribute is replaced with another object. Subclasses must define
+    `_cache = cache_attrib()`.
+    """
+
+    __slots__ = ()
+
+    def _get_cached(self, name, source, compute):
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = {}
+
+        entry = cache.get(name)
+        if entry is None or entry[0] is not source:
+            entry = cache[name] = (source, compute(source))
+
+        return entry[1]
+
+
+@attr.s(slots=True)
 class FieldDocs:
     """ Information about a single field of an object (gathered from viewset's serializer) """
 
@@ -26,8 +129,8 @@ class FieldDocs:
     is_create_only = attr.ib()
 
 
-@attr.s
-class MethodDocs:
+@attr.s(slots=True)
+class MethodDocs(CachedValuesMixin):
     """ Docs for a single API endpoint """
 
     action = attr.ib()
@@ -39,22 +142,34 @@ class MethodDocs:
     path = attr.ib(default=None)
     method = attr.ib(default=None)
 
+    _cache = cache_attrib()
+
     def __attrs_post_init__(self):
         self.docstring = self.docstring or ''
 
+    @property
+    def request_data_template(self) -> VariablesTemplate:
+        return self._get_cached('request_data_template', self.request_data, VariablesTemplate)
+
+    @property
+    def responses_template(self) -> VariablesTemplate:
+        return self._get_cached('responses_template', self.responses, VariablesTemplate)
+
     @property
     def request_data_json(self):
-        return jsonize(self.request_data)
+        return self._get_cached('request_data_json', self.request_data, jsonize)
 
     @property
     def responses_items(self):
         # Disable invalid pylint error, this might be fixed in upcoming 1.8.0
         # pylint: disable=not-an-iterable
-        return [(name, jsonize(data) if data is not None else None) for name, data in self.responses]
+        return self._get_cached('responses_items', self.responses, lambda responses: [
+            (name, jsonize(data) if data is not None else None) for name, data in responses
+        ])
 
 
-@attr.s
-class SectionDocs:
+@attr.s(slots=True)
+class SectionDocs(CachedValuesMixin):
     """ Docs for a section of the API, usually meaning a viewset """
 
     data = attr.ib(default=None)
@@ -67,19 +182,27 @@ class SectionDocs:
 
     fields = attr.ib(default=attr.Factory(list))  # type: list
 
+    _cache = cache_attrib()
+
     def __attrs_post_init__(self):
         self.docstring = self.docstring or ''
 
+    @property
+    def data_template(self) -> VariablesTemplate:
+        return self._get_cached('data_template', self.data, VariablesTemplate)
+
     @property
     def data_json(self):
-        return jsonize(self.data)
+        return self._get_cached('data_json', self.data, jsonize)
 
     @property
     def changelog_items(self):
-        return sorted(self.changelog.items(), reverse=True)
+        return self._get_cached('changelog_items', self.changelog, lambda changelog: sorted(
+            changelog.items(), reverse=True,
+        ))
 
 
-@attr.s
+@attr.s(slots=True)
 class APIDocs:
     """ Docs for the entire API """
 
@@ -0,0 +1,104 @@
+from django.utils.module_loading import import_string
+
+from tg_apicore.settings import get_setting
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+JSON_BACKEND_AUTO = 'auto'
+JSON_BACKEND_STDLIB = 'json'
+JSON_BACKEND_ORJSON = 'orjson'
+
+
+class JSONBackend:
+    """ Base class for JSON encoding backends
+
+    Backends only need to support the default (compact, utf-8, non-indented) output format of DRF's JSONRenderer,
+    renderers fall back to stdlib json for everything else.
+    """
+
+    name = None
+
+    def dumps(self, data, encoder_class) -> bytes:
+        """ Returns data encoded as compact utf-8 JSON
+
+        encoder_class is DRF's JSONEncoder (or subclass of it), its default() must be used for all types that aren't
+        natively supported by JSON. Should raise TypeError when data cannot be encoded - the renderer will then use
+        stdlib json instead.
+        """
+
+        raise NotImplementedError()
+
+
+class OrjsonBackend(JSONBackend):
+    """ JSON backend that uses orjson
+
+    Note that floats are encoded using the shortest representation, which means exponents are formatted differently
+    from stdlib json (e.g `1e16` vs `1e+16`), and that NaN and infinity are encoded as null.
+    """
+
+    name = JSON_BACKEND_ORJSON
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        if orjson is None:
+            raise ImportError("orjson JSON backend requires orjson package to be installed")
+
+        # Datetimes and dataclasses are handed over to the encoder's default() for identical output with stdlib json
+        self.options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        self._encoders = {}
+
+    def dumps(self, data, encoder_class) -> bytes:
+        default = self._encoders.get(encoder_class)
+        if default is None:
+            default = self._encoders[encoder_class] = encoder_class().default
+
+        ret = orjson.dumps(data, default=default, option=self.options)
+
+        # Fully escape \u2028 and \u2029, the same way as DRF's JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+        return ret
+
+
+_backends = {}
+
+
+def get_json_backend():
+    """ Returns the configured JSONBackend instance, or None if stdlib json should be used
+
+    The backend is selected via TG_APICORE_JSON_BACKEND setting:
+
+    - 'json' (default) - always use stdlib json (via DRF's JSONRenderer)
+    - 'auto' - use orjson if it's installed, stdlib json otherwise
+    - 'orjson' - use orjson, it must be installed
+    - dotted path to a JSONBackend subclass
+
+    All backends use DRF's encoder class for types that aren't natively supported by JSON, so datetimes, Decimals,
+    UUIDs, lazy strings, etc are encoded exactly as they would be with stdlib json. Output of other backends can
+    still differ in float formatting and handling of NaN / infinity, see OrjsonBackend.
+    """
+
+    name = get_setting('TG_APICORE_JSON_BACKEND')
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+
+    if name == JSON_BACKEND_STDLIB:
+        backend = None
+    elif name == JSON_BACKEND_AUTO:
+        backend = OrjsonBackend() if orjson is not None else None
+    elif name == JSON_BACKEND_ORJSON:
+        backend = OrjsonBackend()
+    else:
+        backend = import_string(name)()
+
+    _backends[name] = backend
+    return backend
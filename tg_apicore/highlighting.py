@@ -0,0 +1,23 @@
+import hashlib
+
+from rest_framework.compat import pygments_css, pygments_highlight
+
+from tg_apicore.cache import LRUCache
+from tg_apicore.settings import get_setting
+
+
+# Highlighted code and stylesheets. Both depend only on their inputs, so they're cached per process.
+HIGHLIGHT_CACHE = LRUCache(maxsize=get_setting('TG_APICORE_HIGHLIGHT_CACHE_SIZE'))
+
+
+def highlight(text: str, lang: str, style: str) -> str:
+    """ Cached variant of DRF's pygments_highlight() """
+
+    key = ('code', style, lang, hashlib.sha1(text.encode()).hexdigest())
+    return HIGHLIGHT_CACHE.get_or_set(key, lambda: pygments_highlight(text, lang, style))
+
+
+def highlight_css(style: str) -> str:
+    """ Cached variant of DRF's pygments_css() """
+
+    return HIGHLIGHT_CACHE.get_or_set(('css', style), lambda: pygments_css(style))
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template, render_to_string
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.utils.text import slugify
+
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+import tg_apicore
+from tg_apicore.docs import docs_asdict, docs_fingerprint
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Templates used for rendering the sections. Their contents are part of the manifest, so that changing them (e.g. via
+# project's template overrides) causes all the sections to be rendered again.
+SECTION_TEMPLATES = (
+    'tg_apicore/docs/section-full.html',
+    'tg_apicore/docs/section.html',
+    'tg_apicore/docs/method.html',
+    'tg_apicore/docs/method-python.html',
+)
+
+
+class Command(BaseCommand):
+    help = "Export API documentation as static html (plus json dump of the docs), for every API version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('view', help="Dotted path to your APIDocumentationView subclass")
+        parser.add_argument('output_dir', help="Directory where the docs are written, one subdirectory per version")
+        parser.add_argument(
+            '--api-version', action='append', dest='versions',
+            help="API version to export, can be given multiple times. Defaults to all ALLOWED_VERSIONS",
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help="Number of worker processes to use. Defaults to number of CPUs",
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Re-render only sections that have changed since the previous export into the same directory",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import_string(options['view'])
+        except ImportError as e:
+            raise CommandError("Cannot import docs view: %s" % e)
+
+        versions = options['versions'] or list(api_settings.ALLOWED_VERSIONS)
+        invalid_versions = set(versions) - set(api_settings.ALLOWED_VERSIONS)
+        if invalid_versions:
+            raise CommandError("Unknown API versions: %s" % ', '.join(sorted(invalid_versions)))
+
+        jobs = [(options['view'], version, options['output_dir'], options['incremental']) for version in versions]
+        processes = min(max(options['processes'] or 1, 1), len(jobs))
+
+        if processes == 1:
+            results = [export_version(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(export_version, *zip(*jobs)))
+
+        for version, rendered, reused in results:
+            self.stdout.write("%s: rendered %d sections, reused %d sections" % (version, rendered, reused))
+
+
+def export_version(view_path, version, output_dir, incremental=False):
+    """ Exports docs of the given API version into output_dir/version/
+
+    Each section is rendered separately into sections/ subdirectory. When incremental is True, sections which haven't
+    changed since the previous export (as recorded in the manifest) are reused instead of rendering them again.
+
+    Returns (version, rendered sections count, reused sections count) tuple.
+    """
+
+    # Needed when running in a worker process that was spawned instead of forked
+    if not apps.ready:
+        django.setup()
+
+    view = import_string(view_path)(api_version=version)
+    version_dir = os.path.join(output_dir, version)
+    sections_dir = os.path.join(version_dir, 'sections')
+    os.makedirs(sections_dir, exist_ok=True)
+
+    templates_fingerprint = get_templates_fingerprint(SECTION_TEMPLATES)
+    previous_fingerprints = {}
+    if incremental:
+        previous_fingerprints = _load_manifest(version_dir, templates_fingerprint)
+
+    context = view.get_context_data()
+    api = context['api']
+
+    fingerprints = {}
+    sections_html = []
+    rendered = reused = 0
+    for section in (api.sections if api is not None else []):
+        filename = os.path.join(sections_dir, '%s.html' % slugify(section.name))
+        fingerprint = docs_fingerprint(section, api.site_url, api.base_path)
+        fingerprints[section.name] = fingerprint
+
+        if previous_fingerprints.get(section.name) == fingerprint and os.path.exists(filename):
+            with open(filename, encoding='utf-8') as f:
+                section_html = f.read()
+            reused += 1
+        else:
+            section_html = render_to_string('tg_apicore/docs/section-full.html', {'api': api, 'section': section})
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(section_html)
+            rendered += 1
+
+        sections_html.append(mark_safe(section_html))
+
+    # Remove sections which no longer exist
+    existing_filenames = {'%s.html' % slugify(name) for name in fingerprints}
+    for filename in os.listdir(sections_dir):
+        if filename not in existing_filenames:
+            os.remove(os.path.join(sections_dir, filename))
+
+    context['sections_html'] = sections_html
+    with open(os.path.join(version_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(render_to_string('tg_apicore/docs/export.html', context))
+
+    with open(os.path.join(version_dir, 'api.json'), 'w', encoding='utf-8') as f:
+        json.dump(docs_asdict(api) if api is not None else None, f, cls=encoders.JSONEncoder, indent=2)
+
+    with open(os.path.join(version_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({
+            'tg_apicore_version': tg_apicore.__version__, 'templates': templates_fingerprint, 'sections': fingerprints,
+        }, f, indent=2)
+
+    return version, rendered, reused
+
+
+def get_templates_fingerprint(template_names) -> str:
+    """ Returns hash of the sources of the given templates, as resolved by the template loaders (incl. overrides)
+    """
+
+    hasher = hashlib.sha1()
+    for name in template_names:
+        template = get_template(name)
+        # Django's templates expose their source via the wrapped template object
+        source = getattr(getattr(template, 'template', template), 'source', '')
+        hasher.update(name.encode())
+        hasher.update(source.encode())
+
+    return hasher.hexdigest()
+
+
+def _load_manifest(version_dir, templates_fingerprint) -> dict:
+    """ Returns section fingerprints of the previous export, or empty dict if it cannot be used """
+
+    try:
+        with open(os.path.join(version_dir, MANIFEST_FILENAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    # Templates might have changed between tg_apicore versions, so don't reuse anything in that case
+    if manifest.get('tg_apicore_version') != tg_apicore.__version__:
+        return {}
+    if manifest.get('templates') != templates_fingerprint:
+        return {}
+
+    return manifest.get('sections', {})
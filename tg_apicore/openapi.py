@@ -0,0 +1,116 @@
+import re
+from collections import OrderedDict
+
+from tg_apicore.docs import APIDocs, MethodDocs, SectionDocs
+
+
+OPENAPI_VERSION = '3.0.0'
+MEDIA_TYPE = 'application/json'
+
+RESPONSE_STATUS_RE = re.compile(r'\(status (\d{3})\)')
+PATH_PARAMETER_RE = re.compile(r'{([^}]+)}')
+
+
+def generate_openapi_schema(docs: APIDocs, version: str) -> OrderedDict:
+    """ Converts APIDocs into OpenAPI 3 document
+
+    Example payloads from the docs are included as examples of requests/responses. Create-only fields are marked with
+    `x-createOnly` extension (OpenAPI doesn't have a native equivalent).
+    """
+
+    paths = OrderedDict()
+    schemas = OrderedDict()
+    for section in docs.sections:
+        schemas[section.name] = get_section_schema(section)
+
+        for method_doc in section.methods:
+            path_item = paths.setdefault('/' + method_doc.path, OrderedDict())
+            path_item[method_doc.method.lower()] = get_operation(section, method_doc)
+
+    return OrderedDict([
+        ('openapi', OPENAPI_VERSION),
+        ('info', OrderedDict([
+            ('title', docs.title),
+            ('description', docs.description),
+            ('version', version),
+        ])),
+        ('servers', [{'url': (docs.site_url + docs.base_path).rstrip('/')}]),
+        ('paths', paths),
+        ('components', {'schemas': schemas}),
+    ])
+
+
+def get_section_schema(section: SectionDocs) -> OrderedDict:
+    """ Returns schema of the resource's attributes """
+
+    properties = OrderedDict()
+    required = []
+    for field in section.fields or []:
+        field_schema = OrderedDict([('description', field.description)])
+        if field.is_read_only:
+            field_schema['readOnly'] = True
+        if field.is_create_only:
+            field_schema['x-createOnly'] = True
+        properties[field.name] = field_schema
+
+        if field.is_required and not field.is_read_only:
+            required.append(field.name)
+
+    schema = OrderedDict([
+        ('type', 'object'),
+        ('description', section.docstring),
+        ('properties', properties),
+    ])
+    if required:
+        schema['required'] = required
+    if section.data is not None:
+        schema['example'] = section.data
+
+    return schema
+
+
+def get_operation(section: SectionDocs, method_doc: MethodDocs) -> OrderedDict:
+    operation = OrderedDict([
+        ('operationId', '%s_%s' % (section.name, method_doc.action)),
+        ('tags', [section.name]),
+        ('summary', method_doc.docstring.strip().split('\n')[0]),
+        ('description', method_doc.docstring),
+    ])
+
+    parameters = [
+        OrderedDict([('name', name), ('in', 'path'), ('required', True), ('schema', {'type': 'string'})])
+        for name in PATH_PARAMETER_RE.findall(method_doc.path)
+    ]
+    if parameters:
+        operation['parameters'] = parameters
+
+    if method_doc.request_data is not None:
+        operation['requestBody'] = {
+            'content': {MEDIA_TYPE: {'example': method_doc.request_data}},
+        }
+
+    operation['responses'] = get_responses(method_doc)
+    return operation
+
+
+def get_responses(method_doc: MethodDocs) -> OrderedDict:
+    """ Converts (name, data) tuples of the method docs into OpenAPI responses, grouped by status code
+
+    Status code is parsed from the name (e.g. 'Response (status 201)'), responses without a status code are included
+    as the default response.
+    """
+
+    responses = OrderedDict()
+    for name, data in method_doc.responses:
+        match = RESPONSE_STATUS_RE.search(str(name))
+        status = match.group(1) if match else 'default'
+
+        response = responses.setdefault(status, OrderedDict([('description', str(name))]))
+        if data is not None:
+            examples = response.setdefault('content', {MEDIA_TYPE: {'examples': OrderedDict()}})[MEDIA_TYPE]['examples']
+            examples[str(name)] = {'value': data}
+
+    if not responses:
+        responses['default'] = {'description': "Response"}
+
+    return responses
@@ -1,8 +1,33 @@
+from rest_framework.parsers import JSONParser as DRFJSONParser
 from rest_framework_json_api.parsers import JSONParser as JSONAPIParser
 
 from tg_apicore.renderers import JSONRenderer
+from tg_apicore.transformers import TransformerPipeline, get_request_transformers
 
 
-class JSONParser(JSONAPIParser):
+class TransformerAwareJSONParser(DRFJSONParser):
+    """ Applies version transformers of the request to the parsed data
+
+    Transformers are resolved once per request (see `get_request_transformers()`) and stored on the request, so that
+    the renderer can reuse them. Input conversions of all the transformers are done in a single pass over the data,
+    via TransformerPipeline.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        data = super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        request = parser_context.get('request')
+        if request is None:
+            return data
+
+        version_transformers = get_request_transformers(request, parser_context.get('view'))
+        if version_transformers:
+            data = TransformerPipeline(version_transformers).input_forwards(data)
+
+        return data
+
+
+class JSONParser(JSONAPIParser, TransformerAwareJSONParser):
     media_type = 'application/json'
     renderer_class = JSONRenderer
@@ -0,0 +1,314 @@
+import logging
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import prefetch_related_objects
+from django.db.models.query import ModelIterable
+
+import attr
+import inflection
+from rest_framework import relations, serializers
+from rest_framework_json_api import utils
+
+from tg_apicore.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(slots=True, frozen=True)
+class QueryPlan:
+    """ select_related() / prefetch_related() lookups needed for serializing objects of a queryset
+    """
+
+    select_related = attr.ib(default=())
+    prefetch_related = attr.ib(default=())
+
+    def __bool__(self):
+        return bool(self.select_related or self.prefetch_related)
+
+    def apply(self, queryset):
+        """ Adds the lookups to the queryset
+
+        Querysets which don't return model instances (e.g. `values()`) are returned as-is. select_related() lookups
+        over deferred fields (see `only()` / `defer()`) are left out, since these cannot be combined - the related
+        objects are then fetched on demand, as usual.
+        """
+
+        if not is_model_queryset(queryset):
+            return queryset
+
+        select_related = [path for path in self.select_related if not is_deferred(queryset, path.split('__')[0])]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+
+        return queryset
+
+    def prefetch(self, instances):
+        """ Loads the related objects of already fetched instances (select_related ones are prefetched as well)
+        """
+
+        lookups = self.select_related + self.prefetch_related
+        if instances and lookups:
+            prefetch_related_objects(list(instances), *lookups)
+
+
+def is_model_queryset(queryset) -> bool:
+    """ Returns True if the queryset returns model instances, i.e. it's not e.g. `values()` queryset
+    """
+
+    return issubclass(queryset._iterable_class, ModelIterable)  # pylint: disable=protected-access
+
+
+def is_deferred(queryset, field_name) -> bool:
+    """ Returns True if loading of the model field is deferred in the queryset (see `only()` / `defer()`)
+    """
+
+    field_names, defer = queryset.query.deferred_loading
+    if defer:
+        return field_name in field_names
+
+    return bool(field_names) and field_name not in {name.split('__')[0] for name in field_names}
+
+
+def get_relation(model, name):
+    """ Returns model's relation (forward field or reverse relation) with the given attribute name, or None
+
+    Reverse relations are looked up by their accessor name (e.g. `employees` or `employment_set`), since that's what
+    serializer field sources refer to.
+    """
+
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == name:
+            return relation
+
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+    # Generic foreign keys don't have related model and can't be select_related()
+    if not field.is_relation or field.auto_created or field.related_model is None:
+        return None
+
+    return field
+
+
+class QueryPlanner:
+    """ Derives select_related() / prefetch_related() lookups from serializer fields
+
+    Fields whose source traverses relations of the model (e.g. `source='user.email'`) and relation fields add lookups
+    for the relations - single-valued relations are joined via select_related(), multi-valued ones (and everything
+    below them) are prefetched. Nested serializers and included serializers of the included resources are planned
+    recursively.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.select_related = OrderedDict()  # type: OrderedDict
+        self.prefetch_related = OrderedDict()  # type: OrderedDict
+
+    def get_plan(self) -> QueryPlan:
+        return QueryPlan(tuple(self.select_related), tuple(self.prefetch_related))
+
+    def add_path(self, model, attrs, prefix='', prefetch=False):
+        """ Adds lookups for traversing the given attribute path, starting from the model
+
+        Traversing stops at the first attribute that isn't a relation. Returns (model, path, prefetch) tuple of the
+        last traversed relation.
+        """
+
+        path = prefix
+        for name in attrs:
+            relation = get_relation(model, name)
+            if relation is None:
+                break
+
+            path = '%s__%s' % (path, name) if path else name
+            prefetch = prefetch or relation.one_to_many or relation.many_to_many
+            if prefetch:
+                self.prefetch_related[path] = True
+            else:
+                self.select_related[path] = True
+            model = relation.related_model
+
+        return model, path, prefetch
+
+    def add_serializer(self, serializer, model, included_resources=(), prefix='', prefetch=False):
+        """ Adds lookups needed by the serializer (instance) for serializing objects of the given model
+
+        included_resources are the include paths (as in `include` query param) relative to the serializer.
+        """
+
+        included_resources = [inflection.underscore(value) for value in included_resources]
+        included_serializers = utils.get_included_serializers(serializer)
+
+        for field in serializer.fields.values():
+            if field.write_only or field.source == '*':
+                continue
+
+            field_model, path, field_prefetch = self.add_path(model, field.source_attrs, prefix, prefetch)
+            if path == prefix:
+                continue
+
+            if isinstance(field, serializers.BaseSerializer):
+                nested = field.child if isinstance(field, serializers.ListSerializer) else field
+                self.add_serializer(nested, field_model, (), path, field_prefetch)
+
+            elif field.field_name in included_serializers and \
+                    field.field_name in [node.split('.')[0] for node in included_resources]:
+                nested_included_resources = [
+                    node.split('.', 1)[1] for node in included_resources
+                    if node.split('.')[0] == field.field_name and '.' in node
+                ]
+                included_serializer = included_serializers[field.field_name](context=serializer.context)
+                self.add_serializer(included_serializer, field_model, nested_included_resources, path, field_prefetch)
+
+
+def get_related_objects(instance, path) -> list:
+    """ Returns objects related to the instance via the lookup path (e.g. `employees__user`)
+
+    Relations are traversed via model attributes, so already loaded objects (select_related / prefetch_related, see
+    `QueryPlan.prefetch()`) are used as-is.
+    """
+
+    objects = [instance]
+    for name in path.split('__'):
+        related = []
+        for obj in objects:
+            value = getattr(obj, name, None)
+            # Managers of multi-valued relations
+            if hasattr(value, 'all'):
+                related.extend(value.all())
+            elif value is not None:
+                related.append(value)
+        objects = related
+
+    return objects
+
+
+def get_planning_context(context) -> dict:
+    """ Returns serializer context for planning, i.e. the given context without the request
+
+    Plans are cached and shared by all requests, thus they cannot depend on the request - e.g. on its sparse fieldsets
+    (`fields[<type>]` query params), which would remove fields from the serializer.
+    """
+
+    return {key: value for key, value in (context or {}).items() if key != 'request'}
+
+
+# QueryPlans keyed by (serializer class, model, included resources). See get_query_plan()
+QUERY_PLANS_CACHE = LRUCache(maxsize=1024)
+
+
+def get_query_plan(serializer_class, model, included_resources=None, context=None) -> QueryPlan:
+    """ Returns QueryPlan for serializing objects of the given model with the serializer class
+
+    included_resources is the list of requested include paths, None means serializer's default included resources
+    (JSONAPIMeta.included_resources).
+
+    Plans are cached per (serializer class, model, included resources), so the serializer is instantiated only once.
+    The context is used only when the serializer has to be instantiated, thus the fields must not depend on it. The
+    request is left out of it (see `get_planning_context()`), so all fields are planned even with sparse fieldsets.
+    """
+
+    if included_resources is not None:
+        included_resources = tuple(sorted(set(included_resources)))
+    key = (serializer_class, model, included_resources)
+
+    return QUERY_PLANS_CACHE.get_or_set(key, lambda: plan_query(
+        serializer_class, model, included_resources, context,
+    ))
+
+
+def plan_query(serializer_class, model, included_resources=None, context=None) -> QueryPlan:
+    """ Computes QueryPlan for serializing objects of the given model with the serializer class (uncached)
+    """
+
+    # Polymorphic serializers have different fields per model
+    if serializer_class is None or hasattr(serializer_class, 'polymorphic_serializers'):
+        return QueryPlan()
+
+    try:
+        serializer = serializer_class(context=get_planning_context(context))
+        if included_resources is None:
+            included_resources = utils.get_default_included_resources_from_serializer(serializer)
+
+        planner = QueryPlanner()
+        planner.add_serializer(serializer, model, included_resources)
+    except Exception:  # pylint: disable=broad-except
+        # Planning is only an optimization, the queryset can be used as-is.
+        logger.warning("Failed to plan queries for %s", serializer_class.__name__, exc_info=True)
+        return QueryPlan()
+
+    return planner.get_plan()
+
+
+# Tuples of column (field) names, keyed by (serializer class, model). See get_serializer_columns()
+SERIALIZER_COLUMNS_CACHE = LRUCache(maxsize=1024)
+
+
+def get_serializer_columns(serializer_class, model, context=None):
+    """ Returns names of the model's fields needed by the serializer class, or None if they cannot be determined
+
+    The result can be given to `queryset.only()`. Results are cached per (serializer class, model), the context is
+    used only when the serializer has to be instantiated, without the request (see `get_planning_context()`).
+    """
+
+    return SERIALIZER_COLUMNS_CACHE.get_or_set((serializer_class, model), lambda: serializer_columns(
+        serializer_class, model, context,
+    ))
+
+
+def serializer_columns(serializer_class, model, context=None):
+    """ Computes names of the model's fields needed by the serializer class (uncached)
+
+    The primary key is always included. Fields whose source starts with a concrete model field (including foreign
+    keys, e.g. `source='user.email'`) need that field, reverse and many-to-many relations need only the primary key.
+    Hyperlinked identity fields need their lookup field.
+
+    None is returned if the serializer uses anything else - e.g. model properties or methods, or fields with
+    `source='*'` (such as SerializerMethodField) - since it might depend on any of the fields.
+    """
+
+    if serializer_class is None or hasattr(serializer_class, 'polymorphic_serializers'):
+        return None
+
+    try:
+        serializer = serializer_class(context=get_planning_context(context))
+        fields = list(serializer.fields.values())
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Failed to get fields of %s", serializer_class.__name__, exc_info=True)
+        return None
+
+    columns = OrderedDict([(model._meta.pk.name, True)])
+    for field in fields:
+        if field.write_only:
+            continue
+
+        if field.source == '*':
+            if not isinstance(field, relations.HyperlinkedIdentityField):
+                return None
+            name = field.lookup_field
+        else:
+            name = field.source_attrs[0]
+
+        if name == 'pk':
+            continue
+
+        relation = get_relation(model, name)
+        if relation is not None and (relation.many_to_many or relation.one_to_many):
+            continue
+
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            return None
+
+        columns[model_field.name] = True
+
+    return tuple(columns)
@@ -1,20 +1,144 @@
 import logging
+import tempfile
+from collections import defaultdict
+
+from django.utils.encoding import force_text
 
 from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+from rest_framework_json_api import utils
 from rest_framework_json_api.renderers import JSONRenderer as JSONAPIRenderer
+from rest_framework_json_api.serializers import PolymorphicModelSerializer
+
+from tg_apicore.compression import IDENTITY, compress_variants, use_precompressed_variant
+from tg_apicore.encoders import get_json_backend
+from tg_apicore.response_cache import get_document_cache_key, get_fragment_cache, get_fragment_cache_key, \
+    get_fragment_cache_timeout, get_response_cache, get_response_cache_timeout, get_response_serializer_class
+from tg_apicore.transformers import ObjectsStage, TransformerPipeline, get_request_transformers
 
 
 logger = logging.getLogger(__name__)
 
 
-class TransformerAwareJSONRenderer(DRFJSONRenderer):
+class BaseJSONRenderer(DRFJSONRenderer):
+    """ JSON renderer that uses the configured JSON backend for encoding (see tg_apicore.encoders)
+
+    Falls back to DRF's stdlib json based implementation for output formats that the backend doesn't support (e.g.
+    indented output) and for data that it cannot encode.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        backend = get_json_backend()
+        if backend is None or data is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            return backend.dumps(data, self.encoder_class)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+    def encode(self, data) -> bytes:
+        """ Encodes data as compact JSON, without any other processing (e.g. JSON API formatting or transformers)
+        """
+
+        return BaseJSONRenderer.render(self, data)
+
+
+class TransformerAwareJSONRenderer(BaseJSONRenderer):
+    """ Applies version transformers of the request (see `get_request_transformers()`) to the rendered data
+
+    The transformers are applied via TransformerPipeline, so per-object conversions of all of them are done in a single
+    pass over the data.
+
+    Transformed responses can be cached (see tg_apicore.response_cache), so that older API versions cost one
+    transformation per change of the data instead of one per request. This is opt-in, via TG_APICORE_RESPONSE_CACHE
+    setting and the view's `get_response_cache_scope()`. Cached responses are stored along with their compressed
+    variants, and served compressed to clients which accept that.
+    """
+
     def render(self, data, accepted_media_type=None, renderer_context=None):
         assert renderer_context
-        version_transformers = getattr(renderer_context.get("request"), 'version_transformers', [])
-        for transformer in version_transformers:
-            data = transformer.output_backwards(data)
+        version_transformers = self.get_version_transformers(renderer_context)
+        if not version_transformers:
+            return super().render(data, accepted_media_type, renderer_context)
 
-        return super().render(data, accepted_media_type, renderer_context)
+        cache = get_response_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = self.get_response_cache_key(data, accepted_media_type, renderer_context)
+        if cache_key is not None:
+            variants = cache.get(cache_key)
+            if variants is not None:
+                return self.use_variant(variants, renderer_context)
+
+        data = TransformerPipeline(version_transformers).output_backwards(data)
+        content = super().render(data, accepted_media_type, renderer_context)
+
+        if cache_key is not None:
+            variants = compress_variants(content)
+            cache.set(cache_key, variants, get_response_cache_timeout())
+            return self.use_variant(variants, renderer_context)
+
+        return content
+
+    def use_variant(self, variants, renderer_context) -> bytes:
+        """ Returns the precompressed variant of cached response that suits the request best
+
+        Content-Encoding header of the response is set accordingly. Compressed variants are used only if the output of
+        this renderer is the response body - not e.g. when BrowsableAPIRenderer embeds it in a html page.
+        """
+
+        request = renderer_context.get('request')
+        response = renderer_context.get('response')
+        if request is None or response is None or getattr(response, 'accepted_renderer', None) is not self or \
+                'indent' in renderer_context:
+            return variants[IDENTITY]
+
+        return use_precompressed_variant(request, response, variants)
+
+    def get_response_cache_key(self, data, accepted_media_type, renderer_context):
+        """ Returns cache key of the transformed response, or None if it shouldn't be cached
+
+        Only successful responses of views that implement `get_response_cache_scope()` are cached. The scope describes
+        visibility of the data (e.g. 'public' if everyone sees the same data, or user id), it's part of the key along
+        with the API version, serializer class and the (latest-version) data of the response (see
+        `get_document_cache_key()`).
+        """
+
+        request = renderer_context.get('request')
+        response = renderer_context.get('response')
+        scope = self.get_response_cache_scope(renderer_context)
+        if scope is None:
+            return None
+
+        serializer_class = get_response_serializer_class(response.data)
+        if serializer_class is None:
+            return None
+
+        return get_document_cache_key(
+            data, 'tg_apicore:response', getattr(request, 'version', None), str(scope),
+            '%s.%s' % (serializer_class.__module__, serializer_class.__qualname__),
+            type(self).__name__, accepted_media_type,
+        )
+
+    def get_response_cache_scope(self, renderer_context):
+        """ Returns the view's response cache scope (see `get_response_cache_scope()` of the view), or None if
+        the response shouldn't be cached
+        """
+
+        response = renderer_context.get('response')
+        if response is None or response.status_code != 200:
+            return None
+
+        get_scope = getattr(renderer_context.get('view'), 'get_response_cache_scope', None)
+        return get_scope() if get_scope is not None else None
+
+    def get_version_transformers(self, renderer_context) -> list:
+        request = renderer_context.get('request')
+        if request is None:
+            return []
+
+        return get_request_transformers(request, renderer_context.get('view'))
 
 
 class JSONRenderer(JSONAPIRenderer, TransformerAwareJSONRenderer):
@@ -26,7 +150,227 @@ class JSONRenderer(JSONAPIRenderer, TransformerAwareJSONRenderer):
     media_type = 'application/json'
     format = 'json'
 
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+
+        cache = get_fragment_cache()
+        if cache is not None:
+            content = self.render_with_fragment_cache(cache, data, accepted_media_type, renderer_context)
+            if content is not None:
+                return content
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def render_with_fragment_cache(self, cache, data, accepted_media_type, renderer_context):
+        """ Renders the response using cached fragments - encoded resource objects
+
+        Each resource object of the primary data is cached separately, keyed by its type, id and serialized values,
+        serializer class and its (sparse) fields, API version, base url and the view's scope (see
+        `TransformerAwareJSONRenderer.get_response_cache_scope()`). Cached fragments are spliced into the output as-is,
+        only the missing ones are built, transformed and encoded. Included resources, links and meta are rendered as
+        usual.
+
+        Returns None if the response cannot be rendered this way, e.g. because of an error, indented output,
+        polymorphic serializers or transformers which need the whole response.
+        """
+
+        view = renderer_context.get('view')
+        request = renderer_context.get('request')
+
+        scope = self.get_response_cache_scope(renderer_context)
+        if scope is None or request is None or self.get_indent(accepted_media_type, renderer_context) is not None:
+            return None
+
+        resource_name = utils.get_resource_name(renderer_context)
+        if not isinstance(resource_name, str) or resource_name == 'errors':
+            return None
+
+        from rest_framework_json_api.views import RelationshipView
+        if isinstance(view, RelationshipView):
+            return None
+
+        pipeline = TransformerPipeline(self.get_version_transformers(renderer_context))
+        if not all(isinstance(stage, ObjectsStage) for stage in pipeline.output_stages):
+            return None
+
+        serializer_data = data['results'] if data and 'results' in data else data
+        serializer = getattr(serializer_data, 'serializer', None)
+        if serializer is None:
+            return None
+
+        many = getattr(serializer, 'many', False)
+        resource_serializer = serializer.child if many else serializer
+        if isinstance(resource_serializer, PolymorphicModelSerializer):
+            return None
+
+        if many:
+            objects = list(zip(serializer_data, serializer.instance))
+        elif serializer.instance is not None:
+            objects = [(serializer_data, serializer.instance)]
+        else:
+            return None
+
+        fields = utils.get_serializer_fields(resource_serializer)
+        serializer_class = type(resource_serializer)
+        # Field names are part of the key since they depend on the request's sparse fieldsets
+        key_parts = [
+            resource_name, '%s.%s' % (serializer_class.__module__, serializer_class.__qualname__), sorted(fields),
+            getattr(request, 'version', None), str(scope), request.build_absolute_uri('/'),
+        ]
+        keys = [
+            get_fragment_cache_key(resource, *key_parts, force_text(instance.pk))
+            for resource, instance in objects
+        ]
+        cached_fragments = cache.get_many(keys)
+
+        included_resources = utils.get_included_resources(request, serializer)
+        included_cache = defaultdict(dict)
+        fragments = []
+        new_fragments = {}
+        for (resource, instance), key in zip(objects, keys):
+            fragment = cached_fragments.get(key)
+            if fragment is None:
+                resource_obj = self.build_json_resource_obj(fields, resource, instance, resource_name)
+                meta = self.extract_meta(serializer, resource)
+                if meta:
+                    resource_obj['meta'] = utils._format_object(meta)  # pylint: disable=protected-access
+
+                fragment = new_fragments[key] = self.encode(pipeline.convert_output_object_container(resource_obj))
+
+            fragments.append(fragment)
+            self.extract_included(fields, resource, instance, included_resources, included_cache)
+
+        if new_fragments:
+            cache.set_many(new_fragments, get_fragment_cache_timeout())
+
+        # Resources which are also in primary data must not be included (same as JSONAPIRenderer does)
+        for _, instance in objects:
+            included_cache.get(resource_name, {}).pop(force_text(instance.pk), None)
+        included = [
+            pipeline.convert_output_object_container(included_cache[included_type][included_id])
+            for included_type in sorted(included_cache.keys())
+            for included_id in sorted(included_cache[included_type].keys())
+        ]
+
+        json_api_meta = data.get('meta', {}) if isinstance(data, dict) else {}
+        json_api_meta.update(self.extract_root_meta(serializer, serializer_data))
+
+        parts = []
+        if isinstance(data, dict) and data.get('links'):
+            parts.append(b'"links":' + self.encode(data['links']))
+        parts.append(b'"data":' + (b'[' + b','.join(fragments) + b']' if many else fragments[0]))
+        if included:
+            parts.append(b'"included":' + self.encode(included))
+        if json_api_meta:
+            json_api_meta = utils._format_object(json_api_meta)  # pylint: disable=protected-access
+            parts.append(b'"meta":' + self.encode(json_api_meta))
+
+        return b'{' + b','.join(parts) + b'}'
+
+    # Streamed responses are yielded in chunks of (approximately) this size
+    stream_chunk_size = 64 * 1024
+    # Encoded `included` resources are kept in memory up to this size when streaming, then spooled to a temporary file
+    stream_spool_size = 1024 * 1024
+
+    def render_stream(self, instances, serializer, renderer_context):
+        """ Renders JSON API list document incrementally, returning iterator over chunks of bytes
+
+        instances should be an iterator (e.g. `queryset.iterator()`), serializer a list serializer (`many=True`)
+        without any data - each instance is serialized, converted into resource object and encoded one at a time, so
+        only the current resource is held in memory. Included resources are emitted after all the primary data, they
+        are spooled to a temporary file in the meanwhile. Only (type, id) keys of the resources are kept in memory,
+        to avoid duplicates.
+
+        Version transformers are applied to each resource object separately (see
+        `TransformerPipeline.convert_output_object_container()`). The document has no top-level links or meta, and
+        included resources are in the order they were encountered in.
+        """
+
+        request = renderer_context.get('request')
+        resource_name = utils.get_resource_name(renderer_context)
+        included_resources = utils.get_included_resources(request, serializer)
+        pipeline = TransformerPipeline(self.get_version_transformers(renderer_context))
+
+        data_keys = set()
+        included_keys = set()
+        # ((type, id), encoded size) of the spooled included resources, in the order they were written
+        included_index = []
+
+        with tempfile.SpooledTemporaryFile(max_size=self.stream_spool_size) as included_file:
+            buffer = bytearray(b'{"data":[')
+            for position, instance in enumerate(instances):
+                resource_obj, included_cache = self.build_stream_resource_obj(
+                    serializer, instance, resource_name, included_resources,
+                )
+                data_keys.add((resource_obj['type'], resource_obj['id']))
+
+                if position:
+                    buffer += b','
+                buffer += self.encode(pipeline.convert_output_object_container(resource_obj))
+
+                for included_type, included_objs in included_cache.items():
+                    for included_id, included_obj in included_objs.items():
+                        key = (included_type, included_id)
+                        if key not in included_keys:
+                            included_keys.add(key)
+                            encoded = self.encode(pipeline.convert_output_object_container(included_obj))
+                            included_file.write(encoded)
+                            included_index.append((key, len(encoded)))
+
+                if len(buffer) >= self.stream_chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+
+            buffer += b']'
+
+            # Resources which are also in primary data must not be included
+            included_file.seek(0)
+            has_included = False
+            for key, size in included_index:
+                encoded = included_file.read(size)
+                if key in data_keys:
+                    continue
+
+                buffer += b',' if has_included else b',"included":['
+                buffer += encoded
+                has_included = True
+
+                if len(buffer) >= self.stream_chunk_size:
+                    yield bytes(buffer)
+                    buffer.clear()
+
+            if has_included:
+                buffer += b']'
+            buffer += b'}'
+            yield bytes(buffer)
+
+    def build_stream_resource_obj(self, serializer, instance, resource_name, included_resources):
+        """ Returns (resource object, included cache) of a single instance when streaming
+
+        Included cache is the same {type: {id: resource object}} dict that JSONAPIRenderer uses.
+        """
+
+        resource_serializer = serializer.child
+        if isinstance(resource_serializer, PolymorphicModelSerializer):
+            resource_serializer = resource_serializer.get_polymorphic_serializer_for_instance(instance)(
+                context=resource_serializer.context,
+            )
+
+        resource = serializer.child.to_representation(instance)
+        fields = utils.get_serializer_fields(resource_serializer)
+        force_type_resolution = getattr(resource_serializer, '_poly_force_type_resolution', False)
+
+        resource_obj = self.build_json_resource_obj(fields, resource, instance, resource_name, force_type_resolution)
+        meta = self.extract_meta(serializer, resource)
+        if meta:
+            resource_obj['meta'] = utils._format_object(meta)  # pylint: disable=protected-access
+
+        included_cache = defaultdict(dict)
+        self.extract_included(fields, resource, instance, included_resources, included_cache)
+
+        return resource_obj, included_cache
+
 
-class PureJSONRenderer(DRFJSONRenderer):
+class PureJSONRenderer(BaseJSONRenderer):
     media_type = 'application/json'
     format = 'pure-json'
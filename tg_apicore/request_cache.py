@@ -0,0 +1,87 @@
+# Attribute of Django's HttpRequest where the cache is stored
+REQUEST_ATTRIBUTE = '_tg_apicore_cache'
+
+
+class RequestCache:
+    """ Request-scoped cache for relationship and permission lookups
+
+    Values are grouped into namespaces (e.g. `('company_roles', user.pk)`), each of them mapping keys to values.
+    A namespace can be prefetched in a single batch (see `prefetch()`), after which it's complete - keys missing from
+    it resolve to the default value without being computed.
+
+    Use `get_request_cache()` to get the cache of a request - it's available to viewsets and, via
+    `context['request']`, to serializers. The cache is cleared when the response is closed (see
+    `DetailSerializerViewSet.finalize_response()`).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._values = {}  # type: dict
+        self._defaults = {}  # type: dict
+
+    def get_or_compute(self, namespace, key, compute):
+        """ Returns value of the key in the namespace, calling compute() to compute (and store) it if it's missing
+        """
+
+        values = self._values.setdefault(namespace, {})
+        if key in values:
+            return values[key]
+
+        if namespace in self._defaults:
+            return self._defaults[namespace]
+
+        value = values[key] = compute()
+        return value
+
+    def set(self, namespace, key, value):
+        self._values.setdefault(namespace, {})[key] = value
+
+    def prefetch(self, namespace, values: dict, default=None):
+        """ Stores all the values of the namespace at once and marks it complete
+
+        Keys missing from the values resolve to default.
+        """
+
+        self._values[namespace] = dict(values)
+        self._defaults[namespace] = default
+
+    def is_complete(self, namespace) -> bool:
+        return namespace in self._defaults
+
+    def get_values(self, namespace) -> dict:
+        """ Returns {key: value} dict of the values stored in the namespace (all of them if it's complete)
+        """
+
+        return dict(self._values.get(namespace, {}))
+
+    def invalidate(self, namespace):
+        """ Drops the namespace, e.g. after a write which changes the values.
+        """
+
+        self._values.pop(namespace, None)
+        self._defaults.pop(namespace, None)
+
+    def clear(self):
+        self._values.clear()
+        self._defaults.clear()
+
+    def close(self):
+        """ Called by Django when the response is closed (see HttpResponse._closable_objects)
+        """
+
+        self.clear()
+
+
+def get_request_cache(request) -> RequestCache:
+    """ Returns RequestCache of the given request (either DRF's Request or Django's HttpRequest)
+    """
+
+    # DRF's Request wraps Django's HttpRequest, the cache is stored on the latter so that both share it
+    request = getattr(request, '_request', request)
+
+    cache = getattr(request, REQUEST_ATTRIBUTE, None)
+    if cache is None:
+        cache = RequestCache()
+        setattr(request, REQUEST_ATTRIBUTE, cache)
+
+    return cache
@@ -0,0 +1,88 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.utils import encoders
+
+
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+
+def get_response_cache():
+    """ Returns Django cache used for caching responses, or None if response caching is disabled
+
+    The cache is selected via TG_APICORE_RESPONSE_CACHE setting (alias of the cache in CACHES). Response caching is
+    disabled by default.
+    """
+
+    alias = getattr(settings, 'TG_APICORE_RESPONSE_CACHE', None)
+    if alias is None:
+        return None
+
+    return caches[alias]
+
+
+def get_response_cache_timeout():
+    return getattr(settings, 'TG_APICORE_RESPONSE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_fragment_cache():
+    """ Returns Django cache used for caching rendered resource objects, or None if fragment caching is disabled
+
+    The cache is selected via TG_APICORE_FRAGMENT_CACHE setting (alias of the cache in CACHES). Fragment caching is
+    disabled by default.
+    """
+
+    alias = getattr(settings, 'TG_APICORE_FRAGMENT_CACHE', None)
+    if alias is None:
+        return None
+
+    return caches[alias]
+
+
+def get_fragment_cache_timeout():
+    return getattr(settings, 'TG_APICORE_FRAGMENT_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_fragment_cache_key(resource, *parts):
+    """ Returns cache key of a single rendered resource object
+
+    resource is the serializer's representation of the object. The key is based on all of its values (so changes of
+    attributes which come from related objects are taken into account as well), plus the given extra parts (e.g. type,
+    id, version).
+    """
+
+    key_data = [parts, resource]
+    digest = hashlib.sha1(json.dumps(key_data, cls=encoders.JSONEncoder, sort_keys=True).encode()).hexdigest()
+    return 'tg_apicore:fragment:%s' % digest
+
+
+def get_response_serializer_class(response_data):
+    """ Returns class of the serializer which produced the response data (possibly paginated), or None if unknown
+    """
+
+    if isinstance(response_data, dict) and 'results' in response_data:
+        response_data = response_data['results']
+
+    serializer = getattr(response_data, 'serializer', None)
+    serializer = getattr(serializer, 'child', serializer)
+    return type(serializer) if serializer is not None else None
+
+
+def get_document_cache_key(document, prefix, *parts):
+    """ Returns cache key of (latest-version) JSON API document, or None if the document cannot be cached
+
+    The key is a hash of the whole document (primary data, included resources, links and meta) and the given extra
+    parts (e.g. version), so any change of the data changes the key - including attributes which come from related
+    objects and thus don't change the objects' `updated` values. Documents without primary data (e.g. errors) cannot
+    be cached.
+    """
+
+    if not isinstance(document, dict) or 'data' not in document:
+        return None
+
+    key_data = [parts, document]
+    digest = hashlib.sha1(json.dumps(key_data, cls=encoders.JSONEncoder, sort_keys=True).encode()).hexdigest()
+    return '%s:%s' % (prefix, digest)
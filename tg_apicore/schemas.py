@@ -1,17 +1,28 @@
+import hashlib
 import logging
 from collections import defaultdict
 
+from django.utils import translation
+
 import attr
 from rest_framework import serializers
 from rest_framework.relations import ManyRelatedField
 from rest_framework.schemas import SchemaGenerator
 from rest_framework.utils.formatting import dedent
 
+from tg_apicore.cache import LRUCache
 from tg_apicore.docs import APIDocs, FieldDocs, MethodDocs, SectionDocs
+from tg_apicore.openapi import generate_openapi_schema
+from tg_apicore.settings import get_latest_version
+from tg_apicore.viewsets import DetailSerializerViewSet
 
 
 logger = logging.getLogger(__name__)
 
+# Generated docs, keyed by (version, site_url, base_path, urlpatterns fingerprint, ...).
+# See APIDocumentationView.get_docs()
+DOCS_CACHE = LRUCache(maxsize=16)
+
 
 class ApiDocsGenerator(SchemaGenerator):
     """ Schema generator used for api docs
@@ -28,8 +39,17 @@ class ApiDocsGenerator(SchemaGenerator):
         self.site_url = site_url
         self.base_path = base_path
 
-    def get_schema(self, request=None, public=False):
-        raise NotImplementedError("Use ApiDocsGenerator.get_docs() instead")
+    def get_schema(self, request=None, public=False, version=None):
+        """ Returns OpenAPI 3 document (as dict), generated from the docs
+
+        See also get_docs().
+        """
+
+        docs = self.get_docs()
+        if docs is None:
+            return None
+
+        return generate_openapi_schema(docs, version or get_latest_version())
 
     def get_docs(self):
         if self.endpoints is None:
@@ -87,16 +107,17 @@ class ApiDocsGenerator(SchemaGenerator):
                 section_doc = getattr(view_cls, 'api_core_docs', None)
                 if section_doc is None:
                     section_doc = SectionDocs()
-                else:
-                    # Ensure that we don't change the original
-                    section_doc = attr.evolve(section_doc)
+                # Templates are compiled once per (original) docs object, thus they're taken before copying it
+                data_template = section_doc.data_template
+                # Ensure that we don't change the original
+                section_doc = attr.evolve(section_doc)
 
                 section_doc.fields = self.get_generic_serializer_fields(view)
                 if not section_doc.docstring:
                     section_doc.docstring = view_cls.__doc__ or ''
                 section_doc.docstring = dedent(section_doc.docstring)
                 section_doc.docstring = self.replace_variables(section_doc.docstring)
-                section_doc.data = self.replace_variables(section_doc.data)
+                section_doc.data = self.apply_variables_template(data_template)
                 if not section_doc.name:
                     section_doc.name = section_name
 
@@ -114,13 +135,15 @@ class ApiDocsGenerator(SchemaGenerator):
             if method_doc is None:
                 method_doc = MethodDocs(action=action)
 
+            # Templates are compiled once per (original) docs object, thus they're taken before copying it
+            request_data_template, responses_template = method_doc.request_data_template, method_doc.responses_template
             method_doc = attr.evolve(method_doc, path=subpath, method=method)
             if not method_doc.docstring:
                 method_doc.docstring = view_doc
             method_doc.docstring = dedent(method_doc.docstring)
             method_doc.docstring = self.replace_variables(method_doc.docstring)
-            method_doc.request_data = self.replace_variables(method_doc.request_data)
-            method_doc.responses = self.replace_variables(method_doc.responses)
+            method_doc.request_data = self.apply_variables_template(request_data_template)
+            method_doc.responses = self.apply_variables_template(responses_template)
 
             section_methods[section_name].append(method_doc)
 
@@ -130,13 +153,30 @@ class ApiDocsGenerator(SchemaGenerator):
 
         return list(sections.values())
 
+    def get_serializer_class(self, view):
+        """ Returns serializer class used for the docs of the view
+
+        Returns None if the view provides only serializer instance via custom get_docs_serializer(), or if it doesn't
+        have a serializer at all.
+        """
+
+        get_docs_serializer = getattr(view.__class__, 'get_docs_serializer', None)
+        if get_docs_serializer is not None and get_docs_serializer is not DetailSerializerViewSet.get_docs_serializer:
+            return None
+
+        method = getattr(view, 'get_docs_serializer_class', None)
+        if method is not None:
+            return method()
+
+        return getattr(view, 'serializer_docs_class', None) or \
+            getattr(view, 'serializer_detail_class', None) or getattr(view, 'serializer_class', None)
+
     def get_serializer(self, view):
         method = getattr(view, 'get_docs_serializer', None)
         if method is not None:
             return view.get_docs_serializer()
 
-        serializer_class = getattr(view, 'serializer_docs_class', None) or \
-            getattr(view, 'serializer_detail_class', None) or getattr(view, 'serializer_class', None)
+        serializer_class = self.get_serializer_class(view)
         if serializer_class is None:
             return None
 
@@ -146,49 +186,101 @@ class ApiDocsGenerator(SchemaGenerator):
         """
         Return a list of `FieldDocs` instances corresponding to any
         request body input, as determined by the serializer class.
+
+        The results are cached per serializer class, see get_serializer_fields_docs().
         """
 
+        serializer_class = self.get_serializer_class(view)
+        if serializer_class is not None:
+            return get_serializer_fields_docs(serializer_class, context=view.get_serializer_context())
+
         serializer = self.get_serializer(view)
         if serializer is None:
             return None
-        if isinstance(serializer, serializers.ListSerializer):
-            # TODO?
-            return None
 
-        if not isinstance(serializer, serializers.Serializer):
-            return []
+        return serializer_fields_docs(serializer)
 
-        create_only_fields = getattr(serializer.Meta, 'create_only_fields', [])
-        fields = []
-        for field in serializer.fields.values():
-            if field.field_name in {'id', 'url'}:
-                continue
+    def replace_variables(self, data, **extra_substitutions):
+        return replace_variables(data, self.site_url, self.base_path, **extra_substitutions)
 
-            # str cast resolves lazy translations
-            description = '. '.join([str(x) for x in filter(None, (field.label, field.help_text))])
-            is_required = field.required and not isinstance(field, ManyRelatedField)
-            is_create_only = field.field_name in create_only_fields
-            fields.append(FieldDocs(
-                name=field.field_name, description=description,
-                is_required=is_required, is_read_only=field.read_only, is_create_only=is_create_only,
-            ))
+    def apply_variables_template(self, template, **extra_substitutions):
+        """ Applies substitutions to VariablesTemplate (compiled docs data, see SectionDocs.data_template etc)
+        """
 
-        return fields
+        return template.apply(get_variables_substitutions(self.site_url, self.base_path, **extra_substitutions))
 
-    def replace_variables(self, data, **extra_substitutions):
-        return replace_variables(data, self.site_url, self.base_path, **extra_substitutions)
 
+# Lists of FieldDocs, keyed by (serializer class, create-only fields, language). See get_serializer_fields_docs()
+SERIALIZER_FIELDS_CACHE = LRUCache(maxsize=1024)
 
-def replace_variables(data, site_url, base_path, **extra_substitutions):
+
+def get_serializer_fields_docs(serializer_class, context=None):
+    """ Returns list of FieldDocs for the given serializer class (or None if the fields cannot be introspected)
+
+    Results are cached per serializer class, so the serializer is instantiated only once. The context is used only
+    when the serializer has to be instantiated, thus the fields must not depend on it.
+    """
+
+    create_only_fields = tuple(getattr(getattr(serializer_class, 'Meta', None), 'create_only_fields', []))
+    # Descriptions are translated, so the language is included as well
+    key = (serializer_class, create_only_fields, translation.get_language())
+
+    fields = SERIALIZER_FIELDS_CACHE.get_or_set(key, lambda: serializer_fields_docs(
+        serializer_class(context=context or {}),
+    ))
+    # Return a copy so that the cached list cannot be modified
+    return list(fields) if fields is not None else None
+
+
+def serializer_fields_docs(serializer):
+    """ Returns list of FieldDocs for the given serializer instance (or None if the fields cannot be introspected)
+    """
+
+    if isinstance(serializer, serializers.ListSerializer):
+        # TODO?
+        return None
+
+    if not isinstance(serializer, serializers.Serializer):
+        return []
+
+    create_only_fields = getattr(getattr(serializer, 'Meta', None), 'create_only_fields', [])
+    fields = []
+    for field in serializer.fields.values():
+        if field.field_name in {'id', 'url'}:
+            continue
+
+        # str cast resolves lazy translations
+        description = '. '.join([str(x) for x in filter(None, (field.label, field.help_text))])
+        is_required = field.required and not isinstance(field, ManyRelatedField)
+        is_create_only = field.field_name in create_only_fields
+        fields.append(FieldDocs(
+            name=field.field_name, description=description,
+            is_required=is_required, is_read_only=field.read_only, is_create_only=is_create_only,
+        ))
+
+    return fields
+
+
+def get_variables_substitutions(site_url, base_path, **extra_substitutions) -> dict:
     substitutions = {
         'SITE_URL': site_url.rstrip('/'),
         'API_ROOT': (site_url + base_path).rstrip('/'),
     }
     substitutions.update(extra_substitutions)
-    return replace_variables_inner(data, substitutions)
+    return substitutions
+
+
+def replace_variables(data, site_url, base_path, **extra_substitutions):
+    return replace_variables_inner(data, get_variables_substitutions(site_url, base_path, **extra_substitutions))
 
 
 def replace_variables_inner(data, substitutions):
+    """ Replaces %(NAME)s placeholders in the data, which can be arbitrary (possibly mutable) data structure
+
+    The result is always a fresh copy of the data, so it can be modified freely. Use VariablesTemplate for data that
+    doesn't change and whose results are only read (e.g. docs data).
+    """
+
     if isinstance(data, str):
         return data % substitutions
     elif isinstance(data, (list, tuple)):
@@ -205,3 +297,49 @@ def generate_api_docs(title, description, site_url, base_path, patterns) -> APID
         site_url=site_url, base_path=base_path, patterns=patterns,
     )
     return generator.get_docs()
+
+
+def get_api_docs_cache_key(title, description, site_url, base_path, patterns, version=None) -> tuple:
+    # Docs contain translated strings (e.g. field descriptions), so the language is included as well
+    return (
+        version, translation.get_language(), site_url, base_path, get_urlpatterns_fingerprint(patterns),
+        title, description,
+    )
+
+
+def get_urlpatterns_fingerprint(patterns) -> str:
+    """ Returns fingerprint of the given urlpatterns, including the views and their docs
+
+    This is much cheaper than generating the docs - it only walks the urlpatterns and doesn't instantiate any views
+    or serializers.
+    """
+
+    hasher = hashlib.sha1()
+    _update_urlpatterns_fingerprint(hasher, patterns)
+    return hasher.hexdigest()
+
+
+def _update_urlpatterns_fingerprint(hasher, patterns):
+    for pattern in patterns:
+        # Django 2.0+ has pattern.pattern, older versions only have the regex
+        regex = getattr(pattern, 'pattern', None) or pattern.regex.pattern
+        hasher.update(str(regex).encode())
+
+        sub_patterns = getattr(pattern, 'url_patterns', None)
+        if sub_patterns is not None:
+            hasher.update(b'(')
+            _update_urlpatterns_fingerprint(hasher, sub_patterns)
+            hasher.update(b')')
+            continue
+
+        callback = pattern.callback
+        view_cls = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+        if view_cls is None:
+            hasher.update(repr(callback).encode())
+            continue
+
+        # id() changes when the view class is re-created (e.g. module is reloaded), repr of the docs object catches
+        #  in-place modifications of the docs.
+        hasher.update(('%s.%s:%d' % (view_cls.__module__, view_cls.__qualname__, id(view_cls))).encode())
+        hasher.update(repr(getattr(callback, 'actions', None)).encode())
+        hasher.update(repr(getattr(view_cls, 'api_core_docs', None)).encode())
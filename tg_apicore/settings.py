@@ -35,6 +35,18 @@ DEFAULTS = {
     },
 
     'JSON_API_FORMAT_TYPES': 'underscore',
+
+    # Size of the rendered markdown cache, see tg_apicore.templatetags.tg_apicore.MARKDOWN_CACHE
+    'TG_APICORE_MARKDOWN_CACHE_SIZE': 512,
+    # Size of the syntax highlighting cache, see tg_apicore.highlighting.HIGHLIGHT_CACHE
+    'TG_APICORE_HIGHLIGHT_CACHE_SIZE': 1024,
+
+    # See tg_apicore.encoders.get_json_backend()
+    'TG_APICORE_JSON_BACKEND': 'json',
+
+    # See tg_apicore.response_cache.get_response_cache() and get_fragment_cache()
+    'TG_APICORE_RESPONSE_CACHE': None,
+    'TG_APICORE_FRAGMENT_CACHE': None,
 }
 
 INVALID_DRF_CONFIG_MSG = """You must define %(name)s setting in REST_FRAMEWORK settings!
@@ -99,5 +111,12 @@ def verify_settings():
         settings.API_VERSION_LATEST = get_latest_version()
 
 
+def get_setting(name):
+    """ Returns value of the given tg_apicore setting, falling back to its default value from DEFAULTS
+    """
+
+    return getattr(settings, name, DEFAULTS[name])
+
+
 def get_latest_version() -> str:
     return getattr(settings, 'API_VERSION_LATEST', None) or api_settings.ALLOWED_VERSIONS[-1]
@@ -1,13 +1,40 @@
+import hashlib
+import threading
+
 from django import template
 from django.utils.safestring import mark_safe
 
 import markdown
-from rest_framework.templatetags.rest_framework import highlight_code
+from rest_framework.templatetags.rest_framework import CodeNode as DRFCodeNode
+
+from tg_apicore.cache import LRUCache
+from tg_apicore.highlighting import highlight
+from tg_apicore.settings import get_setting
 
 
 register = template.Library()
 
-register.tag('code', highlight_code)
+# Rendered markdown, as (html, toc) tuples keyed by hash of the markdown text
+MARKDOWN_CACHE = LRUCache(maxsize=get_setting('TG_APICORE_MARKDOWN_CACHE_SIZE'))
+
+# Markdown instances are reused (they're quite expensive to create) but they aren't thread-safe, thus one per thread.
+_markdown_renderers = threading.local()
+
+
+class CodeNode(DRFCodeNode):
+    """ DRF's code node that uses cached highlighting """
+
+    def render(self, context):
+        text = self.nodelist.render(context)
+        return highlight(text, self.lang, self.style)
+
+
+@register.tag('code')
+def highlight_code(parser, token):
+    code = token.split_contents()[-1]
+    nodelist = parser.parse(('endcode',))
+    parser.delete_first_token()
+    return CodeNode(code, nodelist)
 
 
 def get_markdown_renderer():
@@ -27,14 +54,33 @@ def get_markdown_renderer():
     )
 
 
+def render_markdown_with_toc(markdown_text) -> tuple:
+    """ Renders the given markdown text, returning (html, toc) tuple
+
+    Both the html and toc are produced by a single conversion, and the results are cached (see MARKDOWN_CACHE).
+    """
+
+    key = hashlib.sha1(markdown_text.encode()).hexdigest()
+    result = MARKDOWN_CACHE.get(key)
+    if result is None:
+        md = getattr(_markdown_renderers, 'md', None)
+        if md is None:
+            md = _markdown_renderers.md = get_markdown_renderer()
+        else:
+            md.reset()
+
+        html = md.convert(markdown_text)
+        result = (mark_safe(html), mark_safe(md.toc))
+        MARKDOWN_CACHE.set(key, result)
+
+    return result
+
+
 @register.simple_tag
 def render_markdown(markdown_text):
-    html = get_markdown_renderer().convert(markdown_text)
-    return mark_safe(html)
+    return render_markdown_with_toc(markdown_text)[0]
 
 
 @register.simple_tag
 def render_markdown_toc(markdown_text):
-    md = get_markdown_renderer()
-    md.convert(markdown_text)
-    return mark_safe(md.toc)
+    return render_markdown_with_toc(markdown_text)[1]
@@ -1,9 +1,170 @@
+import bisect
 import logging
+from copy import deepcopy
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import autodiscover_modules
+
+import attr
 
 
 logger = logging.getLogger(__name__)
 
 
+class CopyOnWriteDict(dict):
+    """ Copy-on-write view of a dict
+
+    The view is a dict itself - a shallow copy of the original dict - so it can be used everywhere a dict can (e.g.
+    copied, checked with isinstance() or encoded as JSON). Note that this means creating a view always copies the
+    dict (shallowly), even if nothing is modified later: copying can't be deferred to the first write, since C code
+    (e.g. json encoders or `dict(view)`) reads the dict's own storage directly. Nested dicts are wrapped into views
+    lazily, when they're accessed, so nested dicts which aren't touched are never copied and changes never leak into
+    the original. Use `to_dict()` to get the resulting dict - this is the original dict itself if nothing was
+    modified, and unmodified nested dicts are shared with the original as well.
+
+    Note that lists are not wrapped - they should be replaced, not modified in place.
+    """
+
+    __slots__ = ('_original', '_parent', '_modified')
+
+    def __init__(self, data, parent=None) -> None:
+        super().__init__(data)
+        self._original = data
+        self._parent = parent
+        self._modified = False
+
+    @property
+    def modified(self) -> bool:
+        return self._modified
+
+    def _set_modified(self):
+        view = self
+        while view is not None and not view._modified:  # pylint: disable=protected-access
+            view._modified = True  # pylint: disable=protected-access
+            view = view._parent  # pylint: disable=protected-access
+
+    def _wrap(self, key, value):
+        if isinstance(value, dict) and not isinstance(value, CopyOnWriteDict):
+            value = CopyOnWriteDict(value, self)
+            dict.__setitem__(self, key, value)
+
+        return value
+
+    def _wrap_all(self):
+        for key, value in list(dict.items(self)):
+            self._wrap(key, value)
+
+    def __getitem__(self, key):
+        return self._wrap(key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        self._wrap_all()
+        return dict.items(self)
+
+    def values(self):
+        self._wrap_all()
+        return dict.values(self)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._set_modified()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._set_modified()
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+
+        # Nested dicts are returned as views, so they can be modified and re-added
+        value = self[key]
+        dict.__delitem__(self, key)
+        self._set_modified()
+        return value
+
+    def popitem(self):
+        self._wrap_all()
+        item = dict.popitem(self)
+        self._set_modified()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        dict.update(self, *args, **kwargs)
+        self._set_modified()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        dict.clear(self)
+        self._set_modified()
+
+    def copy(self) -> dict:
+        """ Returns (shallow) copy of the view as a regular dict, nested dicts are views as well
+        """
+
+        self._wrap_all()
+        return dict(self)
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return deepcopy(self.copy(), memo)
+
+    def __reduce__(self):
+        return dict, (self.copy(),)
+
+    def __repr__(self):
+        return 'CopyOnWriteDict(%s)' % dict.__repr__(self)
+
+    def to_dict(self):
+        if not self._modified:
+            return self._original
+
+        return {
+            key: value.to_dict() if isinstance(value, CopyOnWriteDict) else value
+            for key, value in dict.items(self)
+        }
+
+
+def _convert_attributes(data, convert):
+    """ Calls convert(type, id, attributes) with copy-on-write view of the resource object's attributes
+
+    Returns the original resource object if the attributes weren't modified, otherwise a (shallow) copy of it with the
+    new attributes.
+    """
+
+    attributes = data['attributes']
+    fields = CopyOnWriteDict(attributes)
+    res = convert(data['type'], data.get('id'), fields)
+    if res is None:
+        res = fields
+
+    if isinstance(res, CopyOnWriteDict):
+        res = res.to_dict()
+    elif isinstance(res, dict):
+        # New dict might contain views of the nested dicts
+        for key, value in res.items():
+            if isinstance(value, CopyOnWriteDict):
+                res[key] = value.to_dict()
+    if res is attributes:
+        return data
+
+    data = data.copy()
+    data['attributes'] = res
+    return data
+
+
 class VersionTransformer:
     """ Base class for transforming API requests/responses between versions
 
@@ -17,21 +178,72 @@ class VersionTransformer:
 
     Inspired by https://github.com/mrhwick/django-rest-framework-version-transforms and
     https://stripe.com/blog/api-versioning
+
+    Transformers which only need to convert single resource objects in responses should implement
+    `convert_output_object()` (and optionally set `output_types`) instead of overriding `output_backwards()`. This way
+    TransformerPipeline can apply multiple transformers in a single pass over the response. The same goes for
+    `convert_input_object()` / `input_types` and `input_forwards()`.
+
+    `convert_output_object()` and `convert_input_object()` get a copy-on-write view of the attributes (see
+    CopyOnWriteDict), so the original data is never modified - the results contain copies of resource objects and
+    dicts which are changed and share the rest with the original. This makes it safe to transform data that's also
+    cached elsewhere.
     """
 
+    # Resource types handled by convert_output_object() / convert_input_object(), None means all types
+    output_types = None
+    input_types = None
+
     @classmethod
     def is_applicable(cls, model, action) -> bool:
         return True
 
+    @classmethod
+    def converts_output_objects(cls) -> bool:
+        """ Returns True if the transformer converts output per resource object (see convert_output_object())
+        """
+
+        return cls.convert_output_object is not VersionTransformer.convert_output_object or \
+            cls.convert_output_object_container is not VersionTransformer.convert_output_object_container
+
+    @classmethod
+    def converts_input_objects(cls) -> bool:
+        """ Returns True if the transformer converts input per resource object (see convert_input_object())
+        """
+
+        return cls.convert_input_object is not VersionTransformer.convert_input_object or \
+            cls.convert_input_object_container is not VersionTransformer.convert_input_object_container
+
+    @classmethod
+    def handles_output_type(cls, obj_type) -> bool:
+        return cls.output_types is None or obj_type in cls.output_types
+
+    @classmethod
+    def handles_input_type(cls, obj_type) -> bool:
+        return cls.input_types is None or obj_type in cls.input_types
+
+    @classmethod
+    def prepare(cls):
+        """ Called once for every registered transformer class when the transformer registry is frozen
+
+        Can be used to validate / precompute things, should raise ImproperlyConfigured if something is wrong.
+        """
+
     def __init__(self, model, action) -> None:
         super().__init__()
         self.model = model
         self.action = action
 
     def input_forwards(self, data):
+        if self.converts_input_objects():
+            return self.convert_all_input_objects(data)
+
         return data
 
     def output_backwards(self, data):
+        if self.converts_output_objects():
+            return self.convert_all_output_objects(data)
+
         return data
 
     def convert_output_object(self, obj_type, obj_id, fields):
@@ -40,16 +252,13 @@ class VersionTransformer:
     def convert_output_object_container(self, data):
         if 'type' not in data or 'id' not in data or 'attributes' not in data:
             return data
-        res = self.convert_output_object(data['type'], data['id'], data['attributes'])
-
-        if res is None:
+        if not self.handles_output_type(data['type']):
             return data
-
-        data['attributes'] = res
-        return data
+        return _convert_attributes(data, self.convert_output_object)
 
     def convert_all_output_objects(self, response):
         data = response.get('data')
+        response = response.copy()
 
         if isinstance(data, dict):
             response['data'] = self.convert_output_object_container(data)
@@ -63,19 +272,503 @@ class VersionTransformer:
 
         return response
 
+    def convert_input_object(self, obj_type, obj_id, fields):
+        raise NotImplementedError()
+
+    def convert_input_object_container(self, data):
+        # Id is missing when creating objects
+        if 'type' not in data or 'attributes' not in data:
+            return data
+        if not self.handles_input_type(data['type']):
+            return data
+        return _convert_attributes(data, self.convert_input_object)
+
+    def convert_all_input_objects(self, request_data):
+        if not isinstance(request_data, dict):
+            return request_data
+
+        data = request_data.get('data')
+        request_data = request_data.copy()
+
+        if isinstance(data, dict):
+            request_data['data'] = self.convert_input_object_container(data)
+        elif isinstance(data, (list, tuple)):
+            request_data['data'] = [self.convert_input_object_container(obj) for obj in data]
+
+        return request_data
+
+
+def _rename(fields, source, target):
+    if source in fields:
+        fields[target] = fields.pop(source)
+
+
+def _drop(fields, name):
+    fields.pop(name, None)
+
+
+def _default(fields, name, value):
+    if name not in fields:
+        fields[name] = value() if callable(value) else value
+
+
+def _map_value(fields, name, mapping):
+    if name in fields:
+        value = fields[name]
+        fields[name] = mapping(value) if callable(mapping) else mapping.get(value, value)
+
+
+def _is_mapping_or_callable(instance, attribute, value):
+    if not isinstance(value, dict) and not callable(value):
+        raise TypeError("'%s' must be a dict or callable, got %r" % (attribute.name, value))
+
+
+class TransformOperation:
+    """ Base class for operations of DeclarativeTransformer """
+
+    def compile(self) -> tuple:
+        """ Returns (function, args) tuple - the function is called as `function(fields, *args)`
+        """
+
+        raise NotImplementedError()
+
+    def apply_to_names(self, removed: set):
+        """ Updates set of removed attribute names, raising ValueError if the operation uses removed attribute
+        """
+
+        raise NotImplementedError()
+
+
+@attr.s(frozen=True, slots=True)
+class Rename(TransformOperation):
+    """ Renames attribute `source` to `target` """
+
+    source = attr.ib(validator=attr.validators.instance_of(str))
+    target = attr.ib(validator=attr.validators.instance_of(str))
+
+    def compile(self) -> tuple:
+        return _rename, (self.source, self.target)
+
+    def apply_to_names(self, removed: set):
+        if self.source in removed:
+            raise ValueError("'%s' was already removed by an earlier operation" % self.source)
+        removed.add(self.source)
+        removed.discard(self.target)
+
+
+@attr.s(frozen=True, slots=True)
+class Drop(TransformOperation):
+    """ Removes attribute `name` """
+
+    name = attr.ib(validator=attr.validators.instance_of(str))
+
+    def compile(self) -> tuple:
+        return _drop, (self.name,)
+
+    def apply_to_names(self, removed: set):
+        if self.name in removed:
+            raise ValueError("'%s' was already removed by an earlier operation" % self.name)
+        removed.add(self.name)
+
+
+@attr.s(frozen=True, slots=True)
+class Default(TransformOperation):
+    """ Adds attribute `name` with the given value if it's missing
+
+    If value is callable, it's called to get the value - use that for mutable values, which shouldn't be shared.
+    """
+
+    name = attr.ib(validator=attr.validators.instance_of(str))
+    value = attr.ib()
+
+    def compile(self) -> tuple:
+        return _default, (self.name, self.value)
+
+    def apply_to_names(self, removed: set):
+        removed.discard(self.name)
+
+
+@attr.s(frozen=True, slots=True)
+class MapValue(TransformOperation):
+    """ Maps value of attribute `name` - mapping is either a dict (values missing from it are kept) or a callable
+    """
+
+    name = attr.ib(validator=attr.validators.instance_of(str))
+    mapping = attr.ib(validator=_is_mapping_or_callable)
+
+    def compile(self) -> tuple:
+        return _map_value, (self.name, self.mapping)
+
+    def apply_to_names(self, removed: set):
+        if self.name in removed:
+            raise ValueError("'%s' was already removed by an earlier operation" % self.name)
+
 
-# TODO: move out of here
+def compile_transforms(transforms, name='transforms') -> dict:
+    """ Compiles {resource type: [TransformOperation]} dict into {resource type: ((function, args), ...)}
+
+    Raises ImproperlyConfigured if the transforms are invalid.
+    """
+
+    if not isinstance(transforms, dict):
+        raise ImproperlyConfigured("%s must be a dict of {resource type: list of operations}" % name)
+
+    compiled = {}
+    for obj_type, operations in transforms.items():
+        if not isinstance(obj_type, str):
+            raise ImproperlyConfigured("%s: resource type must be a string, got %r" % (name, obj_type))
+        if not isinstance(operations, (list, tuple)):
+            raise ImproperlyConfigured("%s['%s'] must be a list of operations" % (name, obj_type))
+
+        removed = set()
+        for operation in operations:
+            if not isinstance(operation, TransformOperation):
+                raise ImproperlyConfigured("%s['%s']: %r is not a TransformOperation" % (name, obj_type, operation))
+            try:
+                operation.apply_to_names(removed)
+            except ValueError as e:
+                raise ImproperlyConfigured("%s['%s']: %r is invalid: %s" % (name, obj_type, operation, e))
+
+        compiled[obj_type] = tuple(operation.compile() for operation in operations)
+
+    return compiled
+
+
+class DeclarativeTransformer(VersionTransformer):
+    """ Transformer which is defined by lists of simple operations per resource type, e.g:
+
+        @registry.register('2018-05-01')
+        class CompanyTitleTransformer(DeclarativeTransformer):
+            output_transforms = {
+                'company': [Rename('title', 'name'), Drop('country')],
+            }
+            input_transforms = {
+                'company': [Rename('name', 'title'), Default('country', 'EE')],
+            }
+
+    output_transforms convert response objects from the newer version to this one, input_transforms convert request
+    objects from this version to the newer one. Available operations are Rename, Drop, Default and MapValue.
+
+    The operations are validated and compiled when the transformer registry is frozen (or when the transformer is
+    first used). output_types / input_types are set automatically, so resource objects of other types are skipped.
+    """
+
+    output_transforms = {}
+    input_transforms = {}
+
+    @classmethod
+    def prepare(cls):
+        cls._compiled_output = compile_transforms(cls.output_transforms, '%s.output_transforms' % cls.__name__)
+        cls._compiled_input = compile_transforms(cls.input_transforms, '%s.input_transforms' % cls.__name__)
+        cls.output_types = frozenset(cls._compiled_output)
+        cls.input_types = frozenset(cls._compiled_input)
+
+    def __init__(self, model, action) -> None:
+        super().__init__(model, action)
+
+        if '_compiled_output' not in type(self).__dict__:
+            self.prepare()
+
+    def convert_output_object(self, obj_type, obj_id, fields):
+        for func, args in self._compiled_output.get(obj_type, ()):
+            func(fields, *args)
+        return fields
+
+    def convert_input_object(self, obj_type, obj_id, fields):
+        for func, args in self._compiled_input.get(obj_type, ()):
+            func(fields, *args)
+        return fields
+
+
+class ObjectsStage:
+    """ Stage of TransformerPipeline - transformers which are applied to each resource object in a single pass
+
+    Direction is either 'output' or 'input'.
+    """
+
+    def __init__(self, direction) -> None:
+        super().__init__()
+        self.direction = direction
+        self.transformers = []
+        self._type_transformers = {}
+        self._handles_type = 'handles_%s_type' % direction
+        self._convert_method = 'convert_%s_object_container' % direction
+
+    def get_type_transformers(self, obj_type) -> list:
+        """ Returns transformers which handle the given resource type
+        """
+
+        try:
+            return self._type_transformers[obj_type]
+        except KeyError:
+            transformers = [t for t in self.transformers if getattr(t, self._handles_type)(obj_type)]
+            self._type_transformers[obj_type] = transformers
+            return transformers
+
+    def convert_object(self, obj):
+        if not isinstance(obj, dict):
+            return obj
+
+        for transformer in self.get_type_transformers(obj.get('type')):
+            obj = getattr(transformer, self._convert_method)(obj)
+
+        return obj
+
+    def convert_document(self, document):
+        if not isinstance(document, dict):
+            return document
+
+        data = document.get('data')
+        document = document.copy()
+        if isinstance(data, dict):
+            document['data'] = self.convert_object(data)
+        elif isinstance(data, (list, tuple)):
+            document['data'] = [self.convert_object(obj) for obj in data]
+        else:
+            return document
+
+        if self.direction == 'output' and 'included' in document:
+            document['included'] = [self.convert_object(obj) for obj in document['included']]
+
+        return document
+
+
+class TransformerPipeline:
+    """ Applies conversions of multiple transformers to the response (or request) in as few passes as possible
+
+    Consecutive transformers which convert output per resource object (see `VersionTransformer.output_types` and
+    `convert_output_object()`) are fused - each resource object is visited once and converted by all of those
+    transformers which handle its type, in order. Transformers which override `output_backwards()` are applied to the
+    whole response, as usual, between the fused passes.
+
+    Input is handled the same way, using `convert_input_object()` and `input_forwards()`, with the transformers applied
+    in reverse order (from the oldest version to the newest one).
+
+    Transformers are expected in the order returned by `get_transformers()`, i.e. from the newest version to the
+    oldest one.
+    """
+
+    def __init__(self, transformers) -> None:
+        super().__init__()
+        self.transformers = list(transformers)
+
+        self.output_stages = self.build_stages(self.transformers, 'output')
+        self.input_stages = self.build_stages(reversed(self.transformers), 'input')
+
+    def __bool__(self):
+        return bool(self.output_stages or self.input_stages)
+
+    @staticmethod
+    def build_stages(transformers, direction) -> list:
+        """ Returns list of stages, each being either ObjectsStage or a single whole-document transformer
+        """
+
+        method_name = 'output_backwards' if direction == 'output' else 'input_forwards'
+        converts_objects = 'converts_%s_objects' % direction
+
+        stages = []
+        for transformer in transformers:
+            if getattr(type(transformer), method_name) is not getattr(VersionTransformer, method_name):
+                stages.append(transformer)
+            elif getattr(transformer, converts_objects)():
+                if not stages or not isinstance(stages[-1], ObjectsStage):
+                    stages.append(ObjectsStage(direction))
+                stages[-1].transformers.append(transformer)
+
+        return stages
+
+    def output_backwards(self, data):
+        for stage in self.output_stages:
+            if isinstance(stage, ObjectsStage):
+                data = stage.convert_document(data)
+            else:
+                data = stage.output_backwards(data)
+
+        return data
+
+    def input_forwards(self, data):
+        for stage in self.input_stages:
+            if isinstance(stage, ObjectsStage):
+                data = stage.convert_document(data)
+            else:
+                data = stage.input_forwards(data)
+
+        return data
+
+    def convert_output_object_container(self, data):
+        """ Converts a single resource object, e.g. when responses are rendered one object at a time
+
+        Whole-response transformers get a document containing only this object as its primary data.
+        """
+
+        for stage in self.output_stages:
+            if isinstance(stage, ObjectsStage):
+                data = stage.convert_object(data)
+            else:
+                data = stage.output_backwards({'data': data})['data']
+
+        return data
+
+
+class TransformerRegistry:
+    """ Registry of version transformers
+
+    Transformers are registered for the version where the change they handle was introduced, i.e. transformers of
+    version V are applied to requests of all versions older than V. Use `register()` as class decorator:
+
+        @registry.register('2018-05-01')
+        class RemoveFooTransformer(VersionTransformer):
+            ...
+
+    The registry is populated when Django starts (see `autodiscover()`) and frozen afterwards. Transformer chains are
+    resolved once per (request version, model, action) and memoized.
+
+    Transformers of the deprecated TRANSFORMS list are kept separately (see `set_legacy_transforms()`), so that they
+    can still be replaced after the registry has been frozen.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.frozen = False
+        # Sorted list of versions which have transformers, and {version: [transformer classes]}
+        self._versions = []
+        self._transformers = {}
+        self._legacy_transformers = {}
+        self._legacy_transforms = ()
+        self._chains = {}
+
+    def register(self, version, transformer_class=None):
+        """ Registers transformer class for the given version. Can also be used as class decorator.
+        """
+
+        if transformer_class is None:
+            def decorator(cls):
+                self.register(version, cls)
+                return cls
+
+            return decorator
+
+        if self.frozen:
+            raise RuntimeError(
+                "Cannot register %s: transformer registry is already frozen" % transformer_class.__name__,
+            )
+
+        if version not in self._transformers:
+            self._transformers[version] = []
+        self._transformers[version].append(transformer_class)
+        self._update_versions()
+
+        return transformer_class
+
+    def set_legacy_transforms(self, transforms):
+        """ Sets transformers of the deprecated TRANSFORMS list, i.e. (version, [transformer classes]) tuples
+
+        The list is synced once by `autodiscover()`. If TRANSFORMS is changed later, call this again (it can be called
+        with frozen registry as well - it's a no-op if the transforms haven't changed since the last call).
+        """
+
+        transforms = tuple((version, tuple(transformer_classes)) for version, transformer_classes in transforms)
+        if transforms == self._legacy_transforms:
+            return
+
+        legacy_transformers = {}
+        for version, transformer_classes in transforms:
+            legacy_transformers.setdefault(version, []).extend(transformer_classes)
+            if self.frozen:
+                for transformer_class in transformer_classes:
+                    transformer_class.prepare()
+
+        self._legacy_transforms = transforms
+        self._legacy_transformers = legacy_transformers
+        self._update_versions()
+
+    def _update_versions(self):
+        self._versions = sorted(set(self._transformers) | set(self._legacy_transformers))
+        self._chains.clear()
+
+    def get_version_transformer_classes(self, version) -> list:
+        """ Returns all transformer classes of the given version, registered ones first
+        """
+
+        return self._transformers.get(version, []) + self._legacy_transformers.get(version, [])
+
+    def freeze(self):
+        """ Prepares all registered transformer classes (see VersionTransformer.prepare()) and freezes the registry
+        """
+
+        for version in self._versions:
+            for transformer_class in self.get_version_transformer_classes(version):
+                transformer_class.prepare()
+
+        self.frozen = True
+
+    def get_transformer_classes(self, request_version, model, action) -> tuple:
+        """ Returns transformer classes applicable to the given request, from newest to oldest version
+        """
+
+        key = (request_version, model, action)
+        try:
+            return self._chains[key]
+        except KeyError:
+            pass
+
+        chain = []
+        for version in reversed(self._versions[bisect.bisect_right(self._versions, request_version):]):
+            chain.extend(t for t in self.get_version_transformer_classes(version) if t.is_applicable(model, action))
+
+        chain = self._chains[key] = tuple(chain)
+        return chain
+
+    def get_transformers(self, request_version, model, action) -> list:
+        return [t(model, action) for t in self.get_transformer_classes(request_version, model, action)]
+
+
+registry = TransformerRegistry()
+
+# Deprecated: list of (version, [transformer classes]) tuples, newest version first. Use registry.register() instead.
 TRANSFORMS = [
 ]
 
 
+def autodiscover():
+    """ Populates and freezes the transformer registry, called when Django starts
+
+    Imports `transformers` module of every installed app (so that they can register their transformers) and adds
+    transformers from the deprecated TRANSFORMS list. Later changes to TRANSFORMS must be applied explicitly, via
+    `registry.set_legacy_transforms(TRANSFORMS)`.
+    """
+
+    if registry.frozen:
+        return
+
+    autodiscover_modules('transformers')
+    registry.set_legacy_transforms(TRANSFORMS)
+    registry.freeze()
+
+
 def get_transformers(request_version, model, action):
-    transformers = []
-    for version, version_transformers in TRANSFORMS:
-        if version <= request_version:
-            break
-        for t in version_transformers:
-            if t.is_applicable(model, action):
-                transformers.append(t)
-
-    return [t(model, action) for t in transformers]
+    return registry.get_transformers(request_version, model, action)
+
+
+def get_request_transformers(request, view=None) -> list:
+    """ Returns version transformers of the request
+
+    The transformers are resolved once per request, based on request's version, view's model (from its `queryset`
+    attribute) and action, and stored as `request.version_transformers`. If that attribute has already been set, it's
+    returned as-is.
+    """
+
+    try:
+        return request.version_transformers
+    except AttributeError:
+        pass
+
+    version = getattr(request, 'version', None)
+    if version is None:
+        transformers = []
+    else:
+        model = getattr(getattr(view, 'queryset', None), 'model', None)
+        transformers = get_transformers(version, model, getattr(view, 'action', None))
+
+    request.version_transformers = transformers
+    return transformers
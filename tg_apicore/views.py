@@ -1,20 +1,46 @@
+import hashlib
+import json
+
 from django.conf.urls import url
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
 from django.views.generic.base import TemplateView
 
-from rest_framework.compat import pygments_css
 from rest_framework.exceptions import NotFound
+from rest_framework.utils import encoders
 from rest_framework.views import APIView
 
-from tg_apicore.schemas import generate_api_docs
+from tg_apicore.cache import LRUCache
+from tg_apicore.compression import compress_variants, get_precompressed_response
+from tg_apicore.docs import docs_fingerprint
+from tg_apicore.highlighting import highlight_css
+from tg_apicore.openapi import generate_openapi_schema
+from tg_apicore.schemas import DOCS_CACHE, generate_api_docs, get_api_docs_cache_key
+from tg_apicore.settings import get_latest_version
+
+
+# Rendered docs sections, as (etag, variants) tuples. See APIDocumentationView.get_section_fragment()
+SECTION_FRAGMENTS_CACHE = LRUCache(maxsize=256)
+
+# OpenAPI schemas, as (etag, variants) tuples. See APIDocumentationView.get_openapi_payload()
+OPENAPI_CACHE = LRUCache(maxsize=16)
 
 
 class APIDocumentationView(TemplateView):
     """ API documentation view
 
     Subclass it, set title and description attributes and implement the three get_*() methods.
+
+    The view can also serve single sections of the docs as html fragments (when `section` url kwarg is given), and
+    OpenAPI schema of the API (when `openapi` url kwarg is True), see docs_urlpatterns().
+    When lazy_sections is True, the main page includes only the sidebar and intro, and sections are loaded on demand
+    from the fragment urls.
     """
 
     template_name = 'tg_apicore/docs/index.html'
+    lazy_template_name = 'tg_apicore/docs/index-lazy.html'
+    section_template_name = 'tg_apicore/docs/section-full.html'
     # Pygments code style to use. Go to http://pygments.org/demo/ , select an example an
     #  you'll have a dropdown of style options on the right.
     code_style = 'emacs'
@@ -22,26 +48,154 @@ class APIDocumentationView(TemplateView):
     title = "API"
     description = ""
 
+    # API version that the docs are generated for, defaults to the latest version
+    api_version = None
+
+    # Generated docs are cached per process, see get_docs(). Set to False to regenerate them on each request.
+    cache_docs = True
+
+    # If True, sections are loaded on demand instead of rendering everything into the main page
+    lazy_sections = False
+
+    @classmethod
+    def docs_urlpatterns(cls, name='api-docs'):
+        """ Returns urlpatterns for the docs page and its section fragments
+
+        e.g. `url(r'^api-docs/', include(MyAPIDocumentationView.docs_urlpatterns()))`
+        """
+
+        return [
+            url(r'^$', cls.as_view(), name=name),
+            url(r'^sections/(?P<section>[^/]+)/$', cls.as_view(), name='%s-section' % name),
+            url(r'^openapi\.json$', cls.as_view(), {'openapi': True}, name='%s-openapi' % name),
+        ]
+
+    def get(self, request, *args, **kwargs):
+        if 'section' in kwargs:
+            return self.get_section_response(kwargs['section'])
+        if kwargs.get('openapi'):
+            return self.get_openapi_response()
+
+        return super().get(request, *args, **kwargs)
+
+    def get_template_names(self):
+        if self.lazy_sections:
+            return [self.lazy_template_name]
+
+        return super().get_template_names()
+
     def generate_docs(self):
         return generate_api_docs(
             title=self.title, description=self.get_description(),
             site_url=self.get_site_url(), base_path=self.get_base_path(), patterns=self.urlpatterns(),
         )
 
+    def get_docs(self):
+        """ Returns APIDocs, using cached docs if possible
+
+        The cache key includes fingerprint of the urlpatterns, so the docs are regenerated when the urls or views'
+        docs change.
+        """
+
+        if not self.cache_docs:
+            return self.generate_docs()
+
+        return DOCS_CACHE.get_or_set(self.get_docs_cache_key(), self.generate_docs)
+
+    def get_docs_cache_key(self) -> tuple:
+        return get_api_docs_cache_key(
+            title=self.title, description=self.get_description(),
+            site_url=self.get_site_url(), base_path=self.get_base_path(), patterns=self.urlpatterns(),
+            version=self.get_api_version(),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        docs = self.generate_docs()
+        docs = self.get_docs()
         context.update({
             'api': docs,
-            'code_style': pygments_css(self.code_style),
+            'code_style': highlight_css(self.code_style),
         })
+        if self.lazy_sections:
+            context['sections_url'] = self.request.path.rstrip('/') + '/sections/'
 
         return context
 
+    def get_section_response(self, section_name):
+        """ Returns html fragment of a single section, with ETag
+
+        Responds with 304 (Not Modified) if the client already has the latest version of the section. Precompressed
+        variants are served to clients that accept them.
+        """
+
+        etag, variants = self.get_section_fragment(section_name)
+        response = get_precompressed_response(self.request, variants, etag=etag)
+
+        # Clients should always revalidate, this is cheap thanks to the ETag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_section_fragment(self, section_name) -> tuple:
+        """ Returns (etag, variants) tuple of the given section, variants being {encoding: html bytes} dict
+
+        Raises Http404 if the section doesn't exist.
+        """
+
+        if not self.cache_docs:
+            return self.render_section_fragment(self.get_docs(), section_name)
+
+        # Docs cache key changes whenever the docs change, so it's suitable for the fragments as well
+        key = (self.get_docs_cache_key(), section_name, self.section_template_name)
+        return SECTION_FRAGMENTS_CACHE.get_or_set(key, lambda: self.render_section_fragment(
+            self.get_docs(), section_name,
+        ))
+
+    def render_section_fragment(self, docs, section_name) -> tuple:
+        section = next((s for s in (docs.sections if docs else []) if s.name == section_name), None)
+        if section is None:
+            raise Http404("No such section: %s" % section_name)
+
+        etag = '"%s"' % docs_fingerprint(section, docs.site_url, docs.base_path, self.section_template_name)
+        html = render_to_string(self.section_template_name, {'api': docs, 'section': section}, request=self.request)
+        return etag, compress_variants(html.encode())
+
+    def get_openapi_response(self):
+        """ Returns OpenAPI schema of the API as json, with ETag
+
+        Precompressed variants (gzip, and brotli if available) are served to clients that accept them.
+        """
+
+        etag, variants = self.get_openapi_payload()
+        response = get_precompressed_response(self.request, variants, etag=etag, content_type='application/json')
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_openapi_payload(self) -> tuple:
+        """ Returns (etag, variants) tuple of the OpenAPI schema, variants being {encoding: json bytes} dict """
+
+        if not self.cache_docs:
+            return self.render_openapi_payload(self.get_docs())
+
+        return OPENAPI_CACHE.get_or_set(self.get_docs_cache_key(), lambda: self.render_openapi_payload(
+            self.get_docs(),
+        ))
+
+    def render_openapi_payload(self, docs) -> tuple:
+        if docs is None:
+            raise Http404("No API docs")
+
+        schema = generate_openapi_schema(docs, self.get_api_version())
+        content = json.dumps(schema, cls=encoders.JSONEncoder).encode()
+        etag = '"%s"' % hashlib.sha1(content).hexdigest()
+        return etag, compress_variants(content)
+
     def get_description(self) -> str:
         return self.description
 
+    def get_api_version(self) -> str:
+        return self.api_version or get_latest_version()
+
     def get_site_url(self) -> str:
         """ Should return your site's url without path, e.g. https://example.com/ """
         raise NotImplementedError()
@@ -1,7 +1,19 @@
+import django
 from django.db.models import QuerySet
+from django.http import HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
 
-from rest_framework.generics import GenericAPIView
+import inflection
+from rest_framework.generics import GenericAPIView, get_object_or_404
 from rest_framework.permissions import SAFE_METHODS
+from rest_framework_json_api import utils
+
+from tg_apicore.conditional import NotModified, evaluate_preconditions, get_http_timestamp, get_object_etag, \
+    has_preconditions
+from tg_apicore.query_planning import get_query_plan, get_related_objects, get_relation, get_serializer_columns, \
+    is_model_queryset
+from tg_apicore.renderers import JSONRenderer
+from tg_apicore.request_cache import get_request_cache
 
 
 class DetailSerializerViewSet(GenericAPIView):
@@ -14,6 +26,20 @@ class DetailSerializerViewSet(GenericAPIView):
 
     The detail / modify variants of queryset / serializer are optional and fall back to each other in
     modify -> detail -> list order.
+
+    Querysets are automatically extended with select_related() / prefetch_related() lookups needed by the serializer
+    of the endpoint (see `tg_apicore.query_planning`). Set `plan_queries = False` to disable this.
+    With `prune_columns = True`, list and detail querysets also load only the columns needed by the serializer.
+
+    Endpoint type, serializer class, queryset and the object are memoized for the lifetime of the request. Use
+    `invalidate_memoized()` if a write changes any of them (e.g. the object's serializer class depends on data that
+    was changed).
+
+    With `last_modified_field` set (e.g. `'updated'`), conditional requests are supported for single objects: responses
+    get ETag and Last-Modified headers, GET requests with matching If-None-Match / If-Modified-Since get 304 responses
+    and unsafe requests with failing If-Match / If-Unmodified-Since get 412 responses. The preconditions are checked
+    before the object is serialized. Related objects rendered by the serializer (relationships and included resources)
+    are part of the validators as well, see `get_object_validators()`.
     """
 
     ENDPOINT_TYPE_LIST = 1
@@ -25,6 +51,11 @@ class DetailSerializerViewSet(GenericAPIView):
     queryset_detail = None
     queryset_modify = None
 
+    plan_queries = True
+    prune_columns = False
+    last_modified_field = None
+    _planning_queries = False
+
     def get_endpoint_type(self):
         """ Selects endpoint type of the current request - this will be used to select serializer and queryset.
         """
@@ -39,11 +70,47 @@ class DetailSerializerViewSet(GenericAPIView):
 
         return self.ENDPOINT_TYPE_LIST
 
+    def get_memoized(self) -> dict:
+        """ Returns dict of values memoized for the current request.
+
+        The values are tied to the request object, since DRF's browsable API temporarily replaces `view.request` with
+        clones using other methods.
+        """
+
+        if getattr(self, '_memoized_request', _missing) is not self.request:
+            self._memoized = {}
+            self._memoized_request = self.request
+
+        return self._memoized
+
+    def memoize(self, name, compute):
+        """ Returns value memoized under the given name for the current request, calling compute() if it's missing.
+        """
+
+        memoized = self.get_memoized()
+        if name not in memoized:
+            memoized[name] = compute()
+
+        return memoized[name]
+
+    def invalidate_memoized(self, *names):
+        """ Drops the given memoized values (e.g. 'object', 'serializer_class'), or all of them if no names are given.
+        """
+
+        memoized = self.get_memoized()
+        if not names:
+            memoized.clear()
+        for name in names:
+            memoized.pop(name, None)
+
     def get_serializer_class(self):
         """ Selects serializer class, based on current request's endpoint type.
         """
 
-        endpoint_type = self.get_endpoint_type()
+        return self.memoize('serializer_class', self.choose_serializer_class)
+
+    def choose_serializer_class(self):
+        endpoint_type = self.memoize('endpoint_type', self.get_endpoint_type)
 
         if endpoint_type == self.ENDPOINT_TYPE_MODIFY:
             return self.get_modify_serializer_class()
@@ -54,24 +121,236 @@ class DetailSerializerViewSet(GenericAPIView):
 
     def get_docs_serializer(self):
         """ Returns serializer instance used to generate documentation.
+        """
+
+        serializer_cls = self.get_docs_serializer_class()
+        return serializer_cls(context=self.get_serializer_context())
+
+    def get_docs_serializer_class(self):
+        """ Returns serializer class used to generate documentation.
 
         This defaults to the modify-serializer.
         """
 
-        serializer_cls = self.get_modify_serializer_class()
-        return serializer_cls(context=self.get_serializer_context())
+        return self.get_modify_serializer_class()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        self.check_preconditions(request)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return HttpResponseNotModified()
+
+        return super().handle_exception(exc)
+
+    def check_preconditions(self, request):
+        """ Evaluates conditional request headers against the requested object, before it's serialized.
+
+        Raises NotModified if the client already has the object, or PreconditionFailed if a precondition fails.
+        """
+
+        if self.last_modified_field is None or not has_preconditions(request):
+            return
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            return
+
+        etag, last_modified = self.memoize('validators', self.get_precondition_validators)
+        if evaluate_preconditions(request, etag, last_modified):
+            raise NotModified()
+
+    def get_precondition_validators(self):
+        """ Returns (etag, last_modified) tuple of the requested object, using a cheap query if possible.
+
+        Only the primary key, `last_modified_field` and foreign keys to the related objects are loaded, unless the
+        object has already been fetched.
+        """
+
+        # Serializer class might need the object as well, then it's been fetched and memoized already
+        serializer_class = self.get_validator_serializer_class()
+        obj = self.get_memoized().get('object')
+        if obj is None:
+            queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+            model = queryset.model
+            plan = self.get_validator_query_plan(serializer_class, model)
+            columns = {model._meta.pk.name, self.last_modified_field}
+            for path in plan.select_related + plan.prefetch_related:
+                relation = get_relation(model, path.split('__')[0])
+                if getattr(relation, 'concrete', False):
+                    columns.add(relation.name)
+            queryset = queryset.only(*sorted(columns))
+
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            self.check_object_permissions(self.request, obj)
+
+        return self.get_object_validators(obj, serializer_class)
+
+    def get_validator_serializer_class(self):
+        """ Returns serializer class that's part of the objects' ETags.
+
+        This defaults to the detail-serializer, so that clients can use ETags of GET responses for If-Match.
+        """
+
+        return self.get_detail_serializer_class()
+
+    def get_validator_query_plan(self, serializer_class, model):
+        """ Returns QueryPlan of the related objects which are part of the objects' representation (and thus ETag).
+        """
+
+        return get_query_plan(
+            serializer_class, model, self.get_included_resources(), context={'request': self.request, 'view': self},
+        )
+
+    def get_object_validators(self, obj, serializer_class):
+        """ Returns (etag, last_modified) tuple of the object's representation.
+
+        The representation also depends on the related objects rendered by the serializer (relationships, attributes
+        with related sources and included resources, see `get_validator_query_plan()`), so their primary keys and
+        `last_modified_field` values are part of the ETag, along with the representation options of the request (see
+        `get_representation()`).
+        last_modified is the latest modification time of all those objects. It's None if the representation contains
+        multi-valued relations, since removing objects from them doesn't change any modification time.
+        """
+
+        plan = self.get_validator_query_plan(serializer_class, type(obj))
+        plan.prefetch([obj])
+
+        own_last_modified = last_modified = getattr(obj, self.last_modified_field)
+        related = []
+        for path in plan.select_related + plan.prefetch_related:
+            objects = [
+                (related_obj.pk, getattr(related_obj, self.last_modified_field, None))
+                for related_obj in get_related_objects(obj, path)
+            ]
+            related.append((path, objects))
+            for _, related_last_modified in objects:
+                if last_modified is not None and related_last_modified is not None:
+                    last_modified = max(last_modified, related_last_modified)
+        if plan.prefetch_related:
+            last_modified = None
+
+        etag = get_object_etag(
+            obj.pk, own_last_modified, serializer_class, getattr(self.request, 'version', None),
+            related=related, representation=self.get_representation(serializer_class),
+        )
+        return etag, last_modified
+
+    def get_representation(self, serializer_class) -> tuple:
+        """ Returns identity of the representation options of the current request, as (included resources, fields).
+
+        included resources are the resolved include paths (serializer's default included resources if `include` isn't
+        given), fields are (include path, field names) tuples of the serializer and the included serializers, with
+        sparse fieldsets (`fields[<type>]`) applied. Thus requests with equivalent query params (e.g. `include`
+        listing the default included resources) get the same ETag.
+        """
+
+        context = {'request': self.request, 'view': self}
+        serializer = serializer_class(context=context)
+        included_resources = self.get_included_resources()
+        if included_resources is None:
+            included_resources = utils.get_default_included_resources_from_serializer(serializer)
+        included_resources = tuple(sorted({inflection.underscore(value) for value in included_resources}))
+
+        fields = []
+
+        def add_fields(serializer, included_resources, prefix=''):
+            fields.append((prefix, tuple(sorted(serializer.fields))))
+            included_serializers = utils.get_included_serializers(serializer)
+            for field_name in sorted({node.split('.')[0] for node in included_resources}):
+                if field_name not in included_serializers:
+                    continue
+                nested_included_resources = [
+                    node.split('.', 1)[1] for node in included_resources if node.startswith(field_name + '.')
+                ]
+                add_fields(
+                    included_serializers[field_name](context=context), nested_included_resources,
+                    '%s%s.' % (prefix, field_name),
+                )
+
+        add_fields(serializer, included_resources)
+        return included_resources, tuple(fields)
+
+    def set_validator_headers(self, response):
+        """ Adds ETag and Last-Modified headers to responses of single objects.
+        """
+
+        if self.last_modified_field is None or response.status_code not in (200, 304) or response.has_header('ETag'):
+            return
+
+        # Use the fetched object if possible - it's up to date after writes
+        memoized = self.get_memoized()
+        if memoized.get('object') is not None and response.status_code == 200:
+            validators = self.get_object_validators(memoized['object'], self.get_validator_serializer_class())
+        else:
+            validators = memoized.get('validators')
+        if validators is None:
+            return
+
+        etag, last_modified = validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(get_http_timestamp(last_modified))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        self.set_validator_headers(response)
+
+        # Request cache is cleared when the response is closed, i.e. after it has been sent (also when streaming)
+        response._closable_objects.append(get_request_cache(request))
+
+        return response
+
+    def get_response_cache_scope(self):
+        """ Returns visibility scope of responses, used for caching version-transformed responses.
+
+        Responses are cached only when this returns something else than None (and response caching is enabled via
+        TG_APICORE_RESPONSE_CACHE setting). Return e.g. 'public' if the data of the same serializer is the same for all
+        users, or user's id if it depends on the user.
+        """
+
+        return None
+
+    def get_object(self):
+        """ Returns the object the view is displaying, fetching it only once per request.
+        """
+
+        memoized = self.get_memoized()
+        if 'object' not in memoized:
+            # Choosing the serializer class while optimizing the queryset might already fetch the object
+            self.get_queryset()
+            if 'object' not in memoized:
+                memoized['object'] = super().get_object()
+
+        return memoized['object']
 
     def get_queryset(self):
         """ Selects queryset, based on current request's endpoint type.
+
+        The queryset is built once per request, each call returns a fresh copy of it.
         """
 
+        # Queryset used while choosing the serializer class isn't the final one, so it's not memoized
+        if self._planning_queries:
+            return self.build_queryset()
+
+        queryset = self.memoize('queryset', self.build_queryset)
+        if isinstance(queryset, QuerySet):
+            # Ensure queryset is re-evaluated on each call.
+            queryset = queryset.all()
+        return queryset
+
+    def build_queryset(self):
         assert self.queryset is not None, (
             "'%s' should either include a `queryset` attribute, "
             "or override the `get_queryset()` method."
             % self.__class__.__name__
         )
 
-        endpoint_type = self.get_endpoint_type()
+        endpoint_type = self.memoize('endpoint_type', self.get_endpoint_type)
 
         if endpoint_type == self.ENDPOINT_TYPE_MODIFY:
             queryset = self.get_modify_queryset()
@@ -83,8 +362,92 @@ class DetailSerializerViewSet(GenericAPIView):
         if isinstance(queryset, QuerySet):
             # Ensure queryset is re-evaluated on each request.
             queryset = queryset.all()
+            if self.plan_queries or self.prune_columns:
+                queryset = self.optimize_queryset(queryset, endpoint_type)
+        return queryset
+
+    def optimize_queryset(self, queryset, endpoint_type):
+        """ Applies query plan and column pruning (if enabled), based on the serializer of current endpoint type.
+        """
+
+        # Choosing the serializer might need the queryset (e.g. when it depends on the object), use it as-is then.
+        # Querysets which don't return model instances (e.g. values()) aren't serialized from model fields either.
+        if self._planning_queries or not is_model_queryset(queryset):
+            return queryset
+
+        self._planning_queries = True
+        try:
+            serializer_class = self.get_serializer_class()
+        finally:
+            self._planning_queries = False
+
+        context = {'request': self.request, 'view': self}
+        if self.plan_queries:
+            queryset = self.apply_query_plan(queryset, serializer_class, context)
+        # Modify endpoints need full instances - e.g. for create-only fields and model validation
+        if self.prune_columns and endpoint_type != self.ENDPOINT_TYPE_MODIFY:
+            queryset = self.apply_column_pruning(queryset, serializer_class, context)
+
         return queryset
 
+    def apply_query_plan(self, queryset, serializer_class, context):
+        """ Adds select_related() / prefetch_related() lookups needed by the serializer to the queryset.
+
+        The lookups are derived from the serializer class and the included resources (`include` query param, or
+        serializer's default included resources).
+        """
+
+        plan = get_query_plan(serializer_class, queryset.model, self.get_included_resources(), context=context)
+        # The object might have been fetched already while choosing the serializer class
+        if 'object' in self.get_memoized():
+            plan.prefetch([self.get_memoized()['object']])
+
+        return plan.apply(queryset)
+
+    def get_included_resources(self):
+        """ Returns include paths requested via `include` query param, or None if the param isn't given.
+        """
+
+        query_params = getattr(self.request, 'query_params', {})
+        include = query_params.get('include')
+        return include.split(',') if include else None
+
+    def apply_column_pruning(self, queryset, serializer_class, context):
+        """ Restricts the queryset to load only the columns needed by the serializer, using only().
+
+        Fields returned by get_required_columns() and relations that are select_related() are loaded as well. The
+        queryset is returned as-is if the needed columns cannot be determined (see `get_serializer_columns()`).
+        """
+
+        columns = get_serializer_columns(serializer_class, queryset.model, context=context)
+        select_related = queryset.query.select_related
+        if columns is None or select_related is True:
+            return queryset
+
+        columns = set(columns) | set(self.get_required_columns(queryset))
+        if isinstance(select_related, dict):
+            columns.update(select_related)
+
+        return queryset.only(*sorted(columns))
+
+    def get_required_columns(self, queryset):
+        """ Returns names of the model fields that must always be loaded when columns are pruned.
+
+        Defaults to fields used for ordering by the paginator (e.g. `created` of cursor pagination).
+        """
+
+        paginator = self.paginator
+        if paginator is None or not hasattr(paginator, 'get_ordering') or self.request is None:
+            return []
+
+        columns = []
+        for field_name in paginator.get_ordering(self.request, queryset, self):
+            field_name = field_name.lstrip('-').split('__')[0]
+            if field_name in {f.name for f in queryset.model._meta.concrete_fields}:
+                columns.append(field_name)
+
+        return columns
+
     def get_list_serializer_class(self):
         return self.serializer_class
 
@@ -102,3 +465,51 @@ class DetailSerializerViewSet(GenericAPIView):
 
     def get_modify_queryset(self):
         return self.queryset_modify or self.get_detail_queryset()
+
+
+_missing = object()
+
+
+class StreamingListMixin:
+    """ Adds streaming mode to list endpoints, for fetching very large collections at once.
+
+    When `stream` query parameter is given (e.g. `?stream=1`), the whole (filtered) queryset is returned as a single
+    JSON API document, without pagination, via StreamingHttpResponse. Objects are fetched using `queryset.iterator()`
+    and rendered one by one (see `JSONRenderer.render_stream()`), so memory usage doesn't depend on the size of the
+    collection. Note that `prefetch_related()` has no effect with `iterator()`.
+
+    Streaming is only supported by tg_apicore's JSONRenderer, other renderers get the usual paginated response.
+    The mixin must come before ListModelMixin (or ModelViewSet) in base classes.
+    """
+
+    stream_query_param = 'stream'
+    # Number of rows fetched from the database at once (Django 2.0+)
+    stream_fetch_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        if self.should_stream_list(request):
+            return self.stream_list(request)
+
+        return super().list(request, *args, **kwargs)
+
+    def should_stream_list(self, request) -> bool:
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return False
+
+        return request.query_params.get(self.stream_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def stream_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(many=True)
+        renderer = request.accepted_renderer
+
+        content = renderer.render_stream(self.iterate_queryset(queryset), serializer, self.get_renderer_context())
+        return StreamingHttpResponse(content, content_type=renderer.media_type)
+
+    def iterate_queryset(self, queryset):
+        if not isinstance(queryset, QuerySet):
+            return iter(queryset)
+
+        if django.VERSION >= (2, 0):
+            return queryset.iterator(chunk_size=self.stream_fetch_size)
+        return queryset.iterator()